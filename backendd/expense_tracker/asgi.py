@@ -3,6 +3,10 @@ ASGI config for expense_tracker project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Requests to the Server-Sent Events endpoint are handled by a lightweight
+ASGI application so that long-lived idle connections bypass the Django
+request/response cycle; everything else goes to Django.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -13,4 +17,16 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'expense_tracker.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django is set up, since it uses the ORM
+from projects.events import sse_application  # noqa: E402
+
+EVENTS_PATH = '/api/events/'
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'] == EVENTS_PATH:
+        await sse_application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 
+from corsheaders.defaults import default_headers
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -36,15 +38,19 @@ INSTALLED_APPS = [
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
+    # Before staticfiles: projects overrides collectstatic
+    'projects',
     'django.contrib.staticfiles',
     'rest_framework',
     'corsheaders',
-    'projects',
 ]
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    'projects.throttling.InFlightLimitMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'projects.frontend.FrontendWhiteNoiseMiddleware',
+    'projects.compression.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -80,9 +86,40 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    },
+    # Expense shards: only the expense tables and their outbox are migrated
+    # on them, by python manage.py migrate. Add new shards at the end; each
+    # one allocates expense ids from its own range.
+    **{
+        f'shard_{n}': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / f'expenses_shard_{n}.sqlite3',
+        }
+        for n in range(1, 4)
+    },
 }
 
+DATABASE_ROUTERS = ['projects.sharding.ShardRouter']
+
+# Database aliases the expenses of new projects are spread over. Projects
+# keep the shard they were placed on until rebalance_shards moves them.
+EXPENSE_SHARDS = ['default', 'shard_1', 'shard_2', 'shard_3']
+
+# Threads a listing across several shards queries them with (1 queries
+# them one after another on the request thread)
+SHARD_FAN_OUT_WORKERS = 4
+
+# Expenses copied per transaction when rebalance_shards moves a project
+SHARD_MOVE_BATCH_SIZE = 500
+
+# Apply the outbox of writes on a shard (their change log entries, spend
+# counters and snapshots) from a background thread once they commit; off,
+# the writing thread applies it before returning
+SHARD_OUTBOX_IN_BACKGROUND = True
+
+# Outbox entries applied to the default database per transaction
+SHARD_OUTBOX_BATCH_SIZE = 500
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -119,6 +156,25 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 
 STATIC_URL = 'static/'
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+# collectstatic writes hashed file names and gzip/brotli variants, served by
+# WhiteNoise with far-future cache headers
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage',
+    },
+}
+
+# Built frontend (npm run build), served by WhiteNoise from the site root once
+# it exists; index.html is served by projects.frontend.index for every page.
+# collectstatic writes its brotli and gzip variants
+FRONTEND_DIST = BASE_DIR.parent / 'frontend' / 'dist'
+if FRONTEND_DIST.is_dir():
+    WHITENOISE_ROOT = FRONTEND_DIST
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -134,7 +190,105 @@ REST_FRAMEWORK = {
         'rest_framework.renderers.JSONRenderer',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
-    'PAGE_SIZE': 20
+    'PAGE_SIZE': 20,
+    # Endpoints use ?format= for their own output formats (statements, exports)
+    'URL_FORMAT_OVERRIDE': None,
+    'DEFAULT_THROTTLE_CLASSES': [
+        'projects.throttling.ReadWriteThrottle',
+    ],
+}
+
+# Change feed: log entries older than this are removed by compaction and
+# clients with older cursors are asked to resync
+CHANGE_LOG_RETENTION_DAYS = 30
+
+# Server-Sent Events: seconds between change log polls per worker, events
+# buffered per client before it is told to resync, seconds between
+# keep-alive comments on idle connections, and the longest wait between
+# retries and number of failed change log reads before streams are closed
+EVENTS_POLL_INTERVAL = 0.5
+EVENTS_QUEUE_SIZE = 100
+EVENTS_HEARTBEAT_INTERVAL = 15
+EVENTS_MAX_BACKOFF = 30
+EVENTS_MAX_FAILURES = 10
+
+# Background project deletion: expenses deleted per transaction and seconds
+# to pause between batches so other writers can get the database lock
+PROJECT_DELETION_BATCH_SIZE = 1000
+PROJECT_DELETION_BATCH_PAUSE = 0.05
+
+# Bulk expense update/delete: rows written per statement and transaction
+EXPENSE_BULK_BATCH_SIZE = 500
+
+# Balance snapshots: projects with at least this many expenses get monthly
+# snapshots from the snapshot_balances command
+BALANCE_SNAPSHOT_MIN_EXPENSES = 5000
+
+# Spend statistics: expense rows loaded into NumPy per query chunk, and
+# seconds results stay cached (they are keyed on the project's data version)
+STATISTICS_CHUNK_SIZE = 20000
+STATISTICS_CACHE_TIMEOUT = 3600
+
+# Columnar export: rows per Arrow record batch (and per database query)
+EXPORT_BATCH_SIZE = 65536
+
+# Batch requests: maximum sub-requests per batch, and threads consecutive
+# GET sub-requests are spread over (1 runs everything on the request thread)
+BATCH_MAX_REQUESTS = 20
+BATCH_READ_WORKERS = 1
+
+# Expense archival: full years kept in the expenses table before the current
+# one, and expenses moved to the archive per transaction by archive_expenses
+EXPENSE_ARCHIVE_KEEP_YEARS = 1
+EXPENSE_ARCHIVE_BATCH_SIZE = 1000
+EXPENSE_ARCHIVE_BATCH_PAUSE = 0.05
+
+# Throttling: token buckets per client and endpoint class (tokens refilled per
+# second, bucket size), kept in a SQLite file shared by all worker processes
+THROTTLE_STATE_PATH = BASE_DIR / 'throttle.sqlite3'
+THROTTLE_BUCKETS = {
+    'read': {'rate': 20, 'burst': 100},
+    'write': {'rate': 5, 'burst': 30},
+    'statement': {'rate': 0.1, 'burst': 5},
+}
+
+# Load shedding, per worker process: API requests in flight before every
+# request gets 429, statement renders running at once, and requests in flight
+# before statements get 429. Shed requests are told to retry after
+# THROTTLE_SHED_RETRY_AFTER seconds.
+THROTTLE_MAX_IN_FLIGHT = 16
+THROTTLE_MAX_RENDERS = 2
+THROTTLE_RENDER_MAX_IN_FLIGHT = 12
+THROTTLE_SHED_RETRY_AFTER = 5
+
+# Response compression: JSON and CSV responses of at least this many bytes
+# are compressed (brotli when installed and accepted, gzip otherwise)
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION_BROTLI_QUALITY = 5
+
+# Statement memory: bytes a statement may take to render in memory before it
+# is streamed to a temporary file instead, or refused when its format cannot
+# be streamed (None renders everything in memory). Profiling traces every
+# render with tracemalloc and logs its peak memory.
+STATEMENT_MEMORY_BUDGET = 128 * 1024 * 1024
+STATEMENT_MEMORY_PROFILING = False
+
+# Idempotency keys: seconds a stored response is replayed for, seconds after
+# which a request that never finished no longer holds its key, and seconds a
+# duplicate waits for the original request before getting 409
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+IDEMPOTENCY_LOCK_TIMEOUT = 60
+IDEMPOTENCY_WAIT_TIMEOUT = 10
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'projects.profiling': {'handlers': ['console'], 'level': 'INFO'},
+    },
 }
 
 # CORS settings for development
@@ -144,3 +298,6 @@ CORS_ALLOWED_ORIGINS = [
 ]
 
 CORS_ALLOW_ALL_ORIGINS = True  # Only for development
+
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
+CORS_EXPOSE_HEADERS = ['Idempotent-Replayed']
@@ -15,9 +15,13 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
+
+from projects import frontend
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('projects.urls')),
+    # Client-side routes of the frontend; its files are served by WhiteNoise
+    re_path(r'^(?!api/|admin/|static/|assets/).*$', frontend.index, name='frontend'),
 ]
@@ -0,0 +1,33 @@
+"""
+Gunicorn configuration for the expense tracker.
+
+The ASGI application is loaded once in the master process, which then
+imports the statement renderers and NumPy before forking the workers. The
+workers share those pages with the master instead of each importing them
+on its first statement or statistics request.
+
+Run from the backendd directory with: gunicorn
+"""
+
+import multiprocessing
+import os
+
+
+wsgi_app = 'expense_tracker.asgi:application'
+worker_class = 'uvicorn.workers.UvicornWorker'
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+preload_app = True
+
+
+def when_ready(server):
+    import numpy  # noqa: F401
+    from django.db import connections
+    from projects.renderers import preload_statement_renderers
+    from projects.statements import get_statement_template
+
+    formats = preload_statement_renderers()
+    get_statement_template()
+    # Workers must not inherit a database connection from the master
+    connections.close_all()
+    server.log.info("Preloaded statement renderers: %s", ', '.join(formats))
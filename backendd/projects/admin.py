@@ -2,12 +2,27 @@
 Admin configuration for the expense tracker.
 
 This module configures the Django admin interface for managing
-projects and expenses with enhanced functionality.
+projects and expenses with enhanced functionality. Expenses are listed one
+shard at a time, and read and written on their project's shard.
 """
 
 from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
+from django.db import transaction
+from django.db.models import Q
 from django.utils.html import format_html
 from .models import Project, Expense
+from .sharding import attach_expense_totals, expense_shards, find_expense, is_sharded, move_expenses, project_shard
+
+
+class ProjectChangeList(ChangeList):
+    """
+    Change list summing the listed projects' expenses on their shards.
+    """
+
+    def get_results(self, request):
+        super().get_results(request)
+        self.result_list = attach_expense_totals(self.result_list)
 
 
 @admin.register(Project)
@@ -31,7 +46,7 @@ class ProjectAdmin(admin.ModelAdmin):
     
     fieldsets = (
         ('Basic Information', {
-            'fields': ('name', 'description')
+            'fields': ('name', 'description', 'budget')
         }),
         ('Statistics', {
             'fields': ('total_expenses_display', 'expense_count', 'created_at'),
@@ -55,9 +70,9 @@ class ProjectAdmin(admin.ModelAdmin):
         total = obj.total_expenses
         color = 'green' if total > 0 else 'gray'
         return format_html(
-            '<span style="color: {};">${:.2f}</span>',
+            '<span style="color: {};">${}</span>',
             color,
-            total
+            f'{total:.2f}'
         )
     total_expenses_display.short_description = 'Total Expenses'
     
@@ -65,7 +80,19 @@ class ProjectAdmin(admin.ModelAdmin):
         """
         Optimize queryset to reduce database queries.
         """
-        return super().get_queryset(request).prefetch_related('expenses')
+        return super().get_queryset(request).select_related('archive_summary')
+    
+    def get_changelist(self, request, **kwargs):
+        return ProjectChangeList
+    
+    def get_formset_kwargs(self, request, obj, inline, prefix):
+        """
+        Read the inline expenses from the project's shard.
+        """
+        kwargs = super().get_formset_kwargs(request, obj, inline, prefix)
+        if obj.pk is not None:
+            kwargs['queryset'] = inline.get_queryset(request).using(project_shard(obj))
+        return kwargs
 
 
 class ExpenseInline(admin.TabularInline):
@@ -74,10 +101,40 @@ class ExpenseInline(admin.TabularInline):
     """
     model = Expense
     extra = 0
-    fields = ['date', 'description', 'amount']
+    fields = ['date', 'description', 'category', 'amount']
     readonly_fields = ['created_at']
 
 
+class ShardListFilter(admin.SimpleListFilter):
+    """
+    Filter listing the expenses of one shard, the first one by default.
+    """
+    title = 'shard'
+    parameter_name = 'shard'
+    
+    def lookups(self, request, model_admin):
+        return [(shard, shard) for shard in expense_shards()]
+    
+    def has_output(self):
+        return is_sharded()
+    
+    def shard(self):
+        shards = expense_shards()
+        return self.value() if self.value() in shards else shards[0]
+    
+    def queryset(self, request, queryset):
+        return queryset.using(self.shard())
+    
+    def choices(self, changelist):
+        # No "All" choice: a list is read from a single shard
+        for lookup, title in self.lookup_choices:
+            yield {
+                'selected': self.shard() == lookup,
+                'query_string': changelist.get_query_string({self.parameter_name: lookup}),
+                'display': title,
+            }
+
+
 @admin.register(Expense)
 class ExpenseAdmin(admin.ModelAdmin):
     """
@@ -89,18 +146,23 @@ class ExpenseAdmin(admin.ModelAdmin):
     list_display = [
         'project', 
         'description_preview', 
+        'category', 
         'amount_display', 
         'date', 
         'created_at'
     ]
-    list_filter = ['date', 'created_at', 'project']
-    search_fields = ['description', 'project__name']
+    list_filter = [ShardListFilter, 'date', 'created_at', 'project', 'category']
+    search_fields = ['description']
     readonly_fields = ['created_at']
     date_hierarchy = 'date'
+    # Shards have no projects to join: they are prefetched in get_queryset()
+    list_select_related = ()
+    # Counting every shard's expenses for "(N total)" is not worth a query per shard
+    show_full_result_count = False
     
     fieldsets = (
         ('Expense Information', {
-            'fields': ('project', 'amount', 'description', 'date')
+            'fields': ('project', 'amount', 'description', 'category', 'date')
         }),
         ('Metadata', {
             'fields': ('created_at',),
@@ -121,17 +183,55 @@ class ExpenseAdmin(admin.ModelAdmin):
         """
         color = 'red' if obj.amount > 1000 else 'green'
         return format_html(
-            '<span style="color: {}; font-weight: bold;">${:.2f}</span>',
+            '<span style="color: {}; font-weight: bold;">${}</span>',
             color,
-            obj.amount
+            f'{obj.amount:.2f}'
         )
     amount_display.short_description = 'Amount'
     
     def get_queryset(self, request):
         """
         Optimize queryset to reduce database queries.
+        
+        Projects are prefetched from the default database.
+        """
+        return super().get_queryset(request).prefetch_related('project')
+    
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Match each search term against descriptions and project names,
+        looking up the projects in the default database.
+        """
+        for term in search_term.split():
+            project_ids = list(Project.objects.filter(name__icontains=term).values_list('pk', flat=True))
+            queryset = queryset.filter(Q(description__icontains=term) | Q(project_id__in=project_ids))
+        return queryset, False
+    
+    def get_object(self, request, object_id, from_field=None):
+        """
+        Return the expense from whichever shard holds it.
+        """
+        if from_field is not None:
+            return super().get_object(request, object_id, from_field)
+        try:
+            pk = int(object_id)
+        except (TypeError, ValueError):
+            return None
+        queryset = self.get_queryset(request)
+        return find_expense([queryset.using(shard) for shard in expense_shards()], pk)
+    
+    def save_model(self, request, obj, form, change):
+        """
+        Save an expense on its shard, then move it to the shard of its new
+        project when it was moved to a project on another shard.
         """
-        return super().get_queryset(request).select_related('project')
+        shard = obj._state.db or project_shard(obj.project)
+        with transaction.atomic(using=shard):
+            obj.save()
+        target = project_shard(obj.project)
+        if target != shard:
+            move_expenses(Expense.objects.using(shard).filter(pk=obj.pk), target)
+            obj._state.db = target
 
 
 # Enhance the Project admin with inline expenses
@@ -22,7 +22,9 @@ class ProjectsConfig(AppConfig):
         """
         Called when the app is ready.
         
-        This method can be used to perform initialization
-        tasks when the app starts up.
+        Connects the signal receivers that record changes
+        to projects and expenses in the change log, keep
+        balance snapshots and spend counters up to date and
+        place new projects on an expense shard.
         """
-        pass
+        from . import changes, balances, spend, sharding  # noqa: F401
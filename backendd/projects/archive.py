@@ -0,0 +1,244 @@
+"""
+Year-based archival of old expenses.
+
+Expenses dated before the archive cutoff are moved, in batches, from the
+expenses table into ArchivedExpense, keeping the expenses table and its
+indexes limited to recent data. A ProjectArchiveSummary per project keeps
+the total, count and date range of its archived expenses.
+
+Reads go through expense_sources(), which adds the archive only when the
+requested project and date range reach archived dates, so queries on
+recent data never touch it. Totals use the summaries instead of scanning
+the archive.
+"""
+
+import heapq
+import logging
+import time
+from datetime import date
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, Sum, Value
+from django.db.models.functions import Greatest, Least
+from django.utils import timezone
+
+from .fields import CentsField
+from .models import Project, Expense, ArchivedExpense, ProjectArchiveSummary, ShardOutboxEntry
+from .outbox import defer, outbox_handler
+from .sharding import expense_shards, project_shard
+
+
+logger = logging.getLogger(__name__)
+
+ARCHIVED_COLUMNS = ['id', 'project_id', 'amount', 'description', 'category', 'date', 'created_at']
+
+
+def archive_cutoff(today=None):
+    """
+    Return the first date that is not archived: 1 January of the oldest
+    year kept, EXPENSE_ARCHIVE_KEEP_YEARS full years before the current one.
+    """
+    today = today or timezone.now().date()
+    return date(today.year - getattr(settings, 'EXPENSE_ARCHIVE_KEEP_YEARS', 1), 1, 1)
+
+
+def _summaries(project_id=None, date_from=None, date_to=None):
+    summaries = ProjectArchiveSummary.objects.all()
+    if project_id is not None:
+        summaries = summaries.filter(project_id=project_id)
+    if date_from is not None:
+        summaries = summaries.filter(last_date__gte=date_from)
+    if date_to is not None:
+        summaries = summaries.filter(first_date__lte=date_to)
+    return summaries
+
+
+def reaches_archive(project_id=None, date_from=None, date_to=None):
+    """
+    Return whether archived expenses may fall in a date range, for one
+    project or for all of them.
+    """
+    return _summaries(project_id, date_from, date_to).exists()
+
+
+def expense_sources(project_id=None, date_from=None, date_to=None):
+    """
+    Return the querysets holding the expenses of a project and date range:
+    the expenses table, plus the archive when the range reaches it, on the
+    project's shard, or on every shard when no project is given.
+    """
+    lookups = {}
+    if project_id is not None:
+        lookups['project_id'] = project_id
+    if date_from is not None:
+        lookups['date__gte'] = date_from
+    if date_to is not None:
+        lookups['date__lte'] = date_to
+
+    shards = expense_shards() if project_id is None else [project_shard(project_id)]
+    models = [Expense]
+    if reaches_archive(project_id, date_from, date_to):
+        models.append(ArchivedExpense)
+    return [
+        model.objects.using(shard).filter(**lookups)
+        for model in models for shard in shards
+    ]
+
+
+def merge_by_date(iterables, key):
+    """
+    Merge iterables each ordered newest first, as expenses are, into one.
+    """
+    if len(iterables) == 1:
+        return iter(iterables[0])
+    return heapq.merge(*iterables, key=key, reverse=True)
+
+
+def sum_expenses(project_id, date_from=None, date_to=None):
+    """
+    Return the total and number of a project's expenses in a date range.
+
+    Archived expenses come from the project's archive summary when the range
+    covers the whole archive, and from the (project, date) index otherwise.
+    """
+    lookups = {'project_id': project_id}
+    if date_from is not None:
+        lookups['date__gte'] = date_from
+    if date_to is not None:
+        lookups['date__lte'] = date_to
+
+    shard = project_shard(project_id)
+    hot = Expense.objects.using(shard).filter(**lookups).aggregate(total=Sum('amount'), count=Count('id'))
+    total, count = hot['total'] or 0, hot['count']
+
+    summary = _summaries(project_id, date_from, date_to).first()
+    if summary is None:
+        return total, count
+    covered = (
+        (date_from is None or date_from <= summary.first_date)
+        and (date_to is None or date_to >= summary.last_date)
+    )
+    if covered:
+        return total + summary.total, count + summary.expense_count
+    archived = ArchivedExpense.objects.using(shard).filter(**lookups).aggregate(total=Sum('amount'), count=Count('id'))
+    return total + (archived['total'] or 0), count + archived['count']
+
+
+def _add_to_summaries(project_id, batch, shard):
+    """
+    Add a batch of a project's archived expenses, read from its shard, to
+    the project's summary or, on a shard other than the default database,
+    queue the addition in the shard's outbox.
+    """
+    stats = (
+        ArchivedExpense.objects.using(shard).filter(pk__in=batch)
+        .aggregate(total=Sum('amount'), count=Count('id'), first=Min('date'), last=Max('date'))
+    )
+    addition = [project_id, str(stats['total']), stats['count'], str(stats['first']), str(stats['last'])]
+    if not defer(shard, ShardOutboxEntry.ARCHIVE, addition):
+        _add_to_summary(project_id, stats['total'], stats['count'], stats['first'], stats['last'])
+
+
+def _add_to_summary(project_id, total, count, first, last):
+    updated = ProjectArchiveSummary.objects.filter(project_id=project_id).update(
+        total=F('total') + Value(total, output_field=CentsField()),
+        expense_count=F('expense_count') + count,
+        first_date=Least('first_date', Value(first)),
+        last_date=Greatest('last_date', Value(last)),
+    )
+    if not updated:
+        ProjectArchiveSummary.objects.create(
+            project_id=project_id,
+            total=total,
+            expense_count=count,
+            first_date=first,
+            last_date=last,
+        )
+
+
+@outbox_handler(ShardOutboxEntry.ARCHIVE)
+def apply_deferred_archive(payloads):
+    additions = {}
+    for project_id, total, count, first, last in payloads:
+        total, first, last = Decimal(total), date.fromisoformat(first), date.fromisoformat(last)
+        if project_id in additions:
+            previous_total, previous_count, previous_first, previous_last = additions[project_id]
+            total, count = total + previous_total, count + previous_count
+            first, last = min(first, previous_first), max(last, previous_last)
+        additions[project_id] = total, count, first, last
+    # Summaries of projects deleted since are gone with them
+    for project_id in Project.objects.filter(pk__in=additions).values_list('pk', flat=True):
+        _add_to_summary(project_id, *additions[project_id])
+
+
+def archive_expenses(before=None, batch_size=None, pause=None):
+    """
+    Move expenses dated before a cutoff into the archive, in batches.
+
+    Each batch copies expenses into ArchivedExpense, adds them to their
+    projects' summaries and deletes them from the expenses table in one
+    short transaction; on a shard other than the default database, the
+    summary additions are queued in its outbox and applied once the batch
+    commits. Shards are archived one after another. Returns the number of
+    archived expenses.
+    """
+    if before is None:
+        before = archive_cutoff()
+    if batch_size is None:
+        batch_size = getattr(settings, 'EXPENSE_ARCHIVE_BATCH_SIZE', 1000)
+    if pause is None:
+        pause = getattr(settings, 'EXPENSE_ARCHIVE_BATCH_PAUSE', 0.05)
+
+    archived = 0
+    for shard in expense_shards():
+        archived += _archive_shard(shard, before, batch_size, pause)
+
+    logger.info("Archived %s expenses dated before %s", archived, before)
+    return archived
+
+
+def _archive_shard(shard, before, batch_size, pause):
+    archived = 0
+    last_id = 0
+    while True:
+        with transaction.atomic(using=shard):
+            rows = list(
+                Expense.objects.using(shard).filter(date__lt=before, pk__gt=last_id)
+                .order_by('pk')
+                .values_list(*ARCHIVED_COLUMNS)[:batch_size]
+            )
+            if not rows:
+                break
+            ArchivedExpense.objects.using(shard).bulk_create([
+                ArchivedExpense(**dict(zip(ARCHIVED_COLUMNS, row))) for row in rows
+            ])
+            by_project = {}
+            for row in rows:
+                by_project.setdefault(row[1], []).append(row[0])
+            for project_id, expense_ids in by_project.items():
+                _add_to_summaries(project_id, expense_ids, shard)
+            # Archived expenses have no dependent rows and their totals are
+            # unchanged, so no snapshots, spend counters or change log
+            # entries are affected.
+            batch = Expense.objects.using(shard).filter(pk__in=[row[0] for row in rows])
+            batch._raw_delete(batch.db)
+        archived += len(rows)
+        last_id = rows[-1][0]
+        if pause:
+            time.sleep(pause)
+    return archived
+
+
+def project_expense_rows(project_id, fields, chunk_size=2000):
+    """
+    Yield tuples of the given fields of a project's expenses, archived ones
+    included, newest first, streaming each source chunk_size rows at a time.
+    """
+    sources = expense_sources(project_id)
+    rows = merge_by_date([
+        source.values_list('date', 'created_at', *fields).iterator(chunk_size=chunk_size)
+        for source in sources
+    ], key=lambda row: row[:2])
+    return (row[2:] for row in rows)
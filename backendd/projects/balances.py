@@ -0,0 +1,207 @@
+"""
+Point-in-time balances and cumulative spend series.
+
+Balances are computed in the database from the latest balance snapshot
+before the requested date plus the expenses recorded after it, using the
+(project, date) index, so their cost depends on the distance to the last
+snapshot rather than on the length of the project's history. Cumulative
+series use window functions over the requested date range only. Archived
+expenses are included, through projects.archive, only when a date range
+reaches them.
+"""
+
+import calendar
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Count, F, Min, Sum, Window
+from django.db.models.functions import TruncMonth, TruncWeek
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .archive import expense_sources, sum_expenses
+from .models import Expense, ProjectBalanceSnapshot, ShardOutboxEntry
+from .outbox import defer, outbox_handler
+
+
+SERIES_INTERVALS = {
+    'day': lambda: F('date'),
+    'week': lambda: TruncWeek('date'),
+    'month': lambda: TruncMonth('date'),
+}
+
+
+def _as_date(value):
+    return value.date() if isinstance(value, datetime) else value
+
+
+def get_balance(project, as_of):
+    """
+    Return the total and number of expenses of a project up to and
+    including as_of.
+    """
+    snapshot = (
+        ProjectBalanceSnapshot.objects.filter(project=project, as_of__lte=as_of)
+        .order_by('-as_of')
+        .first()
+    )
+    date_from, total, count = None, Decimal('0'), 0
+    if snapshot:
+        date_from = snapshot.as_of + timedelta(days=1)
+        total, count = snapshot.total, snapshot.expense_count
+
+    delta_total, delta_count = sum_expenses(project.pk, date_from, as_of)
+    return {
+        'total_expenses': total + delta_total,
+        'expense_count': count + delta_count,
+    }
+
+
+def _period_totals(sources, interval):
+    """
+    Return the spend per period of expenses spread over several querysets.
+    """
+    totals = {}
+    for source in sources:
+        rows = (
+            source.order_by()
+            .annotate(period=SERIES_INTERVALS[interval]())
+            .values('period')
+            .annotate(total=Sum('amount'), count=Count('id'))
+            .values_list('period', 'total', 'count')
+        )
+        for period, total, count in rows:
+            period = _as_date(period)
+            previous_total, previous_count = totals.get(period, (0, 0))
+            totals[period] = (previous_total + total, previous_count + count)
+    return sorted(totals.items())
+
+
+def get_cumulative_series(project, date_from=None, date_to=None, interval='day'):
+    """
+    Return spend per period and cumulative spend for a project.
+    
+    Each item holds the first date of the period, the amount spent in the
+    period and the total spent up to the end of it. Only the requested date
+    range is scanned: spend before date_from comes from get_balance. When
+    the range reaches archived expenses, per-period totals of the expenses
+    table and the archive are merged and accumulated here instead.
+    """
+    opening = Decimal('0')
+    if date_from:
+        opening = get_balance(project, date_from - timedelta(days=1))['total_expenses']
+
+    sources = expense_sources(project.pk, date_from, date_to)
+    if len(sources) > 1:
+        series = []
+        cumulative = opening
+        for period, (period_total, _) in _period_totals(sources, interval):
+            cumulative += period_total
+            series.append({'date': period, 'amount': period_total, 'cumulative': cumulative})
+        return series
+
+    rows = (
+        sources[0].order_by()
+        .annotate(period=SERIES_INTERVALS[interval]())
+        .values('period')
+        .annotate(
+            period_total=Window(Sum('amount'), partition_by=F('period')),
+            cumulative=Window(Sum('amount'), order_by=F('period').asc()),
+        )
+        .values_list('period', 'period_total', 'cumulative')
+        .distinct()
+        .order_by('period')
+    )
+    return [
+        {
+            'date': _as_date(period),
+            'amount': period_total,
+            'cumulative': opening + cumulative,
+        }
+        for period, period_total, cumulative in rows
+    ]
+
+
+def take_balance_snapshots(project):
+    """
+    Store a snapshot at the end of every complete month of a project's
+    history that does not have one yet. Returns the number created.
+    
+    Snapshots include archived expenses, so archiving does not change them.
+    """
+    current_month = timezone.now().date().replace(day=1)
+    months = _period_totals(
+        expense_sources(project.pk, date_to=current_month - timedelta(days=1)),
+        'month'
+    )
+    snapshots = []
+    total, count = Decimal('0'), 0
+    for month, (month_total, month_count) in months:
+        total, count = total + month_total, count + month_count
+        month_end = month.replace(day=calendar.monthrange(month.year, month.month)[1])
+        snapshots.append(ProjectBalanceSnapshot(
+            project=project, as_of=month_end, total=total, expense_count=count
+        ))
+    existing = ProjectBalanceSnapshot.objects.filter(project=project).count()
+    ProjectBalanceSnapshot.objects.bulk_create(snapshots, ignore_conflicts=True)
+    return ProjectBalanceSnapshot.objects.filter(project=project).count() - existing
+
+
+def snapshot_min_expenses():
+    """
+    Return the number of expenses above which a project gets snapshots.
+    """
+    return getattr(settings, 'BALANCE_SNAPSHOT_MIN_EXPENSES', 5000)
+
+
+def invalidate_snapshots(dates, using=DEFAULT_DB_ALIAS):
+    """
+    Drop the snapshots that include any of some (project_id, date) pairs,
+    for a write on the database using: on an expense shard, the pairs are
+    queued in its outbox.
+    """
+    if defer(using, ShardOutboxEntry.SNAPSHOTS, [[project_id, str(day)] for project_id, day in dates]):
+        return
+    for project_id, day in dates:
+        ProjectBalanceSnapshot.objects.filter(project_id=project_id, as_of__gte=day).delete()
+
+
+@outbox_handler(ShardOutboxEntry.SNAPSHOTS)
+def apply_deferred_snapshots(payloads):
+    earliest = {}
+    for payload in payloads:
+        for project_id, day in payload:
+            day = date.fromisoformat(day)
+            earliest[project_id] = min(earliest.get(project_id, day), day)
+    invalidate_snapshots(earliest.items())
+
+
+def invalidate_snapshots_for_expenses(expense_ids, using=DEFAULT_DB_ALIAS):
+    """
+    Drop the snapshots that include any of the given expenses, read from
+    the database using.
+    """
+    earliest = list(
+        Expense.objects.using(using).filter(pk__in=expense_ids)
+        .order_by()
+        .values('project_id')
+        .annotate(first_date=Min('date'))
+        .values_list('project_id', 'first_date')
+    )
+    if earliest:
+        invalidate_snapshots(earliest, using)
+
+
+@receiver(post_save, sender=Expense)
+@receiver(post_delete, sender=Expense)
+def expense_written(sender, instance, using, **kwargs):
+    dates = [(instance.project_id, _as_date(instance.date))]
+    # An update may have moved the expense out of an earlier date or project
+    loaded = getattr(instance, '_loaded_values', {})
+    if 'project_id' in loaded and 'date' in loaded:
+        if (loaded['project_id'], loaded['date']) != (instance.project_id, instance.date):
+            dates.append((loaded['project_id'], loaded['date']))
+    invalidate_snapshots(dates, using)
@@ -0,0 +1,174 @@
+"""
+Batched API requests.
+
+A batch is a list of sub-requests against the regular API routes. They are
+resolved and dispatched in-process, without another HTTP round trip or
+another pass through the middleware stack, and their responses are
+returned together in one payload.
+
+Sub-requests run in order on the batch request's thread and database
+connection. With BATCH_READ_WORKERS above 1, runs of consecutive GET
+requests are spread over worker threads instead; each worker uses its own
+connection, which it closes when its sub-request is done.
+
+Every sub-request is throttled by its view like a separate request, taking
+a token from the client's bucket of its endpoint class. Sub-requests run
+in parallel also take an in-flight slot each, and are shed with 429 when
+workers are busy.
+"""
+
+import io
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection
+from django.http import HttpRequest, QueryDict
+from django.urls import Resolver404, resolve
+from rest_framework.response import Response
+
+from .throttling import busy_response, request_slot
+
+
+logger = logging.getLogger(__name__)
+
+BATCH_METHODS = ['GET', 'POST', 'PUT', 'PATCH', 'DELETE']
+
+# Request attributes set by middleware that sub-requests inherit
+INHERITED_ATTRIBUTES = ['user', 'session', 'auth', 'csrf_processing_done']
+
+
+def batch_read_workers():
+    """
+    Return the number of threads consecutive GET sub-requests are spread over.
+    """
+    return getattr(settings, 'BATCH_READ_WORKERS', 1)
+
+
+def build_subrequest(parent, method, url, body=None):
+    """
+    Build a request for one sub-request, inheriting the headers, cookies
+    and authenticated user of the batch request. The batch's
+    Idempotency-Key is not inherited, since it cannot hold for every
+    sub-request.
+    """
+    path, _, query = url.partition('?')
+    data = json.dumps(body).encode() if body is not None else b''
+
+    request = HttpRequest()
+    request.method = method
+    request.path = request.path_info = path
+    request.META = {
+        key: value for key, value in parent.META.items()
+        if key not in ('CONTENT_LENGTH', 'CONTENT_TYPE', 'HTTP_ACCEPT', 'HTTP_IDEMPOTENCY_KEY')
+    }
+    request.META.update({
+        'REQUEST_METHOD': method,
+        'PATH_INFO': path,
+        'QUERY_STRING': query,
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(data)),
+        'HTTP_ACCEPT': 'application/json',
+    })
+    request.GET = QueryDict(query)
+    request.COOKIES = parent.COOKIES
+    request._stream = io.BytesIO(data)
+    request._read_started = False
+    for name in INHERITED_ATTRIBUTES:
+        if hasattr(parent, name):
+            setattr(request, name, getattr(parent, name))
+    return request
+
+
+def _response_body(response):
+    if isinstance(response, Response):
+        # Left to the batch response's renderer instead of being rendered twice
+        return response.data
+    if response.streaming:
+        response.close()
+        return None
+    if response.get('Content-Type', '').startswith('application/json') and response.content:
+        return json.loads(response.content)
+    return None
+
+
+def run_subrequest(parent, item):
+    """
+    Dispatch one sub-request to its view and return its response as a dict
+    with the status code, headers and, for JSON responses, the body.
+
+    Other responses, like statements, are reported without their body.
+    """
+    request = build_subrequest(parent, item['method'], item['url'], item.get('body'))
+    try:
+        match = resolve(request.path_info)
+    except Resolver404:
+        return {'status': 404, 'headers': {}, 'body': {'detail': 'Not found.'}}
+    request.resolver_match = match
+
+    try:
+        response = match.func(request, *match.args, **match.kwargs)
+        body = _response_body(response)
+    except Exception:
+        logger.exception("Batched %s %s failed", item['method'], item['url'])
+        return {'status': 500, 'headers': {}, 'body': {'detail': 'Server error.'}}
+
+    headers = {
+        name: value for name, value in response.items()
+        if name not in ('Vary', 'Allow')
+    }
+    return {'status': response.status_code, 'headers': headers, 'body': body}
+
+
+def _run_in_thread(parent, item):
+    release = request_slot()
+    if release is None:
+        response = busy_response()
+        return {
+            'status': response.status_code,
+            'headers': {'Retry-After': response['Retry-After']},
+            'body': json.loads(response.content),
+        }
+    try:
+        return run_subrequest(parent, item)
+    finally:
+        release()
+        connection.close()
+
+
+def _runs(items):
+    """
+    Split sub-requests into runs of consecutive reads and single writes.
+    """
+    run = []
+    for item in items:
+        if item['method'] == 'GET':
+            run.append(item)
+            continue
+        if run:
+            yield run
+            run = []
+        yield [item]
+    if run:
+        yield run
+
+
+def run_batch(parent, items):
+    """
+    Run sub-requests and return their responses in request order.
+
+    Writes run one at a time, in order, so a read after a write sees it.
+    """
+    workers = batch_read_workers()
+    if workers <= 1:
+        return [run_subrequest(parent, item) for item in items]
+
+    responses = []
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='batch') as executor:
+        for run in _runs(items):
+            if len(run) == 1:
+                responses.append(run_subrequest(parent, run[0]))
+            else:
+                responses.extend(executor.map(lambda item: _run_in_thread(parent, item), run))
+    return responses
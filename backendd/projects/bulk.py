@@ -0,0 +1,128 @@
+"""
+Set-based bulk writes for expenses.
+
+Bulk operations select their target rows by primary key in batches and
+apply each batch as a single UPDATE or DELETE statement in its own short
+transaction, recording the affected rows in the change log, dropping
+the balance snapshots they invalidate and adjusting the spend counters
+as they go. Each shard's queryset is written on that shard, with the
+bookkeeping of its batches queued in the shard's outbox (see
+projects/outbox.py); expenses moved to a project on another shard are
+moved there once every shard is updated.
+"""
+
+from django.conf import settings
+from django.db import transaction
+
+from .balances import invalidate_snapshots_for_expenses
+from .changes import record_changes
+from .models import Expense, ChangeLog
+from .sharding import move_expenses, project_shard
+from .spend import add_spend, apply_spend_deltas, spend_by_category, subtract_spend
+
+
+def _apply_in_batches(queryset, apply, batch_size=None):
+    """
+    Call apply with lists of (id, project_id) pairs for the queryset, in
+    primary key order, each batch in its own transaction.
+
+    Batches are read with keyset pagination, so rows already written by
+    an earlier batch are never selected twice. Returns the sum of the
+    values returned by apply.
+    """
+    if batch_size is None:
+        batch_size = getattr(settings, 'EXPENSE_BULK_BATCH_SIZE', 500)
+
+    total = 0
+    last_id = 0
+    while True:
+        with transaction.atomic(using=queryset.db):
+            batch = list(
+                queryset.filter(pk__gt=last_id)
+                .order_by('pk')
+                .values_list('pk', 'project_id')[:batch_size]
+            )
+            if not batch:
+                return total
+            total += apply(batch)
+        last_id = batch[-1][0]
+
+
+def _group_by_project(batch):
+    groups = {}
+    for expense_id, project_id in batch:
+        groups.setdefault(project_id, []).append(expense_id)
+    return groups
+
+
+def bulk_update_expenses(querysets, changes, batch_size=None):
+    """
+    Apply validated changes to every expense in some querysets, one per
+    shard.
+
+    Returns the number of updated expenses.
+    """
+    new_project = changes.get('project')
+    updated = sum(
+        _apply_in_batches(queryset, _update_batch(queryset.db, changes), batch_size)
+        for queryset in querysets
+    )
+    if new_project is not None:
+        target = project_shard(new_project)
+        for queryset in querysets:
+            moved = Expense.objects.using(queryset.db).filter(project_id=new_project.pk)
+            move_expenses(moved, target)
+    return updated
+
+
+def _update_batch(db, changes):
+    new_project = changes.get('project')
+    changes_spend = bool(changes.keys() & {'project', 'category', 'amount'})
+
+    def apply(batch):
+        expense_ids = [pk for pk, _ in batch]
+        invalidate_snapshots_for_expenses(expense_ids, db)
+        rows = Expense.objects.using(db).filter(pk__in=expense_ids)
+        if changes_spend:
+            deltas = subtract_spend({}, spend_by_category(rows))
+        updated = rows.update(**changes)
+        if changes_spend:
+            apply_spend_deltas(add_spend(deltas, spend_by_category(rows)), db)
+        if 'date' in changes or new_project is not None:
+            invalidate_snapshots_for_expenses(expense_ids, db)
+        for project_id, ids in _group_by_project(batch).items():
+            record_changes(ChangeLog.EXPENSE, ids, ChangeLog.UPDATE, project_id, db)
+        # Moved expenses also change the project they were moved to
+        if new_project is not None:
+            moved = [pk for pk, project_id in batch if project_id != new_project.pk]
+            record_changes(ChangeLog.EXPENSE, moved, ChangeLog.UPDATE, new_project.pk, db)
+        return updated
+
+    return apply
+
+
+def bulk_delete_expenses(querysets, batch_size=None):
+    """
+    Delete every expense in some querysets, one per shard.
+
+    Returns the number of deleted expenses.
+    """
+    return sum(
+        _apply_in_batches(queryset, _delete_batch(queryset.db), batch_size)
+        for queryset in querysets
+    )
+
+
+def _delete_batch(db):
+    def apply(batch):
+        expense_ids = [pk for pk, _ in batch]
+        invalidate_snapshots_for_expenses(expense_ids, db)
+        for project_id, ids in _group_by_project(batch).items():
+            record_changes(ChangeLog.EXPENSE, ids, ChangeLog.DELETE, project_id, db)
+        # Expenses have no dependent rows, so a plain DELETE is enough and
+        # avoids loading the batch through the deletion collector.
+        rows = Expense.objects.using(db).filter(pk__in=expense_ids)
+        apply_spend_deltas(subtract_spend({}, spend_by_category(rows)), db)
+        return rows._raw_delete(rows.db)
+
+    return apply
@@ -0,0 +1,254 @@
+"""
+Change feed for the expense tracker.
+
+This module records inserts, updates and deletes on projects and expenses
+in the ChangeLog table and turns ranges of the log into compact deltas
+that clients apply to their local copy instead of reloading everything.
+Entries for expenses on other shards than the default database are
+queued in the shard's outbox and appended once their write commits (see
+projects/outbox.py).
+"""
+
+from datetime import timedelta
+from itertools import chain
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Max, Subquery
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Project, Expense, ChangeLog, ChangeLogHorizon, ShardOutboxEntry
+from .outbox import defer, outbox_handler
+from .serializers import ProjectSummarySerializer, ExpenseSerializer
+from .sharding import expense_shards, is_sharded, pending_deletion_ids, visible_expenses
+
+
+# Default number of log entries returned per page of the change feed
+DEFAULT_CHANGE_PAGE_SIZE = 500
+MAX_CHANGE_PAGE_SIZE = 5000
+
+
+def record_change(model, object_id, operation, project_id, using=DEFAULT_DB_ALIAS):
+    """
+    Append a single entry to the change log, for a write on the database
+    using: on an expense shard, the entry is queued in its outbox.
+    """
+    if defer(using, ShardOutboxEntry.CHANGES, [model, [object_id], operation, project_id]):
+        return
+    ChangeLog.objects.create(
+        model=model,
+        object_id=object_id,
+        operation=operation,
+        project_id=project_id
+    )
+
+
+def record_changes(model, object_ids, operation, project_id, using=DEFAULT_DB_ALIAS):
+    """
+    Append one entry per object id to the change log in a single query,
+    for a write on the database using.
+
+    Used by set-based writes that bypass model signals.
+    """
+    object_ids = list(object_ids)
+    if defer(using, ShardOutboxEntry.CHANGES, [model, object_ids, operation, project_id]):
+        return
+    ChangeLog.objects.bulk_create([
+        ChangeLog(model=model, object_id=object_id, operation=operation, project_id=project_id)
+        for object_id in object_ids
+    ])
+
+
+@outbox_handler(ShardOutboxEntry.CHANGES)
+def apply_deferred_changes(payloads):
+    ChangeLog.objects.bulk_create([
+        ChangeLog(model=model, object_id=object_id, operation=operation, project_id=project_id)
+        for model, object_ids, operation, project_id in payloads
+        for object_id in object_ids
+    ])
+
+
+@receiver(post_save, sender=Project)
+def project_saved(sender, instance, created, **kwargs):
+    record_change(
+        ChangeLog.PROJECT,
+        instance.pk,
+        ChangeLog.INSERT if created else ChangeLog.UPDATE,
+        instance.pk
+    )
+
+
+@receiver(post_delete, sender=Project)
+def project_deleted(sender, instance, **kwargs):
+    record_change(ChangeLog.PROJECT, instance.pk, ChangeLog.DELETE, instance.pk)
+
+
+@receiver(post_save, sender=Expense)
+def expense_saved(sender, instance, created, using, **kwargs):
+    record_change(
+        ChangeLog.EXPENSE,
+        instance.pk,
+        ChangeLog.INSERT if created else ChangeLog.UPDATE,
+        instance.project_id,
+        using
+    )
+    # A moved expense also changes the project it was moved from
+    previous_project_id = getattr(instance, '_loaded_values', {}).get('project_id')
+    if previous_project_id is not None and previous_project_id != instance.project_id:
+        record_change(ChangeLog.EXPENSE, instance.pk, ChangeLog.UPDATE, previous_project_id, using)
+
+
+@receiver(post_delete, sender=Expense)
+def expense_deleted(sender, instance, using, **kwargs):
+    record_change(ChangeLog.EXPENSE, instance.pk, ChangeLog.DELETE, instance.project_id, using)
+
+
+def current_cursor():
+    """
+    Return the sequence number of the newest change log entry.
+    """
+    return ChangeLog.objects.aggregate(seq=Max('seq'))['seq'] or 0
+
+
+def change_log_horizon():
+    """
+    Return the highest sequence number removed by compaction.
+    """
+    horizon = ChangeLogHorizon.objects.filter(pk=1).values_list('seq', flat=True).first()
+    return horizon or 0
+
+
+def project_data_version(project_id):
+    """
+    Return a version number that increases whenever a project or any of its
+    expenses is written. Compaction keeps the newest entry of every project,
+    so the version never goes back to a value it had before.
+    """
+    return ChangeLog.objects.filter(project_id=project_id).aggregate(
+        seq=Max('seq')
+    )['seq'] or 0
+
+
+def get_changes(since, limit=DEFAULT_CHANGE_PAGE_SIZE):
+    """
+    Return the compacted changes recorded after the cursor since.
+
+    Multiple entries for the same object collapse into its final state:
+    objects that still exist are returned in full under 'upserted', removed
+    ones by id under 'deleted'. Objects both created and removed within the
+    range are left out. When since predates the compaction horizon the
+    response asks the client to resync from scratch.
+    """
+    cursor = current_cursor()
+    if since < change_log_horizon() or since > cursor:
+        return {'resync': True, 'cursor': cursor}
+
+    entries = list(
+        ChangeLog.objects.filter(seq__gt=since)
+        .order_by('seq')
+        .values_list('seq', 'model', 'object_id', 'operation')[:limit + 1]
+    )
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    # Final operation per object, and whether the object was created in range
+    final = {ChangeLog.PROJECT: {}, ChangeLog.EXPENSE: {}}
+    created = set()
+    for seq, model, object_id, operation in entries:
+        if operation == ChangeLog.INSERT and object_id not in final[model]:
+            created.add((model, object_id))
+        final[model][object_id] = operation
+
+    def split(model):
+        upserted, deleted = [], []
+        for object_id, operation in final[model].items():
+            if operation != ChangeLog.DELETE:
+                upserted.append(object_id)
+            elif (model, object_id) not in created:
+                deleted.append(object_id)
+        return upserted, deleted
+
+    project_ids, deleted_projects = split(ChangeLog.PROJECT)
+    expense_ids, deleted_expenses = split(ChangeLog.EXPENSE)
+
+    # Objects removed after the end of this page are skipped here; their
+    # delete entries are delivered with a later page.
+    projects = Project.objects.active().filter(pk__in=project_ids)
+    pending = pending_deletion_ids() if is_sharded() else None
+    expenses = list(chain.from_iterable(
+        visible_expenses(Expense, shard, pending).filter(pk__in=expense_ids)
+        for shard in expense_shards()
+    ))
+
+    return {
+        'resync': False,
+        'cursor': entries[-1][0] if entries else since,
+        'has_more': has_more,
+        'projects': {
+            'upserted': ProjectSummarySerializer(projects, many=True).data,
+            'deleted': deleted_projects,
+        },
+        'expenses': {
+            'upserted': ExpenseSerializer(expenses, many=True).data,
+            'deleted': deleted_expenses,
+        },
+    }
+
+
+def compact_change_log(retention=None):
+    """
+    Compact the change log.
+
+    Entries superseded by a newer entry for the same object are always
+    removed, since clients only ever see an object's final state. Entries
+    older than the retention period are removed as well and the horizon
+    is advanced, so clients with older cursors are told to resync.
+
+    The newest entry of each existing project is kept either way: it is the
+    project's data version, which statistics are cached against, and must
+    not go backwards. An expense moved to another project leaves its newest
+    entry under the project it left, for instance.
+    Returns the number of removed entries.
+    """
+    if retention is None:
+        retention = timedelta(days=getattr(settings, 'CHANGE_LOG_RETENTION_DAYS', 30))
+
+    with transaction.atomic():
+        latest = (
+            ChangeLog.objects.values('model', 'object_id')
+            .annotate(latest_seq=Max('seq'))
+            .values('latest_seq')
+        )
+        versions = (
+            ChangeLog.objects.filter(project_id__in=Project.objects.values('pk'))
+            .values('project_id')
+            .annotate(latest_seq=Max('seq'))
+            .values('latest_seq')
+        )
+        removed, _ = (
+            ChangeLog.objects.exclude(seq__in=Subquery(latest))
+            .exclude(seq__in=Subquery(versions))
+            .delete()
+        )
+
+        # The newest entry is always kept so the current cursor survives
+        cursor = current_cursor()
+        expired = ChangeLog.objects.filter(
+            created_at__lt=timezone.now() - retention,
+            seq__lt=cursor
+        ).aggregate(seq=Max('seq'))['seq']
+        if expired:
+            count, _ = (
+                ChangeLog.objects.filter(seq__lte=expired)
+                .exclude(seq__in=Subquery(versions))
+                .delete()
+            )
+            removed += count
+            horizon, _ = ChangeLogHorizon.objects.get_or_create(pk=1)
+            if expired > horizon.seq:
+                horizon.seq = expired
+                horizon.save(update_fields=['seq'])
+
+    return removed
@@ -0,0 +1,64 @@
+"""
+Compression of API payloads.
+
+JSON and CSV responses of at least COMPRESSION_MIN_SIZE bytes are
+compressed with brotli when the client accepts it and the brotli package
+(in requirements.txt) is installed, and with gzip otherwise. Other responses, like PDF
+and Excel statements or columnar exports, are already compressed and are
+left alone.
+"""
+
+import re
+
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.regex_helper import _lazy_re_compile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+COMPRESSIBLE_TYPES = {'application/json', 'text/csv'}
+
+re_accepts_brotli = _lazy_re_compile(r'\bbr\b')
+
+
+def _min_size():
+    return getattr(settings, 'COMPRESSION_MIN_SIZE', 1024)
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    GZipMiddleware limited to JSON and CSV payloads above a size threshold,
+    using brotli when available.
+    """
+
+    def process_response(self, request, response):
+        content_type = response.get('Content-Type', '').split(';')[0].strip()
+        if content_type not in COMPRESSIBLE_TYPES:
+            return response
+        if not response.streaming and len(response.content) < _min_size():
+            return response
+
+        accepts_brotli = re_accepts_brotli.search(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if brotli is None or response.streaming or not accepts_brotli:
+            return super().process_response(request, response)
+
+        if response.has_header('Content-Encoding'):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        compressed = brotli.compress(
+            response.content,
+            quality=getattr(settings, 'COMPRESSION_BROTLI_QUALITY', 5)
+        )
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response.headers['Content-Length'] = str(len(compressed))
+        if response.has_header('ETag'):
+            response.headers['ETag'] = re.sub(r'^"', 'W/"', response.headers['ETag'])
+        response.headers['Content-Encoding'] = 'br'
+        return response
@@ -0,0 +1,126 @@
+"""
+Batched background deletion of projects.
+
+Deleting a project through the ORM collects every related expense into
+memory and removes them all in one long transaction, locking SQLite for
+everyone else. Instead, a project is first marked as pending deletion,
+which hides it from the API at once, and its expenses are then deleted in
+bounded batches, each in its own short transaction, by a background thread.
+"""
+
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .changes import record_change, record_changes
+from .models import Project, ChangeLog
+from .sharding import SHARDED_MODELS, expense_shards
+
+
+logger = logging.getLogger(__name__)
+
+
+def request_project_deletion(project):
+    """
+    Mark a project as pending deletion and schedule its removal.
+
+    The project disappears from list, detail and statement queries as soon
+    as this returns; its expenses are deleted in the background once the
+    surrounding transaction commits.
+    """
+    with transaction.atomic():
+        marked = Project.objects.active().filter(pk=project.pk).update(
+            deletion_requested_at=timezone.now()
+        )
+        if marked:
+            record_change(ChangeLog.PROJECT, project.pk, ChangeLog.DELETE, project.pk)
+            transaction.on_commit(lambda: start_background_deletion(project.pk))
+    return bool(marked)
+
+
+def start_background_deletion(project_id):
+    """
+    Delete a pending project from a daemon thread.
+    """
+    thread = threading.Thread(
+        target=_run_in_thread,
+        args=(project_id,),
+        name=f'delete-project-{project_id}',
+        daemon=True
+    )
+    thread.start()
+    return thread
+
+
+def _run_in_thread(project_id):
+    try:
+        delete_project_in_batches(project_id)
+    except Exception:
+        # The project stays pending and is picked up by process_deletions
+        logger.exception("Background deletion of project %s failed", project_id)
+    finally:
+        connections.close_all()
+
+
+def delete_project_in_batches(project_id, batch_size=None, pause=None):
+    """
+    Delete a pending project's expenses, then its archived expenses, in
+    batches on every shard, then the project itself.
+
+    Each batch runs in its own transaction so other writers only ever wait
+    for one batch. Returns the number of deleted expenses.
+    """
+    if batch_size is None:
+        batch_size = getattr(settings, 'PROJECT_DELETION_BATCH_SIZE', 1000)
+    if pause is None:
+        pause = getattr(settings, 'PROJECT_DELETION_BATCH_PAUSE', 0.05)
+
+    if not Project.objects.pending_deletion().filter(pk=project_id).exists():
+        return 0
+
+    deleted = 0
+    # Every shard is swept, in case a rebalance left rows behind
+    for model in SHARDED_MODELS:
+        for shard in expense_shards():
+            deleted += _delete_in_batches(model, shard, project_id, batch_size, pause)
+
+    Project.objects.filter(pk=project_id).delete()
+    logger.info("Deleted project %s and %s expenses", project_id, deleted)
+    return deleted
+
+
+def _delete_in_batches(model, shard, project_id, batch_size, pause):
+    deleted = 0
+    while True:
+        with transaction.atomic(using=shard):
+            expense_ids = list(
+                model.objects.using(shard).filter(project_id=project_id)
+                .order_by()
+                .values_list('pk', flat=True)[:batch_size]
+            )
+            if not expense_ids:
+                return deleted
+            record_changes(ChangeLog.EXPENSE, expense_ids, ChangeLog.DELETE, project_id, shard)
+            # Expenses have no dependent rows, so a plain DELETE is enough and
+            # avoids loading the batch through the deletion collector.
+            batch = model.objects.using(shard).filter(pk__in=expense_ids)
+            deleted += batch._raw_delete(shard)
+        if pause:
+            time.sleep(pause)
+
+
+def process_pending_deletions(batch_size=None, pause=None):
+    """
+    Finish deleting every project still pending deletion.
+
+    Used to resume work interrupted by a restart. Returns the number of
+    processed projects.
+    """
+    project_ids = list(Project.objects.pending_deletion().values_list('pk', flat=True))
+    for project_id in project_ids:
+        delete_project_in_batches(project_id, batch_size=batch_size, pause=pause)
+    return len(project_ids)
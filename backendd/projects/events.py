@@ -0,0 +1,348 @@
+"""
+Server-Sent Events push channel for the expense tracker.
+
+Each worker process runs one EventBroker. While it has subscribers, the
+broker polls the change log, which lives in the shared SQLite database and
+therefore sees writes made by every worker, and fans new events out to
+its local subscribers. Every subscriber has a bounded queue: a client that
+falls behind gets a single 'resync' event instead of growing the queue.
+
+When the change log cannot be read, the broker backs off and retries;
+after EVENTS_MAX_FAILURES failures in a row it closes every subscriber's
+stream, and clients reconnect and catch up through /api/changes/.
+"""
+
+import asyncio
+import json
+import logging
+import re
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DatabaseError
+from django.http import JsonResponse
+
+from .changes import current_cursor
+from .models import Project, ChangeLog
+from .sharding import attach_expense_totals, is_sharded
+
+
+# Maximum number of change log entries read per poll
+EVENT_BATCH_SIZE = 1000
+
+# Queued on idle subscribers to keep their connection open
+KEEPALIVE = {'event': 'keepalive'}
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """
+    A single SSE client's view of the event stream.
+    """
+
+    def __init__(self, project_id, queue_size):
+        self.project_id = project_id
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.lagging = False
+        self.closed = False
+
+    def wants(self, event):
+        """
+        Return whether the event concerns this subscriber.
+        """
+        return self.project_id is None or event['data'].get('project') == self.project_id
+
+    def offer(self, event):
+        """
+        Queue an event without blocking the broker.
+
+        When the queue is full the pending events are dropped and the
+        subscriber is flagged, so it receives one 'resync' event once it
+        catches up.
+        """
+        if self.lagging or self.closed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.lagging = True
+
+    def ping(self):
+        """
+        Queue a keep-alive if the subscriber has nothing else pending.
+        """
+        if self.queue.empty() and not self.lagging and not self.closed:
+            self.queue.put_nowait(KEEPALIVE)
+
+    def close(self):
+        """
+        Wake the subscriber up and make it stop.
+        """
+        self.closed = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+    async def get(self):
+        """
+        Wait for the next event for this subscriber, or None once closed.
+        """
+        if self.lagging and self.queue.empty():
+            self.lagging = False
+            return {'event': 'resync', 'data': {}}
+        return await self.queue.get()
+
+
+class EventBroker:
+    """
+    In-process publisher of project and expense change events.
+    """
+
+    def __init__(self, poll_interval=None, queue_size=None, heartbeat_interval=None,
+                 max_backoff=None, max_failures=None):
+        self.poll_interval = poll_interval or getattr(settings, 'EVENTS_POLL_INTERVAL', 0.5)
+        self.queue_size = queue_size or getattr(settings, 'EVENTS_QUEUE_SIZE', 100)
+        self.heartbeat_interval = (
+            heartbeat_interval or getattr(settings, 'EVENTS_HEARTBEAT_INTERVAL', 15)
+        )
+        self.max_backoff = max_backoff or getattr(settings, 'EVENTS_MAX_BACKOFF', 30)
+        self.max_failures = max_failures or getattr(settings, 'EVENTS_MAX_FAILURES', 10)
+        self.subscribers = set()
+        self.cursor = 0
+        self._poller = None
+
+    def subscribe(self, project_id=None):
+        """
+        Register a new subscriber.
+        """
+        subscription = Subscription(project_id, self.queue_size)
+        self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self.subscribers.discard(subscription)
+
+    def close_all(self):
+        """
+        End the stream of every subscriber.
+        """
+        for subscription in self.subscribers:
+            subscription.close()
+        self.subscribers.clear()
+
+    def start(self):
+        """
+        Start the poller unless it is already running.
+        """
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.ensure_future(self._poll())
+
+    def publish(self, events):
+        """
+        Fan events out to all interested subscribers.
+        """
+        for event in events:
+            for subscription in self.subscribers:
+                if subscription.wants(event):
+                    subscription.offer(event)
+
+    async def _poll(self):
+        """
+        Poll the change log while there are subscribers, closing them all
+        if the poller fails for good.
+        """
+        try:
+            await self._poll_change_log()
+        except Exception:
+            logger.exception("Event broker stopped, closing %d subscribers", len(self.subscribers))
+            self.close_all()
+
+    async def _poll_change_log(self):
+        """
+        Read and publish change log entries while there are subscribers.
+
+        Database errors are retried with exponential backoff, up to
+        max_failures in a row. Keep-alives are sent from here too, so idle
+        connections cost no timer of their own.
+        """
+        self.cursor = None
+        loop = asyncio.get_running_loop()
+        last_heartbeat = loop.time()
+        failures = 0
+        while self.subscribers:
+            if loop.time() - last_heartbeat >= self.heartbeat_interval:
+                last_heartbeat = loop.time()
+                for subscription in self.subscribers:
+                    subscription.ping()
+            try:
+                if self.cursor is None:
+                    self.cursor = await sync_to_async(current_cursor)()
+                events, self.cursor = await sync_to_async(self.read_events)(self.cursor)
+            except DatabaseError:
+                failures += 1
+                if failures >= self.max_failures:
+                    raise
+                delay = min(self.poll_interval * 2 ** failures, self.max_backoff)
+                logger.warning("Reading the change log failed, retrying in %.1fs", delay,
+                               exc_info=True)
+                await asyncio.sleep(delay)
+                continue
+            failures = 0
+            self.publish(events)
+            if len(events) < EVENT_BATCH_SIZE:
+                await asyncio.sleep(self.poll_interval)
+
+    def read_events(self, cursor):
+        """
+        Read change log entries after cursor and turn them into events.
+
+        Totals of every affected project are computed once per batch and
+        shared by all subscribers. Returns the events and the new cursor.
+        """
+        entries = list(
+            ChangeLog.objects.filter(seq__gt=cursor)
+            .order_by('seq')
+            .values_list('seq', 'model', 'object_id', 'operation', 'project_id')[:EVENT_BATCH_SIZE]
+        )
+        if not entries:
+            return [], cursor
+
+        events = []
+        affected = {}
+        for seq, model, object_id, operation, project_id in entries:
+            events.append({
+                'event': model,
+                'id': seq,
+                'data': {'operation': operation, 'id': object_id, 'project': project_id},
+            })
+            affected[project_id] = seq
+
+        projects = Project.objects.active().filter(pk__in=affected)
+        if is_sharded():
+            totals = [
+                (project.pk, project.expenses_total, project.expenses_count)
+                for project in attach_expense_totals(projects)
+            ]
+        else:
+            totals = projects.with_totals().values_list('pk', 'expenses_total', 'expenses_count')
+        for project_id, total, count in totals:
+            events.append({
+                'event': 'project_total',
+                'id': affected[project_id],
+                'data': {
+                    'project': project_id,
+                    'total_expenses': float(total or 0),
+                    'expense_count': count,
+                },
+            })
+
+        return events, entries[-1][0]
+
+
+broker = EventBroker()
+
+
+def format_event(event):
+    """
+    Encode an event in the text/event-stream format.
+    """
+    lines = f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+    if 'id' in event:
+        lines = f"id: {event['id']}\n" + lines
+    return lines.encode()
+
+
+def cors_headers(scope):
+    """
+    Return the CORS response headers for the request's Origin, following
+    the django-cors-headers settings that apply to the API views.
+    """
+    origin = dict(scope.get('headers', [])).get(b'origin', b'').decode('latin-1')
+    if not origin:
+        return []
+    if getattr(settings, 'CORS_ALLOW_ALL_ORIGINS', False):
+        if not getattr(settings, 'CORS_ALLOW_CREDENTIALS', False):
+            return [(b'access-control-allow-origin', b'*')]
+    elif not (
+        origin in getattr(settings, 'CORS_ALLOWED_ORIGINS', [])
+        or any(re.match(pattern, origin)
+               for pattern in getattr(settings, 'CORS_ALLOWED_ORIGIN_REGEXES', []))
+    ):
+        return [(b'vary', b'origin')]
+    headers = [(b'access-control-allow-origin', origin.encode('latin-1')), (b'vary', b'origin')]
+    if getattr(settings, 'CORS_ALLOW_CREDENTIALS', False):
+        headers.append((b'access-control-allow-credentials', b'true'))
+    return headers
+
+
+async def sse_application(scope, receive, send):
+    """
+    ASGI application streaming change events to a client.
+
+    Query parameters:
+    - project: Only send events for this project ID
+
+    Events carry the change log sequence number as their id; after a
+    reconnect or a 'resync' event, clients catch up through
+    /api/changes/?since=<id>.
+    """
+    query = parse_qs(scope.get('query_string', b'').decode())
+    try:
+        project_id = int(query['project'][0]) if 'project' in query else None
+    except ValueError:
+        await send({'type': 'http.response.start', 'status': 400, 'headers': []})
+        await send({'type': 'http.response.body', 'body': b'project must be an integer.'})
+        return
+
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+            *cors_headers(scope),
+        ],
+    })
+
+    subscription = broker.subscribe(project_id)
+    broker.start()
+    watcher = asyncio.ensure_future(_close_on_disconnect(receive, subscription))
+    try:
+        await send({'type': 'http.response.body', 'body': b'retry: 3000\n\n', 'more_body': True})
+        while True:
+            event = await subscription.get()
+            if event is None:
+                break
+            body = b': keepalive\n\n' if event is KEEPALIVE else format_event(event)
+            await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+    except OSError:
+        # The client went away while we were writing
+        pass
+    finally:
+        broker.unsubscribe(subscription)
+        watcher.cancel()
+
+
+async def _close_on_disconnect(receive, subscription):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            subscription.close()
+            return
+
+
+def events_unavailable(request):
+    """
+    Answer /api/events/ when it reaches Django, which only happens when the
+    site is not served by expense_tracker.asgi (runserver, WSGI).
+    """
+    return JsonResponse(
+        {'error': "The event stream requires the ASGI server, e.g. "
+                  "uvicorn expense_tracker.asgi:application."},
+        status=501
+    )
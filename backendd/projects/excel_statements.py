@@ -0,0 +1,144 @@
+"""
+Excel statements for the expense tracker, rendered with openpyxl.
+
+render_project_workbook() builds the workbook in memory. Statements of
+projects too large for that are written by write_project_workbook() with a
+write-only workbook, which streams rows out to disk as they are appended.
+"""
+
+import io
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, Alignment, PatternFill
+
+from .renderers import statement_header, statement_rows
+
+
+def render_project_workbook(project):
+    """
+    Render a project's Excel statement and return the workbook's bytes.
+    """
+    # Create workbook and worksheet
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Expense Statement"
+
+    # Define styles
+    header_font = Font(bold=True, size=14)
+    title_font = Font(bold=True, size=18)
+    normal_font = Font(size=12)
+
+    header_fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
+    center_alignment = Alignment(horizontal="center")
+
+    # Title
+    ws['A1'] = "Expense Statement"
+    ws['A1'].font = title_font
+    ws['A1'].alignment = center_alignment
+    ws.merge_cells('A1:C1')
+
+    # Project information
+    expense_count = project.expense_count
+    for row, (label, value) in enumerate(statement_header(project, expense_count), start=3):
+        ws[f'A{row}'] = label
+        ws[f'B{row}'] = value
+        ws[f'A{row}'].font = header_font
+        ws[f'B{row}'].font = normal_font
+
+    # Expenses header
+    if expense_count:
+        ws['A9'] = "Expense Details"
+        ws['A9'].font = title_font
+        ws.merge_cells('A9:C9')
+
+        # Table headers
+        ws['A11'] = "Date"
+        ws['B11'] = "Description"
+        ws['C11'] = "Amount"
+
+        for col in ['A11', 'B11', 'C11']:
+            ws[col].font = header_font
+            ws[col].fill = header_fill
+
+        # Add expense data
+        row = 12
+        for date, description, amount in statement_rows(project):
+            ws[f'A{row}'] = date.strftime('%Y-%m-%d')
+            ws[f'B{row}'] = description
+            ws[f'C{row}'] = float(amount)
+
+            # Style the row
+            for col in ['A', 'B', 'C']:
+                ws[f'{col}{row}'].font = normal_font
+
+            row += 1
+
+        # Format amount column as currency
+        for r in range(12, row):
+            ws[f'C{r}'].number_format = '$#,##0.00'
+    else:
+        ws['A9'] = "No expenses recorded for this project."
+        ws['A9'].font = normal_font
+
+    # Adjust column widths
+    ws.column_dimensions['A'].width = 15
+    ws.column_dimensions['B'].width = 40
+    ws.column_dimensions['C'].width = 15
+
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+def write_project_workbook(project, file):
+    """
+    Write a project's Excel statement to a binary file with a write-only
+    workbook; the sheet has the same layout and styles as
+    render_project_workbook()'s.
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Expense Statement")
+
+    header_font = Font(bold=True, size=14)
+    title_font = Font(bold=True, size=18)
+    normal_font = Font(size=12)
+    header_fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
+
+    def cell(value, font, **styles):
+        cell = WriteOnlyCell(ws, value=value)
+        cell.font = font
+        for name, style in styles.items():
+            setattr(cell, name, style)
+        return cell
+
+    # Column widths and merged cells must be set before the first row
+    ws.column_dimensions['A'].width = 15
+    ws.column_dimensions['B'].width = 40
+    ws.column_dimensions['C'].width = 15
+    expense_count = project.expense_count
+    ws.merged_cells.add('A1:C1')
+    if expense_count:
+        ws.merged_cells.add('A9:C9')
+
+    ws.append([cell("Expense Statement", title_font, alignment=Alignment(horizontal="center"))])
+    ws.append([])
+
+    for label, value in statement_header(project, expense_count):
+        ws.append([cell(label, header_font), cell(value, normal_font)])
+    ws.append([])
+
+    if expense_count:
+        ws.append([cell("Expense Details", title_font)])
+        ws.append([])
+        ws.append([cell(name, header_font, fill=header_fill) for name in ('Date', 'Description', 'Amount')])
+        for date, description, amount in statement_rows(project):
+            ws.append([
+                cell(date.strftime('%Y-%m-%d'), normal_font),
+                cell(description, normal_font),
+                cell(float(amount), normal_font, number_format='$#,##0.00'),
+            ])
+    else:
+        ws.append([cell("No expenses recorded for this project.", normal_font)])
+
+    wb.save(file)
@@ -0,0 +1,217 @@
+"""
+Columnar analytics export of projects and expenses.
+
+Rows are read with keyset-paginated values_list queries and converted
+into Arrow record batches one chunk at a time, then written as an Arrow
+IPC stream or a Parquet file, so memory stays bounded however many rows
+are exported. Project ids and categories are dictionary-encoded and
+amounts are kept as decimals. Expenses are exported shard after shard,
+archived expenses included.
+
+pyarrow is an optional dependency; ExportUnavailable is raised when it is
+not installed.
+"""
+
+from itertools import chain
+
+from django.conf import settings
+
+from .archive import reaches_archive
+from .models import Project, Expense, ArchivedExpense
+from .sharding import expense_shards, is_sharded, pending_deletion_ids, project_shard, visible_expenses
+
+
+EXPORT_FORMATS = {
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+DATASETS = ['expenses', 'projects']
+
+
+class ExportUnavailable(Exception):
+    """
+    Raised when the optional pyarrow dependency is not installed.
+    """
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        raise ExportUnavailable("Columnar export requires pyarrow: pip install pyarrow")
+    return pyarrow
+
+
+def _expense_querysets(project_id=None):
+    """
+    Return the querysets holding the exported expenses of a project, or of
+    all projects: the expenses table, plus the archive when the project has
+    archived expenses, on every shard holding them. As in expense_sources(),
+    but leaving out projects pending deletion.
+    """
+    shards = expense_shards() if project_id is None else [project_shard(project_id)]
+    models = [Expense, ArchivedExpense] if reaches_archive(project_id) else [Expense]
+    pending = pending_deletion_ids() if is_sharded() else None
+    querysets = [visible_expenses(model, shard, pending) for model in models for shard in shards]
+    if project_id is not None:
+        querysets = [queryset.filter(project_id=project_id) for queryset in querysets]
+    return querysets
+
+
+def _project_querysets(project_id=None):
+    projects = Project.objects.active()
+    if project_id is not None:
+        projects = projects.filter(pk=project_id)
+    return [projects]
+
+
+def _datasets(pa):
+    """
+    Return the function returning the exported querysets, columns and
+    Arrow schema of every dataset.
+    """
+    return {
+        'expenses': (
+            _expense_querysets,
+            ['id', 'project_id', 'amount', 'description', 'category', 'date', 'created_at'],
+            pa.schema([
+                ('id', pa.int64()),
+                ('project_id', pa.dictionary(pa.int32(), pa.int64())),
+                ('amount', pa.decimal128(10, 2)),
+                ('description', pa.string()),
+                ('category', pa.dictionary(pa.int32(), pa.string())),
+                ('date', pa.date32()),
+                ('created_at', pa.timestamp('us', tz='UTC')),
+            ]),
+        ),
+        'projects': (
+            _project_querysets,
+            ['id', 'name', 'description', 'budget', 'created_at'],
+            pa.schema([
+                ('id', pa.int64()),
+                ('name', pa.string()),
+                ('description', pa.string()),
+                ('budget', pa.decimal128(14, 2)),
+                ('created_at', pa.timestamp('us', tz='UTC')),
+            ]),
+        ),
+    }
+
+
+def iter_record_batches(pa, queryset, columns, schema, batch_size):
+    """
+    Yield Arrow record batches for a queryset, batch_size rows at a time.
+    """
+    last_id = 0
+    while True:
+        rows = list(
+            queryset.filter(pk__gt=last_id)
+            .order_by('pk')
+            .values_list(*columns)[:batch_size]
+        )
+        if not rows:
+            return
+        arrays = []
+        for field, values in zip(schema, zip(*rows)):
+            if pa.types.is_dictionary(field.type):
+                array = pa.array(values, type=field.type.value_type).dictionary_encode()
+                arrays.append(array.cast(field.type))
+            else:
+                arrays.append(pa.array(values, type=field.type))
+        yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+        last_id = rows[-1][0]
+
+
+class _ChunkSink:
+    """
+    Write-only file object collecting output until it is drained.
+    """
+
+    closed = False
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _open_writer(pa, sink, export_format, schema):
+    if export_format == 'parquet':
+        return pa.parquet.ParquetWriter(sink, schema, compression='zstd')
+    return pa.ipc.new_stream(sink, schema, options=pa.ipc.IpcWriteOptions(compression='zstd'))
+
+
+def _batch_size(batch_size):
+    if batch_size is None:
+        return getattr(settings, 'EXPORT_BATCH_SIZE', 65536)
+    return batch_size
+
+
+def _resolve(dataset, export_format, project_id):
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(EXPORT_FORMATS)}.")
+    if dataset not in DATASETS:
+        raise ValueError(f"dataset must be one of: {', '.join(DATASETS)}.")
+    pa = _pyarrow()
+    querysets, columns, schema = _datasets(pa)[dataset]
+    return pa, querysets(project_id), columns, schema
+
+
+def _record_batches(pa, querysets, columns, schema, batch_size):
+    return chain.from_iterable(
+        iter_record_batches(pa, queryset, columns, schema, batch_size) for queryset in querysets
+    )
+
+
+def export_to_file(path, dataset, export_format, project_id=None, batch_size=None):
+    """
+    Export a dataset to a file. Returns the number of exported rows.
+    """
+    pa, querysets, columns, schema = _resolve(dataset, export_format, project_id)
+    rows = 0
+    with _open_writer(pa, str(path), export_format, schema) as writer:
+        for batch in _record_batches(pa, querysets, columns, schema, _batch_size(batch_size)):
+            writer.write_batch(batch)
+            rows += batch.num_rows
+    return rows
+
+
+def stream_export(dataset, export_format, project_id=None, batch_size=None):
+    """
+    Return an iterator of byte chunks of an exported dataset.
+
+    Arguments are validated and pyarrow is imported before the iterator is
+    returned, so errors surface before a response is started.
+    """
+    pa, querysets, columns, schema = _resolve(dataset, export_format, project_id)
+
+    def chunks():
+        sink = _ChunkSink()
+        writer = _open_writer(pa, pa.PythonFile(sink, mode='w'), export_format, schema)
+        for batch in _record_batches(pa, querysets, columns, schema, _batch_size(batch_size)):
+            writer.write_batch(batch)
+            yield sink.drain()
+        writer.close()
+        yield sink.drain()
+
+    return chunks()
@@ -0,0 +1,74 @@
+"""
+Custom model fields for the expense tracker application.
+"""
+
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+from django import forms
+from django.core import exceptions
+from django.db import models
+
+
+CENT = Decimal('0.01')
+
+
+class CentsField(models.BigIntegerField):
+    """
+    Money amount stored as an integer number of cents and exposed as a
+    Decimal with two decimal places.
+
+    Sums, comparisons and ordering run on integers in the database, so
+    aggregates are exact and no per-row numeric conversion is needed until
+    a value is returned. Lookups and aggregates take and return Decimals.
+    """
+    description = "Money amount stored in cents"
+
+    def __init__(self, *args, max_digits=10, **kwargs):
+        self.max_digits = max_digits
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.max_digits != 10:
+            kwargs['max_digits'] = self.max_digits
+        return name, path, args, kwargs
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return Decimal(value).scaleb(-2).quantize(CENT)
+
+    def to_python(self, value):
+        if value is None or isinstance(value, Decimal) and value.as_tuple().exponent == -2:
+            return value
+        try:
+            if isinstance(value, float):
+                value = str(value)
+            return Decimal(value).quantize(CENT, rounding=ROUND_HALF_UP)
+        except (InvalidOperation, TypeError, ValueError):
+            raise exceptions.ValidationError(
+                "'%(value)s' value must be a decimal number.",
+                code='invalid',
+                params={'value': value},
+            )
+
+    def get_prep_value(self, value):
+        value = models.Field.get_prep_value(self, value)
+        if value is None:
+            return value
+        return int(self.to_python(value).scaleb(2))
+
+    def formfield(self, **kwargs):
+        return models.Field.formfield(self, **{
+            'form_class': forms.DecimalField,
+            'max_digits': self.max_digits,
+            'decimal_places': 2,
+            **kwargs,
+        })
+
+
+def cents(field_name):
+    """
+    Select a CentsField as its raw integer number of cents.
+    """
+    return models.ExpressionWrapper(models.F(field_name), output_field=models.BigIntegerField())
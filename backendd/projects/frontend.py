@@ -0,0 +1,71 @@
+"""
+Serving the built frontend.
+
+WhiteNoise serves the files of the Vite build (FRONTEND_DIST) and the
+collected static files, with their precompressed brotli and gzip variants.
+Files with a content hash in their name never change, so they are cached
+for a year; index.html is served for every other page so client-side routes
+work, and is revalidated on every load so new builds are picked up.
+
+collectstatic also writes the brotli and gzip variants of the Vite build,
+see compress_frontend().
+"""
+
+import os
+import re
+
+from django.conf import settings
+from django.http import FileResponse, Http404
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import require_safe
+from whitenoise.compress import Compressor
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+
+# Vite writes hashed assets like /assets/index-BZ3v1pXk.js
+VITE_ASSETS_URL = '/assets/'
+VITE_HASHED_NAME = re.compile(r'^.+-[0-9a-zA-Z_-]{8}\.[^./]+$')
+
+
+class FrontendWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise middleware that also caches the frontend's hashed assets
+    forever, next to static files with a manifest hash.
+    """
+
+    def immutable_file_test(self, path, url):
+        if url.startswith(VITE_ASSETS_URL):
+            return bool(VITE_HASHED_NAME.match(url.rsplit('/', 1)[-1]))
+        return super().immutable_file_test(path, url)
+
+
+def compress_frontend(dist=None):
+    """
+    Write brotli (when installed) and gzip variants next to every file of
+    the frontend build that compresses well. Returns the number of files
+    written.
+    """
+    dist = dist or getattr(settings, 'FRONTEND_DIST', None)
+    if dist is None or not os.path.isdir(dist):
+        return 0
+    compressor = Compressor(quiet=True)
+    written = 0
+    for dirpath, _dirs, files in os.walk(dist):
+        for filename in files:
+            if compressor.should_compress(filename):
+                written += len(compressor.compress(os.path.join(dirpath, filename)))
+    return written
+
+
+@require_safe
+def index(request):
+    """
+    Serve the frontend's index.html for client-side routes.
+    """
+    dist = getattr(settings, 'FRONTEND_DIST', None)
+    index_file = dist / 'index.html' if dist else None
+    if index_file is None or not index_file.is_file():
+        raise Http404("The frontend has not been built.")
+    response = FileResponse(index_file.open('rb'), content_type='text/html; charset=utf-8')
+    patch_cache_control(response, no_cache=True)
+    return response
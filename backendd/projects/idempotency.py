@@ -0,0 +1,171 @@
+"""
+Idempotency keys for write requests.
+
+Clients retrying a write after a timeout send the same Idempotency-Key
+header with every attempt. A key belongs to a client, method and path:
+the same key sent by another client or to another endpoint is another
+key. The first attempt claims the key by inserting an IdempotencyKey row,
+which the unique constraint on client, method, path and key makes atomic
+across workers, runs, and stores its response. Later attempts with the key get
+the stored response back without running the view again; attempts made
+while the first one is still running wait for it to finish, so duplicates
+are serialized.
+
+- A key reused with a different body on the same method and path is
+  refused with 422.
+- Only successful responses are stored: when the view fails, the key is
+  released and the request can be retried with it.
+- Keys expire after IDEMPOTENCY_KEY_TTL seconds, after which they can be
+  reused; expire_idempotency_keys deletes expired rows.
+"""
+
+import hashlib
+import json
+import time
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import IdempotencyKey
+from .throttling import client_identity
+
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+# Seconds between checks on a duplicate request that is still running
+POLL_INTERVAL = 0.05
+
+
+def fingerprint(request):
+    """
+    Return a digest of what makes a request: its method, path and body.
+    """
+    digest = hashlib.sha256(f'{request.method} {request.path}\n'.encode())
+    digest.update(request.body)
+    return digest.hexdigest()
+
+
+def _is_live(record, now):
+    """
+    Return whether a key is still in force: not expired, and not left
+    running for longer than IDEMPOTENCY_LOCK_TIMEOUT by a worker that died.
+    """
+    if record.expires_at <= now:
+        return False
+    lock_timeout = timedelta(seconds=getattr(settings, 'IDEMPOTENCY_LOCK_TIMEOUT', 60))
+    return record.status_code is not None or record.created_at > now - lock_timeout
+
+
+def key_scope(request):
+    """
+    Return the fields a key is unique within besides the key itself.
+    """
+    return {'client': client_identity(request), 'method': request.method, 'path': request.path}
+
+
+def _claim(key, scope, request_fingerprint):
+    """
+    Insert the row of a new key. Returns it, or None when another request
+    inserted the key first.
+    """
+    ttl = timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL', 86400))
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(
+                key=key, **scope, fingerprint=request_fingerprint,
+                expires_at=timezone.now() + ttl
+            )
+    except IntegrityError:
+        return None
+
+
+def _replay(record):
+    response = Response(json.loads(record.response_body), status=record.status_code)
+    response[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def _error(message, status_code):
+    return Response({'error': message}, status=status_code)
+
+
+def run_idempotent(key, request, run):
+    """
+    Return the response of run() for the first request with a key, and the
+    stored response for the requests repeating it.
+    """
+    scope = key_scope(request)
+    request_fingerprint = fingerprint(request)
+    deadline = time.monotonic() + getattr(settings, 'IDEMPOTENCY_WAIT_TIMEOUT', 10)
+    while True:
+        record = IdempotencyKey.objects.filter(key=key, **scope).first()
+        if record is None or not _is_live(record, timezone.now()):
+            if record is not None:
+                IdempotencyKey.objects.filter(pk=record.pk).delete()
+            record = _claim(key, scope, request_fingerprint)
+            if record is not None:
+                break
+            continue
+        if record.fingerprint != request_fingerprint:
+            return _error(
+                f"{HEADER} {key!r} was already used with a different request.",
+                status.HTTP_422_UNPROCESSABLE_ENTITY
+            )
+        if record.status_code is not None:
+            return _replay(record)
+        if time.monotonic() >= deadline:
+            return _error(
+                f"A request with {HEADER} {key!r} is still in progress; retry later.",
+                status.HTTP_409_CONFLICT
+            )
+        time.sleep(POLL_INTERVAL)
+
+    try:
+        # The stored response commits with the writes it describes
+        with transaction.atomic():
+            response = run()
+            if status.is_success(response.status_code):
+                IdempotencyKey.objects.filter(pk=record.pk).update(
+                    status_code=response.status_code,
+                    response_body=json.dumps(response.data, cls=JSONEncoder),
+                )
+                return response
+    except BaseException:
+        IdempotencyKey.objects.filter(pk=record.pk).delete()
+        raise
+    IdempotencyKey.objects.filter(pk=record.pk).delete()
+    return response
+
+
+def idempotent(handler):
+    """
+    Make a viewset handler honour the Idempotency-Key header.
+    """
+    @wraps(handler)
+    def wrapper(view, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return handler(view, request, *args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return _error(
+                f"{HEADER} must be 1 to {MAX_KEY_LENGTH} characters long.",
+                status.HTTP_400_BAD_REQUEST
+            )
+        return run_idempotent(key, request, lambda: handler(view, request, *args, **kwargs))
+    return wrapper
+
+
+def expire_idempotency_keys():
+    """
+    Delete expired keys. Returns the number of deleted keys.
+    """
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
@@ -0,0 +1,31 @@
+"""
+Apply the bookkeeping left in the outboxes of expense shards.
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from projects.outbox import apply_outboxes
+from projects.sharding import expense_shards
+
+
+class Command(BaseCommand):
+    help = (
+        "Apply the change log entries, spend counter deltas and snapshot invalidations "
+        "still queued in the outboxes of expense shards, e.g. after a crash."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--shards',
+            nargs='+',
+            help="Database aliases whose outboxes to apply (default: EXPENSE_SHARDS)"
+        )
+
+    def handle(self, *args, **options):
+        shards = options['shards'] or expense_shards()
+        unknown = [shard for shard in shards if shard not in settings.DATABASES]
+        if unknown:
+            raise CommandError(f"Unknown databases: {', '.join(unknown)}.")
+        count = apply_outboxes(shards)
+        self.stdout.write(self.style.SUCCESS(f"Applied {count} outbox entries."))
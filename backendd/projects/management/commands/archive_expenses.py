@@ -0,0 +1,35 @@
+"""
+Move old expenses into the archive.
+"""
+
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from projects.archive import archive_cutoff, archive_expenses
+
+
+class Command(BaseCommand):
+    help = "Move expenses dated before the archive cutoff into the archive, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--before',
+            help="Archive expenses dated before this YYYY-MM-DD date "
+                 "(default: 1 January, EXPENSE_ARCHIVE_KEEP_YEARS years back)"
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help="Expenses archived per transaction (default: EXPENSE_ARCHIVE_BATCH_SIZE)"
+        )
+
+    def handle(self, *args, **options):
+        before = archive_cutoff()
+        if options['before']:
+            try:
+                before = datetime.strptime(options['before'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError("--before must be a date in YYYY-MM-DD format.")
+        count = archive_expenses(before=before, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Archived {count} expenses dated before {before}."))
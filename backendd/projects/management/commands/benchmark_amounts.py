@@ -0,0 +1,133 @@
+"""
+Benchmark integer cents against a decimal amount column.
+
+Creates two temporary tables shaped like the expense table, one storing
+the amount with CentsField and one with the DecimalField expenses used
+before amounts were stored as integer cents, fills both with the same
+synthetic expenses and times the aggregates, amount filters, loading the
+amount column and serializing the rows against each in the same run.
+Both tables are created fresh so that only the amount column differs.
+"""
+
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.apps.registry import Apps
+from django.core.management.base import BaseCommand
+from django.db import connection, models
+from django.db.models import Count, Sum
+from rest_framework import serializers
+
+from projects.fields import CentsField
+
+
+def expense_model(name, amount_field):
+    """
+    Return an unmanaged copy of Expense, with the same indexes, storing
+    the amount with amount_field. It is registered in a private app
+    registry so that it never appears in migrations.
+    """
+    class Meta:
+        app_label = 'projects'
+        db_table = f'projects_benchmark_{name.lower()}'
+        apps = Apps()
+        managed = False
+        indexes = [
+            models.Index(fields=['project_id', 'date']),
+            models.Index(fields=['project_id', 'category', 'date']),
+            models.Index(fields=['category', 'date']),
+        ]
+
+    return type(name, (models.Model,), {
+        '__module__': __name__,
+        'Meta': Meta,
+        'project_id': models.IntegerField(db_index=True),
+        'amount': amount_field,
+        'description': models.CharField(max_length=500),
+        'category': models.CharField(max_length=100, blank=True, default=''),
+        'date': models.DateField(),
+        'created_at': models.DateTimeField(auto_now_add=True),
+    })
+
+
+def expense_serializer(model):
+    """
+    Return a serializer with ExpenseSerializer's fields for model.
+    """
+    class Meta:
+        fields = ['id', 'project_id', 'amount', 'description', 'category', 'date', 'created_at']
+
+    Meta.model = model
+    return type('BenchmarkSerializer', (serializers.ModelSerializer,), {
+        'amount': serializers.DecimalField(max_digits=10, decimal_places=2),
+        'Meta': Meta,
+    })
+
+
+class Command(BaseCommand):
+    help = "Benchmark integer cents against a decimal amount column."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--expenses',
+            type=int,
+            default=200000,
+            help="Expenses in each temporary table (default: 200000)"
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help="Runs per measurement; the best is reported (default: 5)"
+        )
+
+    def handle(self, *args, **options):
+        count = options['expenses']
+        tables = [
+            expense_model('DecimalExpense', models.DecimalField(max_digits=10, decimal_places=2)),
+            expense_model('CentsExpense', CentsField()),
+        ]
+        start = date.today()
+        with connection.schema_editor() as editor:
+            for model in tables:
+                editor.create_model(model)
+        try:
+            for model in tables:
+                model.objects.bulk_create((
+                    model(project_id=1, amount=Decimal(i % 100000) / 100 + Decimal('0.01'),
+                          description=f'Expense {i}', date=start - timedelta(days=i % 3650))
+                    for i in range(count)
+                ), batch_size=5000)
+            self._compare(tables, options['repeat'])
+        finally:
+            with connection.schema_editor() as editor:
+                for model in tables:
+                    editor.delete_model(model)
+
+    def _compare(self, tables, repeat):
+        measurements = [
+            ('aggregate Sum', lambda qs: qs.aggregate(total=Sum('amount'), count=Count('id'))),
+            ('filter amount', lambda qs: qs.filter(amount__gte=Decimal('500.00')).count()),
+            ('order by amount', lambda qs: list(qs.order_by('-amount').values_list('id', flat=True)[:100])),
+            ('load amounts', lambda qs: list(qs.values_list('amount', flat=True))),
+            ('serialize', lambda qs: expense_serializer(qs.model)(list(qs), many=True).data),
+        ]
+        querysets = [model.objects.filter(project_id=1).order_by() for model in tables]
+        self.stdout.write(f"{'operation':<16}{'decimal s':>12}{'cents s':>12}{'speedup':>10}")
+        for operation, run in measurements:
+            # Alternate the tables so that neither always runs on a warmer cache
+            best = [float('inf')] * len(querysets)
+            for _ in range(repeat):
+                for index, qs in enumerate(querysets):
+                    best[index] = min(best[index], self._time(run, qs))
+            timings = ''.join(f"{seconds:>12.3f}" for seconds in best)
+            self.stdout.write(f"{operation:<16}{timings}{best[0] / best[1]:>9.2f}x")
+        for name, qs in zip(('decimal', 'cents'), querysets):
+            total = qs.aggregate(total=Sum('amount'))['total']
+            self.stdout.write(f"{name} total: {total!r}")
+
+    def _time(self, run, qs):
+        started = time.perf_counter()
+        run(qs)
+        return time.perf_counter() - started
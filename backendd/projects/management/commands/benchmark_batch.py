@@ -0,0 +1,87 @@
+"""
+Benchmark a dashboard load as separate requests and as one batch.
+
+Creates a temporary project, then requests what the project page needs,
+once as separate requests and once through POST /api/batch/, through the
+full request handler and middleware stack, and reports the latency of
+both. Network round trips come on top of these numbers, once per request
+without batching and once in total with it.
+"""
+
+import statistics
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+
+from projects.models import Project, Expense
+
+
+class Command(BaseCommand):
+    help = "Compare dashboard load latency with and without batch requests."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--expenses',
+            type=int,
+            default=200,
+            help="Expenses in the temporary project (default: 200)"
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=50,
+            help="Number of timed loads (default: 50)"
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            nargs='+',
+            default=[1, 4],
+            help="BATCH_READ_WORKERS values to compare (default: 1 4)"
+        )
+
+    def handle(self, *args, **options):
+        project = Project.objects.create(name='Batch benchmark')
+        start = date.today()
+        Expense.objects.bulk_create([
+            Expense(project=project, amount=Decimal(i % 5000) / 100 + 1,
+                    description=f'Expense {i}', date=start - timedelta(days=i))
+            for i in range(options['expenses'])
+        ])
+        urls = [
+            f'/api/projects/{project.pk}/?exclude=expenses',
+            f'/api/expenses/?project={project.pk}',
+            f'/api/projects/{project.pk}/balance/',
+            f'/api/projects/{project.pk}/statistics/',
+            '/api/projects/?fields=id,name',
+        ]
+        client = Client(HTTP_HOST='localhost')
+        try:
+            separate = self._time(options['repeat'], lambda: [client.get(url) for url in urls])
+            self.stdout.write(f"{'mode':<24} {'median (ms)':>12} {'p90 (ms)':>10} {'requests':>9}")
+            self._report('separate requests', separate, len(urls))
+            for workers in options['workers']:
+                with override_settings(BATCH_READ_WORKERS=workers):
+                    batched = self._time(options['repeat'], lambda: client.post(
+                        '/api/batch/', {'requests': [{'url': url} for url in urls]},
+                        content_type='application/json'
+                    ))
+                self._report(f'batch, {workers} worker(s)', batched, 1)
+        finally:
+            project.delete()
+
+    def _time(self, repeat, load):
+        load()
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            load()
+            timings.append((time.perf_counter() - started) * 1000)
+        return timings
+
+    def _report(self, mode, timings, requests):
+        p90 = statistics.quantiles(timings, n=10)[-1]
+        self.stdout.write(f"{mode:<24} {statistics.median(timings):>12.2f} {p90:>10.2f} {requests:>9}")
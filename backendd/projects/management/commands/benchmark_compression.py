@@ -0,0 +1,86 @@
+"""
+Benchmark response compression on representative API payloads.
+
+Creates a temporary project, then requests the expense list, the project
+detail with all of its expenses and the project list through the full
+request handler and middleware stack, without compression and with each
+encoding the server supports, and reports body size and latency.
+"""
+
+import statistics
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+
+from projects import compression
+from projects.models import Project, Expense
+
+
+class Command(BaseCommand):
+    help = "Measure response sizes and latency with and without compression."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--expenses',
+            type=int,
+            default=2000,
+            help="Expenses in the temporary project (default: 2000)"
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=20,
+            help="Number of timed requests per payload and encoding (default: 20)"
+        )
+
+    # Throttling would answer most of the timed requests with 429
+    @override_settings(THROTTLE_BUCKETS={}, THROTTLE_MAX_IN_FLIGHT=None)
+    def handle(self, *args, **options):
+        project = Project.objects.create(name='Compression benchmark')
+        start = date.today()
+        Expense.objects.bulk_create([
+            Expense(project=project, amount=Decimal(i % 5000) / 100 + 1,
+                    description=f'Expense {i} for materials', date=start - timedelta(days=i))
+            for i in range(options['expenses'])
+        ])
+        payloads = {
+            'expense list': f'/api/expenses/?project={project.pk}',
+            'project detail': f'/api/projects/{project.pk}/',
+            'project list': '/api/projects/',
+        }
+        encodings = ['identity', 'gzip']
+        if compression.brotli is not None:
+            encodings.append('br')
+
+        client = Client(HTTP_HOST='localhost')
+        try:
+            self.stdout.write(
+                f"{'payload':<16} {'encoding':<10} {'bytes':>10} {'ratio':>7} {'median (ms)':>12}"
+            )
+            for name, url in payloads.items():
+                identity_size = None
+                for encoding in encodings:
+                    size, timings = self._measure(client, url, encoding, options['repeat'])
+                    identity_size = identity_size or size
+                    self.stdout.write(
+                        f"{name:<16} {encoding:<10} {size:>10} {size / identity_size:>7.2f} "
+                        f"{statistics.median(timings):>12.2f}"
+                    )
+        finally:
+            # Skip the per-row deletion signals for the synthetic expenses
+            expenses = Expense.objects.filter(project=project)
+            expenses._raw_delete(expenses.db)
+            project.delete()
+
+    def _measure(self, client, url, encoding, repeat):
+        response = client.get(url, HTTP_ACCEPT_ENCODING=encoding)
+        size = len(response.content)
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            client.get(url, HTTP_ACCEPT_ENCODING=encoding)
+            timings.append((time.perf_counter() - started) * 1000)
+        return size, timings
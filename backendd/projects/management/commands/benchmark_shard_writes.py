@@ -0,0 +1,172 @@
+"""
+Benchmark concurrent expense writes over 1, 2 and 4 shards.
+
+Runs against temporary databases, never the configured ones: every
+database alias is pointed at a fresh SQLite file in a temporary directory
+and migrated. Each writer process adds expenses to its own project, and
+the writers' projects are spread evenly over the shards. Writes go
+through the same path as the API: the expense is inserted on its shard
+with its bookkeeping for the default database, change log entry, spend
+counters and snapshots, which a shard other than the default database
+queues in its outbox for the writer's background applier.
+
+Three kinds of writes are timed: single expenses, one per transaction;
+batches of expenses inserted with one statement, whose bookkeeping is
+also written once per batch; and single expense rows written to their
+shard alone, without bookkeeping, which is what the shards themselves
+sustain. After each run the change log must hold an entry for every
+written expense and no outbox entry may be left.
+"""
+
+import multiprocessing
+import tempfile
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.test import override_settings
+
+from projects.changes import record_changes
+from projects.models import Project, Expense, ChangeLog, ShardOutboxEntry
+from projects.outbox import join_appliers
+from projects.spend import apply_spend_deltas, spend_by_category
+
+
+class Command(BaseCommand):
+    help = "Measure concurrent expense write throughput with 1, 2 and 4 shards, on temporary databases."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--shards',
+            type=int,
+            nargs='+',
+            default=[1, 2, 4],
+            help="Shard counts to compare (default: 1 2 4)"
+        )
+        parser.add_argument(
+            '--writers',
+            type=int,
+            default=8,
+            help="Concurrent writer processes (default: 8)"
+        )
+        parser.add_argument(
+            '--expenses',
+            type=int,
+            default=200,
+            help="Expenses written by each writer (default: 200)"
+        )
+        parser.add_argument(
+            '--batch',
+            type=int,
+            default=50,
+            help="Expenses per batched write (default: 50)"
+        )
+
+    def handle(self, *args, **options):
+        aliases = list(settings.DATABASES)
+        if max(options['shards']) > len(aliases):
+            raise CommandError(f"Only {len(aliases)} databases are configured.")
+
+        with tempfile.TemporaryDirectory() as directory:
+            connections.close_all()
+            for alias in aliases:
+                connections[alias].settings_dict.update({
+                    'NAME': str(Path(directory) / f'{alias}.sqlite3'),
+                    # Writers wait for the lock instead of failing when a
+                    # deferred transaction cannot be upgraded
+                    'OPTIONS': {
+                        'timeout': 60,
+                        'transaction_mode': 'IMMEDIATE',
+                    },
+                })
+            for alias in aliases:
+                call_command('migrate', database=alias, verbosity=0)
+
+            self.stdout.write(
+                f"{'shards':>6} {'writes':<8} {'expenses/s':>11} {'transactions/s':>15} {'speedup':>8}"
+            )
+            modes = (('single', 1), ('batched', options['batch']), ('rows', 1))
+            for mode, batch in modes:
+                baseline = None
+                for count in options['shards']:
+                    shards = aliases[:count]
+                    with override_settings(EXPENSE_SHARDS=shards):
+                        seconds = self._run(shards, options['writers'], options['expenses'], batch, mode)
+                    rate = options['writers'] * options['expenses'] / seconds
+                    baseline = baseline or rate
+                    self.stdout.write(
+                        f"{count:>6} {mode:<8} {rate:>11.0f} {rate / batch:>15.0f} {rate / baseline:>7.2f}x"
+                    )
+            connections.close_all()
+
+    def _run(self, shards, writers, expenses, batch, mode):
+        projects = [Project.objects.create(name=f'Writer {i}') for i in range(writers)]
+        for i, project in enumerate(projects):
+            project.shard = shards[i % len(shards)]
+        Project.objects.bulk_update(projects, ['shard'])
+
+        # Forked processes, so that writers are not serialized on the GIL;
+        # connections are closed first so that none is shared with them
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        start = context.Barrier(writers + 1)
+        errors = context.Queue()
+        processes = [
+            context.Process(target=self._write, args=(project, expenses, batch, mode, start, errors))
+            for project in projects
+        ]
+        for process in processes:
+            process.start()
+        start.wait()
+        started = time.perf_counter()
+        for process in processes:
+            process.join()
+        seconds = time.perf_counter() - started
+        if not errors.empty():
+            raise CommandError(f"A writer failed: {errors.get()}")
+        if mode != 'rows':
+            recorded = ChangeLog.objects.filter(
+                model=ChangeLog.EXPENSE, project_id__in=[project.pk for project in projects]
+            ).count()
+            pending = sum(ShardOutboxEntry.objects.using(shard).count() for shard in shards)
+            if recorded != writers * expenses or pending:
+                raise CommandError(
+                    f"{recorded} of {writers * expenses} changes recorded, {pending} outbox entries left."
+                )
+        return seconds
+
+    def _write(self, project, expenses, batch, mode, start, errors):
+        today = date.today()
+        try:
+            start.wait()
+            for offset in range(0, expenses, batch):
+                rows = [
+                    Expense(project=project, amount=Decimal(i % 5000) / 100 + 1,
+                            description=f'Expense {i}', date=today - timedelta(days=i % 365))
+                    for i in range(offset, min(offset + batch, expenses))
+                ]
+                with transaction.atomic(using=project.shard):
+                    if mode == 'single':
+                        rows[0].save()
+                        continue
+                    created = Expense.objects.using(project.shard).bulk_create(rows)
+                    if mode == 'rows':
+                        continue
+                    record_changes(
+                        ChangeLog.EXPENSE, [row.pk for row in created], ChangeLog.INSERT, project.pk,
+                        project.shard
+                    )
+                    apply_spend_deltas(spend_by_category(
+                        Expense.objects.using(project.shard).filter(pk__in=[row.pk for row in created])
+                    ), project.shard)
+            # The clock stops once this writer's bookkeeping is applied too
+            join_appliers()
+        except Exception as error:
+            errors.put(repr(error))
+        finally:
+            connections.close_all()
@@ -0,0 +1,79 @@
+"""
+Benchmark how many idle Server-Sent Events subscribers one worker can hold.
+
+Opens many in-process SSE connections against the real ASGI handler,
+measures the memory each idle connection holds, and the time it takes to
+fan a single event out to all of them.
+"""
+
+import asyncio
+import resource
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from projects.events import broker, sse_application
+
+
+class Command(BaseCommand):
+    help = "Benchmark memory per idle SSE subscriber and event fan-out latency."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--subscribers',
+            type=int,
+            nargs='+',
+            default=[100, 1000, 10000],
+            help="Numbers of concurrent subscribers to open (default: 100 1000 10000)"
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'subscribers':>12} {'KB/sub':>8} {'fan-out ms':>11} {'max RSS MB':>11} {'subs/GB':>10}"
+        )
+        for count in options['subscribers']:
+            per_subscriber, fan_out = asyncio.run(self._run(count))
+            max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            self.stdout.write(
+                f"{count:>12} {per_subscriber / 1024:>8.1f} {fan_out * 1000:>11.1f} "
+                f"{max_rss:>11.0f} {int(2**30 / per_subscriber):>10}"
+            )
+
+    async def _run(self, count):
+        disconnect = asyncio.Event()
+        delivered = 0
+        all_delivered = asyncio.Event()
+
+        async def receive():
+            await disconnect.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            nonlocal delivered
+            if b'event: benchmark' in message.get('body', b''):
+                delivered += 1
+                if delivered == count:
+                    all_delivered.set()
+
+        scope = {'type': 'http', 'path': '/api/events/', 'query_string': b''}
+
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        streams = [
+            asyncio.ensure_future(sse_application(scope, receive, send))
+            for _ in range(count)
+        ]
+        while len(broker.subscribers) < count:
+            await asyncio.sleep(0.05)
+        per_subscriber = (tracemalloc.get_traced_memory()[0] - baseline) / count
+        tracemalloc.stop()
+
+        started = time.perf_counter()
+        broker.publish([{'event': 'benchmark', 'id': 0, 'data': {}}])
+        await all_delivered.wait()
+        fan_out = time.perf_counter() - started
+
+        disconnect.set()
+        await asyncio.gather(*streams)
+        return per_subscriber, fan_out
@@ -0,0 +1,72 @@
+"""
+Benchmark process startup time and memory.
+
+Starts fresh Python processes that set Django up and load the URL
+configuration, as a worker does before its first request, then import the
+renderers of some statement formats. Reports the startup time and peak
+resident memory of each, so the cost of every renderer, and of preloading
+them all, can be compared with a worker that only serves the API.
+"""
+
+import json
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from projects.renderers import statement_formats
+
+
+STARTUP_SCRIPT = """
+import json, os, resource, sys, time
+started = time.perf_counter()
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'expense_tracker.settings')
+import django
+django.setup()
+from django.urls import resolve
+resolve('/api/projects/')
+formats = [name for name in sys.argv[1:] if name != 'numpy']
+if formats:
+    from projects.renderers import preload_statement_renderers
+    preload_statement_renderers(formats)
+if 'numpy' in sys.argv[1:]:
+    import numpy
+elapsed = time.perf_counter() - started
+print(json.dumps({
+    'seconds': elapsed,
+    'rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+}))
+"""
+
+
+class Command(BaseCommand):
+    help = "Measure worker startup time and memory with and without statement renderers."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help="Processes started per configuration (default: 5)"
+        )
+
+    def handle(self, *args, **options):
+        configurations = [('API only', [])]
+        configurations += [(f'+ {name} renderer', [name]) for name in statement_formats()]
+        configurations.append(('+ all renderers, numpy', statement_formats() + ['numpy']))
+
+        self.stdout.write(f"{'configuration':<28} {'startup (ms)':>13} {'peak RSS (MB)':>14}")
+        for name, formats in configurations:
+            runs = [self._start(formats) for _ in range(options['repeat'])]
+            seconds = statistics.median(run['seconds'] for run in runs)
+            rss = statistics.median(run['rss_kb'] for run in runs) / 1024
+            self.stdout.write(f"{name:<28} {seconds * 1000:>13.1f} {rss:>14.1f}")
+
+    def _start(self, formats):
+        result = subprocess.run(
+            [sys.executable, '-c', STARTUP_SCRIPT, *formats],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+        )
+        return json.loads(result.stdout.strip().splitlines()[-1])
@@ -0,0 +1,62 @@
+"""
+Benchmark PDF statement rendering across row counts.
+
+Renders statements from synthetic expense rows, without touching the
+database, and reports the time per row so that growth can be checked
+for linearity.
+"""
+
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from projects.statements import get_statement_template, render_pdf_statement
+
+
+class Command(BaseCommand):
+    help = "Benchmark PDF statement rendering for increasing numbers of expense rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows',
+            type=int,
+            nargs='+',
+            default=[100, 1000, 10000, 100000],
+            help="Row counts to render (default: 100 1000 10000 100000)"
+        )
+
+    def handle(self, *args, **options):
+        # Compile the template up front so the first run is not penalised
+        get_statement_template()
+
+        project_info = [
+            ['Project Name:', 'Benchmark'],
+            ['Description:', 'Synthetic statement'],
+            ['Created Date:', date.today().strftime('%B %d, %Y')],
+        ]
+
+        self.stdout.write(f"{'rows':>10} {'pages':>8} {'seconds':>10} {'us/row':>10} {'size (KB)':>10}")
+        for count in options['rows']:
+            rows = self._rows(count)
+            started = time.perf_counter()
+            pdf = render_pdf_statement(project_info, rows, has_rows=count > 0)
+            elapsed = time.perf_counter() - started
+            pages = pdf.count(b'/Type /Page\n')
+            per_row = elapsed / count * 1e6 if count else 0
+            self.stdout.write(
+                f"{count:>10} {pages:>8} {elapsed:>10.2f} {per_row:>10.1f} {len(pdf) / 1024:>10.0f}"
+            )
+
+    def _rows(self, count):
+        """
+        Yield synthetic (date, description, amount) rows.
+        """
+        start = date.today()
+        for i in range(count):
+            yield (
+                start - timedelta(days=i % 3650),
+                f"Expense item {i} with a reasonably long description attached",
+                Decimal(i % 100000) / 100 + Decimal('1.00'),
+            )
@@ -0,0 +1,22 @@
+"""
+Collect static files and precompress the frontend build.
+"""
+
+from django.conf import settings
+from django.contrib.staticfiles.management.commands import collectstatic
+
+from projects.frontend import compress_frontend
+
+
+class Command(collectstatic.Command):
+    help = (
+        "Collect static files into STATIC_ROOT and write brotli and gzip variants "
+        "of the frontend build (FRONTEND_DIST)."
+    )
+
+    def handle(self, **options):
+        summary = super().handle(**options)
+        if not options['dry_run']:
+            written = compress_frontend()
+            self.log(f"{written} compressed frontend files written to {settings.FRONTEND_DIST}.", level=1)
+        return summary
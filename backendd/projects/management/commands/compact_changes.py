@@ -0,0 +1,29 @@
+"""
+Compact the change log used by the change feed.
+"""
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from projects.changes import compact_change_log, change_log_horizon
+
+
+class Command(BaseCommand):
+    help = "Remove superseded and expired entries from the change log."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retention-days',
+            type=int,
+            help="Remove entries older than this many days (default: CHANGE_LOG_RETENTION_DAYS)"
+        )
+
+    def handle(self, *args, **options):
+        retention = None
+        if options['retention_days'] is not None:
+            retention = timedelta(days=options['retention_days'])
+        removed = compact_change_log(retention)
+        self.stdout.write(self.style.SUCCESS(
+            f"Removed {removed} change log entries; horizon is now #{change_log_horizon()}."
+        ))
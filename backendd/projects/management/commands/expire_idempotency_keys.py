@@ -0,0 +1,15 @@
+"""
+Delete expired idempotency keys.
+"""
+
+from django.core.management.base import BaseCommand
+
+from projects.idempotency import expire_idempotency_keys
+
+
+class Command(BaseCommand):
+    help = "Delete idempotency keys older than IDEMPOTENCY_KEY_TTL, with their stored responses."
+
+    def handle(self, *args, **options):
+        deleted = expire_idempotency_keys()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired idempotency keys."))
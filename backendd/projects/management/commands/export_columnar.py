@@ -0,0 +1,45 @@
+"""
+Export projects or expenses to an Arrow IPC stream or Parquet file.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from projects.export import export_to_file, ExportUnavailable, EXPORT_FORMATS, DATASETS
+
+
+class Command(BaseCommand):
+    help = "Export projects or expenses in a columnar format for analytics (requires pyarrow)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help="Path of the file to write")
+        parser.add_argument(
+            '--dataset',
+            choices=DATASETS,
+            default='expenses',
+            help="Data to export (default: expenses)"
+        )
+        parser.add_argument(
+            '--format',
+            choices=list(EXPORT_FORMATS),
+            default='parquet',
+            help="Output format (default: parquet)"
+        )
+        parser.add_argument('--project', type=int, help="Only export this project ID")
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help="Rows per record batch (default: EXPORT_BATCH_SIZE)"
+        )
+
+    def handle(self, *args, **options):
+        try:
+            rows = export_to_file(
+                options['output'],
+                options['dataset'],
+                options['format'],
+                project_id=options['project'],
+                batch_size=options['batch_size']
+            )
+        except ExportUnavailable as error:
+            raise CommandError(str(error))
+        self.stdout.write(self.style.SUCCESS(f"Exported {rows} rows to {options['output']}."))
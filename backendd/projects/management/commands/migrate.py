@@ -0,0 +1,37 @@
+"""
+Migrate the default database and every expense shard.
+"""
+
+from django.conf import settings
+from django.core.management.commands import migrate
+from django.db import DEFAULT_DB_ALIAS
+
+
+class Command(migrate.Command):
+    help = (
+        "Updates database schema. Without --database, migrates the default "
+        "database and then every expense shard (EXPENSE_SHARDS)."
+    )
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.set_defaults(database=None)
+
+    def get_check_kwargs(self, options):
+        if options['database'] is not None:
+            return super().get_check_kwargs(options)
+        kwargs = super().get_check_kwargs({**options, 'database': DEFAULT_DB_ALIAS})
+        return {**kwargs, 'databases': self._databases()}
+
+    def handle(self, *args, **options):
+        if options['database'] is not None:
+            return super().handle(*args, **options)
+        databases = self._databases()
+        for database in databases:
+            if len(databases) > 1:
+                self.stdout.write(self.style.MIGRATE_HEADING(f"Database {database}:"))
+            super().handle(*args, **{**options, 'database': database})
+
+    def _databases(self):
+        shards = [shard for shard in settings.EXPENSE_SHARDS if shard != DEFAULT_DB_ALIAS]
+        return [DEFAULT_DB_ALIAS, *shards]
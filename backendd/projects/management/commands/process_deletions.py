@@ -0,0 +1,22 @@
+"""
+Finish deleting projects that are pending deletion.
+"""
+
+from django.core.management.base import BaseCommand
+
+from projects.deletion import process_pending_deletions
+
+
+class Command(BaseCommand):
+    help = "Delete the expenses of projects pending deletion in batches, then the projects."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help="Expenses deleted per transaction (default: PROJECT_DELETION_BATCH_SIZE)"
+        )
+
+    def handle(self, *args, **options):
+        count = process_pending_deletions(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Processed {count} pending project deletions."))
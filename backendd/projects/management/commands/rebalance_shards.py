@@ -0,0 +1,70 @@
+"""
+Move projects' expenses to their placement over a list of shards.
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from projects.models import Project
+from projects.sharding import expense_shards, move_project, placement
+
+
+class Command(BaseCommand):
+    help = (
+        "Move each project's expenses to the shard it is placed on among the "
+        "given shards, e.g. before adding a shard to or removing one from EXPENSE_SHARDS."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--shards',
+            nargs='+',
+            help="Database aliases to place projects on, in order (default: EXPENSE_SHARDS)"
+        )
+        parser.add_argument(
+            '--project',
+            type=int,
+            action='append',
+            dest='projects',
+            help="Only rebalance this project ID (repeatable)"
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help="Expenses copied per transaction (default: SHARD_MOVE_BATCH_SIZE)"
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Only report the projects that would move"
+        )
+
+    def handle(self, *args, **options):
+        shards = options['shards'] or expense_shards()
+        unknown = [shard for shard in shards if shard not in settings.DATABASES]
+        if unknown:
+            raise CommandError(f"Unknown databases: {', '.join(unknown)}.")
+
+        projects = Project.objects.active().order_by('pk')
+        if options['projects']:
+            projects = projects.filter(pk__in=options['projects'])
+
+        moved_projects = moved_rows = 0
+        for project in projects:
+            target = placement(project.pk, shards)
+            if target == project.shard:
+                continue
+            moved_projects += 1
+            if options['dry_run']:
+                self.stdout.write(f"Project {project.pk}: {project.shard} -> {target}")
+                continue
+            rows = move_project(project, target, options['batch_size'])
+            moved_rows += rows
+            self.stdout.write(f"Project {project.pk}: moved {rows} expenses to {target}")
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f"{moved_projects} projects would move."))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"Moved {moved_projects} projects and {moved_rows} expenses."
+            ))
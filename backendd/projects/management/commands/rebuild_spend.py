@@ -0,0 +1,24 @@
+"""
+Recompute project and category spend counters from the expenses.
+"""
+
+from django.core.management.base import BaseCommand
+
+from projects.spend import rebuild_spend_counters
+
+
+class Command(BaseCommand):
+    help = "Recompute the spend counters behind budget utilization, e.g. after bulk imports."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--project',
+            type=int,
+            action='append',
+            dest='projects',
+            help="Only rebuild the counters of this project ID (repeatable)"
+        )
+
+    def handle(self, *args, **options):
+        rebuild_spend_counters(options['projects'])
+        self.stdout.write(self.style.SUCCESS("Rebuilt spend counters."))
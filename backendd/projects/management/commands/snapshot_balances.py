@@ -0,0 +1,43 @@
+"""
+Take monthly balance snapshots for large projects.
+"""
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from projects.balances import take_balance_snapshots, snapshot_min_expenses
+from projects.models import Project
+from projects.sharding import attach_expense_totals, is_sharded
+
+
+class Command(BaseCommand):
+    help = "Store month-end balance snapshots for projects with many expenses."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-expenses',
+            type=int,
+            help="Only snapshot projects with at least this many expenses "
+                 "(default: BALANCE_SNAPSHOT_MIN_EXPENSES)"
+        )
+
+    def handle(self, *args, **options):
+        min_expenses = options['min_expenses']
+        if min_expenses is None:
+            min_expenses = snapshot_min_expenses()
+
+        if is_sharded():
+            # Expenses live on the shards, so they are counted there
+            projects = [
+                project for project in attach_expense_totals(Project.objects.active())
+                if project.expenses_count >= min_expenses
+            ]
+        else:
+            projects = Project.objects.active().annotate(
+                num_expenses=Count('expenses')
+            ).filter(num_expenses__gte=min_expenses)
+
+        created = 0
+        for project in projects:
+            created += take_balance_snapshots(project)
+        self.stdout.write(self.style.SUCCESS(f"Created {created} balance snapshots."))
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.6 on 2026-10-19 06:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLogHorizon',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seq', models.BigIntegerField(default=0, help_text='Highest sequence number removed from the change log')),
+            ],
+            options={
+                'verbose_name': 'Change Log Horizon',
+            },
+        ),
+        migrations.CreateModel(
+            name='ChangeLog',
+            fields=[
+                ('seq', models.BigAutoField(help_text='Monotonically increasing sequence number', primary_key=True, serialize=False)),
+                ('model', models.CharField(choices=[('project', 'Project'), ('expense', 'Expense')], help_text='Kind of object that changed', max_length=10)),
+                ('object_id', models.BigIntegerField(help_text='Primary key of the object that changed')),
+                ('operation', models.CharField(choices=[('insert', 'Insert'), ('update', 'Update'), ('delete', 'Delete')], help_text='Type of change', max_length=6)),
+                ('project_id', models.BigIntegerField(help_text='Project the changed object belongs to')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, help_text='Timestamp when the change was recorded')),
+            ],
+            options={
+                'verbose_name': 'Change Log Entry',
+                'verbose_name_plural': 'Change Log',
+                'ordering': ['seq'],
+                'indexes': [models.Index(fields=['project_id', 'seq'], name='projects_ch_project_167c81_idx'), models.Index(fields=['model', 'object_id'], name='projects_ch_model_da64d1_idx')],
+            },
+        ),
+    ]
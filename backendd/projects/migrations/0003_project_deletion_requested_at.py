@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-19 06:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0002_change_log'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='deletion_requested_at',
+            field=models.DateTimeField(blank=True, db_index=True, help_text='Timestamp when deletion was requested; set while expenses are being deleted', null=True),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.6 on 2026-10-19 06:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0003_project_deletion_requested_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectBalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('as_of', models.DateField(help_text='Last date included in the snapshot')),
+                ('total', models.DecimalField(decimal_places=2, help_text='Total expenses up to and including as_of', max_digits=14)),
+                ('expense_count', models.PositiveIntegerField(help_text='Number of expenses up to and including as_of')),
+                ('created_at', models.DateTimeField(auto_now_add=True, help_text='Timestamp when the snapshot was taken')),
+            ],
+            options={
+                'verbose_name': 'Balance Snapshot',
+                'verbose_name_plural': 'Balance Snapshots',
+                'ordering': ['project', '-as_of'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['project', 'date'], name='projects_ex_project_c9cb3e_idx'),
+        ),
+        migrations.AddField(
+            model_name='projectbalancesnapshot',
+            name='project',
+            field=models.ForeignKey(help_text='Project this snapshot belongs to', on_delete=django.db.models.deletion.CASCADE, related_name='balance_snapshots', to='projects.project'),
+        ),
+        migrations.AddConstraint(
+            model_name='projectbalancesnapshot',
+            constraint=models.UniqueConstraint(fields=('project', 'as_of'), name='unique_project_balance_snapshot'),
+        ),
+    ]
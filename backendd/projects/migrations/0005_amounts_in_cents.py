@@ -0,0 +1,72 @@
+# Generated by Django 5.2.6 on 2026-10-19 09:10
+
+import decimal
+
+import django.core.validators
+from django.db import migrations, models
+from django.db.models import F
+from django.db.models.functions import Cast, Round
+
+import projects.fields
+
+
+def amounts_to_cents(apps, schema_editor):
+    Expense = apps.get_model('projects', 'Expense')
+    Expense.objects.update(
+        amount_cents=Cast(Round(F('amount') * 100), models.BigIntegerField())
+    )
+
+
+def cents_to_amounts(apps, schema_editor):
+    Expense = apps.get_model('projects', 'Expense')
+    Expense.objects.update(
+        amount=Cast(F('amount_cents'), models.FloatField()) / 100
+    )
+
+
+def drop_balance_snapshots(apps, schema_editor):
+    # Snapshots are derived data; snapshot_balances takes them again
+    ProjectBalanceSnapshot = apps.get_model('projects', 'ProjectBalanceSnapshot')
+    ProjectBalanceSnapshot.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0004_balance_snapshots'),
+    ]
+
+    operations = [
+        # Nullable while both columns exist, so the migration can be reversed
+        migrations.AlterField(
+            model_name='expense',
+            name='amount',
+            field=models.DecimalField(decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='expense',
+            name='amount_cents',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.RunPython(amounts_to_cents, cents_to_amounts),
+        migrations.RemoveField(
+            model_name='expense',
+            name='amount',
+        ),
+        migrations.RenameField(
+            model_name='expense',
+            old_name='amount_cents',
+            new_name='amount',
+        ),
+        migrations.AlterField(
+            model_name='expense',
+            name='amount',
+            field=projects.fields.CentsField(help_text='Amount spent (must be greater than 0), stored in cents', validators=[django.core.validators.MinValueValidator(decimal.Decimal('0.01'))]),
+        ),
+        migrations.RunPython(drop_balance_snapshots, drop_balance_snapshots),
+        migrations.AlterField(
+            model_name='projectbalancesnapshot',
+            name='total',
+            field=projects.fields.CentsField(help_text='Total expenses up to and including as_of, stored in cents', max_digits=14),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.6 on 2026-10-19 06:51
+
+import django.db.models.deletion
+import projects.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0005_amounts_in_cents'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectArchiveSummary',
+            fields=[
+                ('project', models.OneToOneField(help_text='Project these archived expenses belong to', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='archive_summary', serialize=False, to='projects.project')),
+                ('total', projects.fields.CentsField(help_text='Total of the archived expenses, stored in cents', max_digits=14)),
+                ('expense_count', models.PositiveIntegerField(help_text='Number of archived expenses')),
+                ('first_date', models.DateField(help_text='Date of the earliest archived expense')),
+                ('last_date', models.DateField(help_text='Date of the latest archived expense')),
+            ],
+            options={
+                'verbose_name': 'Archive Summary',
+                'verbose_name_plural': 'Archive Summaries',
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedExpense',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('amount', projects.fields.CentsField(help_text='Amount spent, stored in cents')),
+                ('description', models.CharField(help_text='Description of the expense', max_length=500)),
+                ('date', models.DateField(help_text='Date when the expense occurred')),
+                ('created_at', models.DateTimeField(help_text='Timestamp when the expense was recorded')),
+                ('project', models.ForeignKey(help_text='Project this expense belongs to', on_delete=django.db.models.deletion.CASCADE, related_name='archived_expenses', to='projects.project')),
+            ],
+            options={
+                'verbose_name': 'Archived Expense',
+                'verbose_name_plural': 'Archived Expenses',
+                'ordering': ['-date', '-created_at'],
+                'indexes': [models.Index(fields=['project', 'date'], name='projects_ar_project_5cff6f_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,106 @@
+# Generated by Django 5.2.6 on 2026-10-19 07:06
+
+import django.core.validators
+import django.db.models.deletion
+import projects.fields
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def count_spend(apps, schema_editor):
+    # Every existing expense is uncategorized
+    ProjectSpend = apps.get_model('projects', 'ProjectSpend')
+    CategorySpend = apps.get_model('projects', 'CategorySpend')
+    spend = {}
+    for model_name in ('Expense', 'ArchivedExpense'):
+        model = apps.get_model('projects', model_name)
+        rows = (
+            model.objects.order_by().values('project_id')
+            .annotate(total=Sum('amount'), count=Count('pk'))
+            .values_list('project_id', 'total', 'count')
+        )
+        for project_id, total, count in rows:
+            project_total, project_count = spend.get(project_id, (0, 0))
+            spend[project_id] = (project_total + total, project_count + count)
+    ProjectSpend.objects.bulk_create([
+        ProjectSpend(project_id=project_id, total=total, expense_count=count)
+        for project_id, (total, count) in spend.items()
+    ])
+    CategorySpend.objects.bulk_create([
+        CategorySpend(project_id=project_id, category='', total=total, expense_count=count)
+        for project_id, (total, count) in spend.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0006_expense_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategorySpend',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(blank=True, help_text='Expense category', max_length=100)),
+                ('total', projects.fields.CentsField(default=0, help_text="Total of the category's expenses, stored in cents", max_digits=14)),
+                ('expense_count', models.IntegerField(default=0, help_text="Number of the category's expenses")),
+            ],
+            options={
+                'verbose_name': 'Category Spend',
+                'verbose_name_plural': 'Category Spend',
+                'ordering': ['project', '-total'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ProjectSpend',
+            fields=[
+                ('project', models.OneToOneField(help_text='Project these totals belong to', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='spend', serialize=False, to='projects.project')),
+                ('total', projects.fields.CentsField(default=0, help_text="Total of the project's expenses, stored in cents", max_digits=14)),
+                ('expense_count', models.IntegerField(default=0, help_text="Number of the project's expenses")),
+            ],
+            options={
+                'verbose_name': 'Project Spend',
+                'verbose_name_plural': 'Project Spend',
+            },
+        ),
+        migrations.AddField(
+            model_name='archivedexpense',
+            name='category',
+            field=models.CharField(blank=True, default='', help_text='Category of the expense', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='expense',
+            name='category',
+            field=models.CharField(blank=True, default='', help_text='Category of the expense', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='budget',
+            field=projects.fields.CentsField(blank=True, help_text='Amount budgeted for the project, stored in cents; empty for no budget', max_digits=14, null=True, validators=[django.core.validators.MinValueValidator(Decimal('0'))]),
+        ),
+        migrations.AddIndex(
+            model_name='archivedexpense',
+            index=models.Index(fields=['project', 'category', 'date'], name='projects_ar_project_34baa3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['project', 'category', 'date'], name='projects_ex_project_aa54b4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['category', 'date'], name='projects_ex_categor_e88d92_idx'),
+        ),
+        migrations.AddField(
+            model_name='categoryspend',
+            name='project',
+            field=models.ForeignKey(help_text='Project these totals belong to', on_delete=django.db.models.deletion.CASCADE, related_name='category_spend', to='projects.project'),
+        ),
+        migrations.AddConstraint(
+            model_name='categoryspend',
+            constraint=models.UniqueConstraint(fields=('project', 'category'), name='unique_project_category_spend'),
+        ),
+        migrations.RunPython(count_spend, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-19 07:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0007_budgets_and_categories'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='shard',
+            field=models.CharField(default='default', help_text="Database alias of the expense shard holding this project's expenses", max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='archivedexpense',
+            name='project',
+            field=models.ForeignKey(db_constraint=False, help_text='Project this expense belongs to', on_delete=django.db.models.deletion.CASCADE, related_name='archived_expenses', to='projects.project'),
+        ),
+        migrations.AlterField(
+            model_name='expense',
+            name='project',
+            field=models.ForeignKey(db_constraint=False, help_text='Project this expense belongs to', on_delete=django.db.models.deletion.CASCADE, related_name='expenses', to='projects.project'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-19 07:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0008_expense_shards'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(help_text='Idempotency-Key header sent by the client', max_length=255, unique=True)),
+                ('fingerprint', models.CharField(help_text='SHA-256 of the method, path and body of the request', max_length=64)),
+                ('status_code', models.PositiveSmallIntegerField(blank=True, help_text='Status code of the stored response; empty while the request runs', null=True)),
+                ('response_body', models.TextField(blank=True, default='', help_text='JSON body of the stored response')),
+                ('created_at', models.DateTimeField(auto_now_add=True, help_text='Timestamp when the request started')),
+                ('expires_at', models.DateTimeField(db_index=True, help_text='Timestamp after which the key can be reused')),
+            ],
+            options={
+                'verbose_name': 'Idempotency Key',
+                'verbose_name_plural': 'Idempotency Keys',
+            },
+        ),
+    ]
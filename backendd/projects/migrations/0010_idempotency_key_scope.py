@@ -0,0 +1,41 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0009_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='idempotencykey',
+            name='key',
+            field=models.CharField(help_text='Idempotency-Key header sent by the client', max_length=255),
+        ),
+        # Existing keys get an empty scope, which no request matches, and expire
+        migrations.AddField(
+            model_name='idempotencykey',
+            name='client',
+            field=models.CharField(default='', help_text='User or address of the client that sent the key', max_length=255),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='idempotencykey',
+            name='method',
+            field=models.CharField(default='', help_text='HTTP method of the request', max_length=10),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='idempotencykey',
+            name='path',
+            field=models.TextField(default='', help_text='Path of the request'),
+            preserve_default=False,
+        ),
+        migrations.AddConstraint(
+            model_name='idempotencykey',
+            constraint=models.UniqueConstraint(fields=('client', 'method', 'path', 'key'), name='unique_idempotency_key'),
+        ),
+    ]
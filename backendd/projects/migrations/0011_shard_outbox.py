@@ -0,0 +1,36 @@
+# Generated by Django 5.2.6 on 2026-10-19 08:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0010_idempotency_key_scope'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShardOutboxCursor',
+            fields=[
+                ('shard', models.CharField(help_text='Database alias of the expense shard', max_length=100, primary_key=True, serialize=False)),
+                ('last_id', models.BigIntegerField(default=0, help_text='Id of the last applied outbox entry')),
+            ],
+            options={
+                'verbose_name': 'Shard Outbox Cursor',
+            },
+        ),
+        migrations.CreateModel(
+            name='ShardOutboxEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('changes', 'Change log entries'), ('spend', 'Spend counter deltas'), ('snapshots', 'Balance snapshots to drop'), ('archive', 'Archive summary additions')], help_text='Kind of bookkeeping to apply', max_length=10)),
+                ('payload', models.JSONField(help_text='Arguments of the bookkeeping, with amounts as decimal strings')),
+            ],
+            options={
+                'verbose_name': 'Shard Outbox Entry',
+                'verbose_name_plural': 'Shard Outbox',
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -4,10 +4,65 @@ Models for the expense tracker application.
 This module contains the core models for managing projects and their expenses.
 """
 
+from decimal import Decimal
+
+from django.core.exceptions import ObjectDoesNotExist
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.core.validators import MinValueValidator
 from django.utils import timezone
 
+from .fields import CentsField
+
+
+class ProjectQuerySet(models.QuerySet):
+    """
+    QuerySet for projects that can hide projects pending deletion.
+    """
+    
+    def active(self):
+        """Projects that are not pending deletion."""
+        return self.filter(deletion_requested_at__isnull=True)
+    
+    def pending_deletion(self):
+        """Projects whose expenses are being deleted in the background."""
+        return self.filter(deletion_requested_at__isnull=False)
+    
+    def with_totals(self):
+        """
+        Annotate each project with its expense total and count, archived
+        expenses included, so that listing many projects does not run two
+        queries per project.
+        """
+        zero = models.Value(0, output_field=CentsField())
+        return self.annotate(
+            expenses_total=models.ExpressionWrapper(
+                Coalesce(models.Sum('expenses__amount'), zero)
+                + Coalesce('archive_summary__total', zero),
+                output_field=CentsField()
+            ),
+            expenses_count=(
+                models.Count('expenses')
+                + Coalesce('archive_summary__expense_count', 0)
+            )
+        )
+
+
+class ExpenseQuerySet(models.QuerySet):
+    """
+    QuerySet for expenses and archived expenses.
+    """
+    
+    def create(self, **kwargs):
+        """
+        Create an object on the database selected with using(), or else on
+        the one the router picks for the new instance: its project's shard.
+        """
+        obj = self.model(**kwargs)
+        self._for_write = True
+        obj.save(force_insert=True, using=self._db)
+        return obj
+
 
 class Project(models.Model):
     """
@@ -23,10 +78,30 @@ class Project(models.Model):
         blank=True, 
         help_text="Detailed description of the project"
     )
+    budget = CentsField(
+        max_digits=14,
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(Decimal('0'))],
+        help_text="Amount budgeted for the project, stored in cents; empty for no budget"
+    )
     created_at = models.DateTimeField(
         auto_now_add=True,
         help_text="Timestamp when the project was created"
     )
+    deletion_requested_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        db_index=True,
+        help_text="Timestamp when deletion was requested; set while expenses are being deleted"
+    )
+    shard = models.CharField(
+        max_length=100,
+        default='default',
+        help_text="Database alias of the expense shard holding this project's expenses"
+    )
+    
+    objects = ProjectQuerySet.as_manager()
     
     class Meta:
         ordering = ['-created_at']
@@ -38,15 +113,50 @@ class Project(models.Model):
     
     @property
     def total_expenses(self):
-        """Calculate total expenses for this project."""
-        return self.expenses.aggregate(
+        """
+        Calculate total expenses for this project, archived expenses included.
+        
+        Uses the expenses_total annotation when the queryset provides it.
+        """
+        if hasattr(self, 'expenses_total'):
+            return self.expenses_total or 0
+        total = self.expenses.aggregate(
             total=models.Sum('amount')
         )['total'] or 0
+        summary = self.get_archive_summary()
+        return total + summary.total if summary else total
     
     @property
     def expense_count(self):
-        """Get the number of expenses for this project."""
-        return self.expenses.count()
+        """
+        Get the number of expenses for this project, archived expenses included.
+        
+        Uses the expenses_count annotation when the queryset provides it.
+        """
+        if hasattr(self, 'expenses_count'):
+            return self.expenses_count
+        count = self.expenses.count()
+        summary = self.get_archive_summary()
+        return count + summary.expense_count if summary else count
+    
+    @property
+    def all_expenses(self):
+        """
+        List this project's expenses, archived expenses included, newest
+        first, as counted by expense_count.
+        
+        Uses the prefetched expenses and archived expenses when provided.
+        """
+        expenses = [*self.expenses.all(), *self.archived_expenses.all()]
+        expenses.sort(key=lambda expense: (expense.date, expense.created_at), reverse=True)
+        return expenses
+    
+    def get_archive_summary(self):
+        """Return the summary of this project's archived expenses, if any."""
+        try:
+            return self.archive_summary
+        except ObjectDoesNotExist:
+            return None
 
 
 class Expense(models.Model):
@@ -54,24 +164,31 @@ class Expense(models.Model):
     Expense model to store individual expenses for projects.
     
     Each expense belongs to a specific project and contains amount,
-    description, and date information.
+    description, and date information. Expenses are stored on the expense
+    shard of their project (see projects/sharding.py), which may be another
+    database than the project's, so the foreign key has no constraint.
     """
     project = models.ForeignKey(
         Project,
         on_delete=models.CASCADE,
+        db_constraint=False,
         related_name='expenses',
         help_text="Project this expense belongs to"
     )
-    amount = models.DecimalField(
-        max_digits=10,
-        decimal_places=2,
-        validators=[MinValueValidator(0.01)],
-        help_text="Amount spent (must be greater than 0)"
+    amount = CentsField(
+        validators=[MinValueValidator(Decimal('0.01'))],
+        help_text="Amount spent (must be greater than 0), stored in cents"
     )
     description = models.CharField(
         max_length=500,
         help_text="Description of the expense"
     )
+    category = models.CharField(
+        max_length=100,
+        blank=True,
+        default='',
+        help_text="Category of the expense"
+    )
     date = models.DateField(
         default=timezone.now,
         help_text="Date when the expense occurred"
@@ -81,10 +198,427 @@ class Expense(models.Model):
         help_text="Timestamp when the expense was recorded"
     )
     
+    objects = ExpenseQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-date', '-created_at']
         verbose_name = "Expense"
         verbose_name_plural = "Expenses"
+        indexes = [
+            models.Index(fields=['project', 'date']),
+            models.Index(fields=['project', 'category', 'date']),
+            models.Index(fields=['category', 'date']),
+        ]
     
     def __str__(self):
         return f"{self.project.name} - ${self.amount} - {self.description[:50]}"
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """
+        Remember the values loaded from the database so that signal
+        receivers can tell what an update changed.
+        """
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+
+class ProjectBalanceSnapshot(models.Model):
+    """
+    Total spent on a project up to and including a date.
+    
+    Point-in-time balances start from the latest snapshot before the
+    requested date and only sum the expenses recorded after it.
+    """
+    project = models.ForeignKey(
+        Project,
+        on_delete=models.CASCADE,
+        related_name='balance_snapshots',
+        help_text="Project this snapshot belongs to"
+    )
+    as_of = models.DateField(
+        help_text="Last date included in the snapshot"
+    )
+    total = CentsField(
+        max_digits=14,
+        help_text="Total expenses up to and including as_of, stored in cents"
+    )
+    expense_count = models.PositiveIntegerField(
+        help_text="Number of expenses up to and including as_of"
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        help_text="Timestamp when the snapshot was taken"
+    )
+    
+    class Meta:
+        ordering = ['project', '-as_of']
+        verbose_name = "Balance Snapshot"
+        verbose_name_plural = "Balance Snapshots"
+        constraints = [
+            models.UniqueConstraint(fields=['project', 'as_of'], name='unique_project_balance_snapshot'),
+        ]
+    
+    def __str__(self):
+        return f"{self.project.name} as of {self.as_of}: ${self.total}"
+
+
+class ArchivedExpense(models.Model):
+    """
+    Expense moved out of the expenses table by archive_expenses.
+    
+    Keeps the columns and id of the original expense, on the same expense
+    shard. Archived expenses are read-only; queries add them only when a
+    date range reaches back into the archive.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    project = models.ForeignKey(
+        Project,
+        on_delete=models.CASCADE,
+        db_constraint=False,
+        related_name='archived_expenses',
+        help_text="Project this expense belongs to"
+    )
+    amount = CentsField(
+        help_text="Amount spent, stored in cents"
+    )
+    description = models.CharField(
+        max_length=500,
+        help_text="Description of the expense"
+    )
+    category = models.CharField(
+        max_length=100,
+        blank=True,
+        default='',
+        help_text="Category of the expense"
+    )
+    date = models.DateField(
+        help_text="Date when the expense occurred"
+    )
+    created_at = models.DateTimeField(
+        help_text="Timestamp when the expense was recorded"
+    )
+    
+    objects = ExpenseQuerySet.as_manager()
+    
+    class Meta:
+        ordering = ['-date', '-created_at']
+        verbose_name = "Archived Expense"
+        verbose_name_plural = "Archived Expenses"
+        indexes = [
+            models.Index(fields=['project', 'date']),
+            models.Index(fields=['project', 'category', 'date']),
+        ]
+    
+    def __str__(self):
+        return f"{self.project.name} - ${self.amount} - {self.description[:50]} (archived)"
+
+
+class ProjectArchiveSummary(models.Model):
+    """
+    Total, count and date range of a project's archived expenses.
+    
+    Kept up to date by archive_expenses, so totals never scan the archive
+    and queries can tell whether a date range reaches archived expenses.
+    """
+    project = models.OneToOneField(
+        Project,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='archive_summary',
+        help_text="Project these archived expenses belong to"
+    )
+    total = CentsField(
+        max_digits=14,
+        help_text="Total of the archived expenses, stored in cents"
+    )
+    expense_count = models.PositiveIntegerField(
+        help_text="Number of archived expenses"
+    )
+    first_date = models.DateField(
+        help_text="Date of the earliest archived expense"
+    )
+    last_date = models.DateField(
+        help_text="Date of the latest archived expense"
+    )
+    
+    class Meta:
+        verbose_name = "Archive Summary"
+        verbose_name_plural = "Archive Summaries"
+    
+    def __str__(self):
+        return f"{self.project.name}: {self.expense_count} archived expenses"
+
+
+class ProjectSpend(models.Model):
+    """
+    Running total and count of a project's expenses, archived ones included.
+    
+    Adjusted on every expense write (see projects/spend.py), so budget
+    utilization is read from one row instead of summing expenses.
+    """
+    project = models.OneToOneField(
+        Project,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='spend',
+        help_text="Project these totals belong to"
+    )
+    total = CentsField(
+        max_digits=14,
+        default=0,
+        help_text="Total of the project's expenses, stored in cents"
+    )
+    # Not a PositiveIntegerField: deltas are applied in any order
+    expense_count = models.IntegerField(
+        default=0,
+        help_text="Number of the project's expenses"
+    )
+    
+    class Meta:
+        verbose_name = "Project Spend"
+        verbose_name_plural = "Project Spend"
+    
+    def __str__(self):
+        return f"{self.project.name}: ${self.total}"
+
+
+class CategorySpend(models.Model):
+    """
+    Running total and count of a project's expenses in one category,
+    archived ones included.
+    """
+    project = models.ForeignKey(
+        Project,
+        on_delete=models.CASCADE,
+        related_name='category_spend',
+        help_text="Project these totals belong to"
+    )
+    category = models.CharField(
+        max_length=100,
+        blank=True,
+        help_text="Expense category"
+    )
+    total = CentsField(
+        max_digits=14,
+        default=0,
+        help_text="Total of the category's expenses, stored in cents"
+    )
+    # Not a PositiveIntegerField: deltas are applied in any order
+    expense_count = models.IntegerField(
+        default=0,
+        help_text="Number of the category's expenses"
+    )
+    
+    class Meta:
+        ordering = ['project', '-total']
+        verbose_name = "Category Spend"
+        verbose_name_plural = "Category Spend"
+        constraints = [
+            models.UniqueConstraint(fields=['project', 'category'], name='unique_project_category_spend'),
+        ]
+    
+    def __str__(self):
+        return f"{self.project.name} / {self.category or 'Uncategorized'}: ${self.total}"
+
+
+class ChangeLog(models.Model):
+    """
+    Append-only log of inserts, updates and deletes on projects and expenses.
+    
+    Each entry gets a monotonically increasing sequence number which clients
+    use as a cursor to download only what changed since their last sync.
+    """
+    PROJECT = 'project'
+    EXPENSE = 'expense'
+    MODEL_CHOICES = [
+        (PROJECT, 'Project'),
+        (EXPENSE, 'Expense'),
+    ]
+    
+    INSERT = 'insert'
+    UPDATE = 'update'
+    DELETE = 'delete'
+    OPERATION_CHOICES = [
+        (INSERT, 'Insert'),
+        (UPDATE, 'Update'),
+        (DELETE, 'Delete'),
+    ]
+    
+    seq = models.BigAutoField(
+        primary_key=True,
+        help_text="Monotonically increasing sequence number"
+    )
+    model = models.CharField(
+        max_length=10,
+        choices=MODEL_CHOICES,
+        help_text="Kind of object that changed"
+    )
+    object_id = models.BigIntegerField(
+        help_text="Primary key of the object that changed"
+    )
+    operation = models.CharField(
+        max_length=6,
+        choices=OPERATION_CHOICES,
+        help_text="Type of change"
+    )
+    project_id = models.BigIntegerField(
+        help_text="Project the changed object belongs to"
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        help_text="Timestamp when the change was recorded"
+    )
+    
+    class Meta:
+        ordering = ['seq']
+        verbose_name = "Change Log Entry"
+        verbose_name_plural = "Change Log"
+        indexes = [
+            models.Index(fields=['project_id', 'seq']),
+            models.Index(fields=['model', 'object_id']),
+        ]
+    
+    def __str__(self):
+        return f"#{self.seq} {self.operation} {self.model} {self.object_id}"
+
+
+class ChangeLogHorizon(models.Model):
+    """
+    Highest change log sequence number removed by compaction.
+    
+    Clients whose cursor is older than the horizon may have missed changes
+    and must do a full resync. Only a single row is ever stored.
+    """
+    seq = models.BigIntegerField(
+        default=0,
+        help_text="Highest sequence number removed from the change log"
+    )
+    
+    class Meta:
+        verbose_name = "Change Log Horizon"
+    
+    def __str__(self):
+        return f"Change log horizon at #{self.seq}"
+
+
+class ShardOutboxEntry(models.Model):
+    """
+    Bookkeeping for the default database queued by a write on an expense shard.
+
+    Entries are stored on the shard, in the same transaction as the expenses
+    they describe, and applied to the default database by projects.outbox
+    once it commits: change log entries, spend counter deltas, balance
+    snapshots to drop and archive summary additions.
+    """
+    CHANGES = 'changes'
+    SPEND = 'spend'
+    SNAPSHOTS = 'snapshots'
+    ARCHIVE = 'archive'
+    KIND_CHOICES = [
+        (CHANGES, 'Change log entries'),
+        (SPEND, 'Spend counter deltas'),
+        (SNAPSHOTS, 'Balance snapshots to drop'),
+        (ARCHIVE, 'Archive summary additions'),
+    ]
+
+    kind = models.CharField(
+        max_length=10,
+        choices=KIND_CHOICES,
+        help_text="Kind of bookkeeping to apply"
+    )
+    payload = models.JSONField(
+        help_text="Arguments of the bookkeeping, with amounts as decimal strings"
+    )
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = "Shard Outbox Entry"
+        verbose_name_plural = "Shard Outbox"
+
+    def __str__(self):
+        return f"#{self.id} {self.kind}"
+
+
+class ShardOutboxCursor(models.Model):
+    """
+    Last entry of a shard's outbox applied to the default database.
+
+    Advanced in the transaction that applies the entries, so every entry is
+    applied exactly once.
+    """
+    shard = models.CharField(
+        max_length=100,
+        primary_key=True,
+        help_text="Database alias of the expense shard"
+    )
+    last_id = models.BigIntegerField(
+        default=0,
+        help_text="Id of the last applied outbox entry"
+    )
+
+    class Meta:
+        verbose_name = "Shard Outbox Cursor"
+
+    def __str__(self):
+        return f"{self.shard} at #{self.last_id}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    Outcome of a write request sent with an Idempotency-Key header.
+    
+    A row is inserted, without a status code, when a request with a new key
+    starts, so that concurrent duplicates find it and wait. Once the request
+    succeeds its response is stored and replayed to every retry until the
+    key expires. Keys are unique per client, method and path.
+    """
+    client = models.CharField(
+        max_length=255,
+        help_text="User or address of the client that sent the key"
+    )
+    method = models.CharField(
+        max_length=10,
+        help_text="HTTP method of the request"
+    )
+    path = models.TextField(
+        help_text="Path of the request"
+    )
+    key = models.CharField(
+        max_length=255,
+        help_text="Idempotency-Key header sent by the client"
+    )
+    fingerprint = models.CharField(
+        max_length=64,
+        help_text="SHA-256 of the method, path and body of the request"
+    )
+    status_code = models.PositiveSmallIntegerField(
+        null=True,
+        blank=True,
+        help_text="Status code of the stored response; empty while the request runs"
+    )
+    response_body = models.TextField(
+        blank=True,
+        default='',
+        help_text="JSON body of the stored response"
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        help_text="Timestamp when the request started"
+    )
+    expires_at = models.DateTimeField(
+        db_index=True,
+        help_text="Timestamp after which the key can be reused"
+    )
+    
+    class Meta:
+        verbose_name = "Idempotency Key"
+        verbose_name_plural = "Idempotency Keys"
+        constraints = [
+            models.UniqueConstraint(fields=['client', 'method', 'path', 'key'], name='unique_idempotency_key'),
+        ]
+    
+    def __str__(self):
+        return f"{self.key} ({self.status_code or 'in progress'})"
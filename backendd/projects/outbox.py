@@ -0,0 +1,208 @@
+"""
+Outboxes for the bookkeeping of writes on expense shards.
+
+An expense written on a shard also changes rows in the default database:
+its change log entries, the spend counters, the balance snapshots it
+invalidates and, once archived, its project's archive summary. Writing
+those in a second transaction would send every write through the default
+database's lock, and leave the two databases disagreeing whenever one of
+the transactions commits and the other does not. Instead, the bookkeeping
+is queued as ShardOutboxEntry rows on the shard, in the same transaction
+as the expenses, and applied to the default database after it commits:
+
+- defer() queues an entry; for writes on the default database it queues
+  nothing and the caller writes its bookkeeping directly, in the same
+  transaction;
+- apply_outbox() applies a shard's pending entries in batches, each in one
+  transaction on the default database that also advances the shard's
+  ShardOutboxCursor, so every entry is applied exactly once even when
+  several processes apply the same outbox;
+- once a transaction that queued entries commits, it wakes its shard's
+  OutboxApplier, which applies the outbox from a background thread of the
+  process. Writes to a shard therefore only hold the shard's lock, and the
+  entries of concurrent writes are applied together, a batch at a time.
+
+The change log, counters and snapshots follow a write on a shard within
+moments instead of in its transaction; change log entries are appended
+once applied, so clients following the change feed never skip one. With
+SHARD_OUTBOX_IN_BACKGROUND off, the outbox is applied right after the
+write commits instead, in the writing thread. Entries left behind by a
+failure are applied with the next write to the shard, or by python
+manage.py apply_shard_outboxes.
+"""
+
+import logging
+import threading
+from functools import partial
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from .models import ShardOutboxEntry, ShardOutboxCursor
+
+
+logger = logging.getLogger(__name__)
+
+# Fields written when queuing an entry
+OUTBOX_FIELDS = [ShardOutboxEntry._meta.get_field(name) for name in ('kind', 'payload')]
+
+# Functions applying a list of payloads of each kind of entry
+_handlers = {}
+
+# OutboxApplier of each shard in this process
+_appliers = {}
+_appliers_lock = threading.Lock()
+
+
+def outbox_handler(kind):
+    """
+    Register the function applying the payloads of a kind of outbox entry
+    to the default database. It is called with a list of payloads, in the
+    order they were queued.
+    """
+    def register(function):
+        _handlers[kind] = function
+        return function
+    return register
+
+
+def defer(using, kind, payload):
+    """
+    Queue bookkeeping for a write on the database using in its outbox.
+
+    Returns False without queuing anything when using is the default
+    database, whose writes keep their bookkeeping in their own transaction.
+    """
+    if using == DEFAULT_DB_ALIAS:
+        return False
+    # Inserted without save() and its signals, as every write queues entries
+    ShardOutboxEntry.objects.using(using)._insert(
+        [ShardOutboxEntry(kind=kind, payload=payload)], fields=OUTBOX_FIELDS, using=using
+    )
+    wake = outbox_applier(using).wake
+    # Once per transaction, however many entries it queues
+    if not any(callback == wake for _, callback, _ in connections[using].run_on_commit):
+        transaction.on_commit(wake, using=using, robust=True)
+    return True
+
+
+class OutboxApplier:
+    """
+    Applies a shard's outbox from a daemon thread.
+
+    wake() starts the thread unless it is running, in which case the thread
+    makes one more pass once it is done with the current one. The thread
+    exits when a pass finds that nothing was queued since it started.
+    """
+
+    def __init__(self, shard):
+        self.shard = shard
+        self.lock = threading.Lock()
+        self.thread = None
+        self.woken = False
+
+    def wake(self):
+        if not getattr(settings, 'SHARD_OUTBOX_IN_BACKGROUND', True):
+            apply_outbox(self.shard)
+            return
+        with self.lock:
+            self.woken = True
+            if self.thread is not None and self.thread.is_alive():
+                return
+            self.thread = threading.Thread(
+                target=self._run,
+                name=f'apply-outbox-{self.shard}',
+                daemon=True
+            )
+            self.thread.start()
+
+    def _run(self):
+        try:
+            while True:
+                with self.lock:
+                    if not self.woken:
+                        return
+                    self.woken = False
+                try:
+                    apply_outbox(self.shard)
+                except Exception:
+                    # The entries stay queued for the next write or apply_shard_outboxes
+                    logger.exception("Applying the outbox of %s failed", self.shard)
+        finally:
+            connections.close_all()
+
+    def join(self, timeout=None):
+        """
+        Wait for the thread, if one is running, to finish.
+        """
+        thread = self.thread
+        if thread is not None:
+            thread.join(timeout)
+
+
+def outbox_applier(shard):
+    """
+    Return this process's OutboxApplier for a shard.
+    """
+    with _appliers_lock:
+        if shard not in _appliers:
+            _appliers[shard] = OutboxApplier(shard)
+        return _appliers[shard]
+
+
+def join_appliers(timeout=None):
+    """
+    Wait for the outboxes being applied by this process's threads, e.g.
+    before the process exits.
+    """
+    for applier in list(_appliers.values()):
+        applier.join(timeout)
+
+
+def _applied_up_to(shard):
+    return ShardOutboxCursor.objects.filter(shard=shard).values_list('last_id', flat=True).first() or 0
+
+
+def apply_outbox(shard, batch_size=None):
+    """
+    Apply the pending entries of a shard's outbox to the default database,
+    batch_size entries per transaction, and remove them from the shard.
+    Returns the number of applied entries.
+    """
+    if batch_size is None:
+        batch_size = getattr(settings, 'SHARD_OUTBOX_BATCH_SIZE', 500)
+    entries = ShardOutboxEntry.objects.using(shard)
+
+    applied = 0
+    while entries.filter(pk__gt=_applied_up_to(shard)).exists():
+        with transaction.atomic():
+            # Take the write lock before reading the cursor: writing its row
+            # does so on SQLite, select_for_update() on other databases
+            ShardOutboxCursor.objects.bulk_create([ShardOutboxCursor(shard=shard)], ignore_conflicts=True)
+            cursor = ShardOutboxCursor.objects.select_for_update().get(shard=shard)
+            batch = list(entries.filter(pk__gt=cursor.last_id).order_by('pk')[:batch_size])
+            if batch:
+                payloads = {}
+                for entry in batch:
+                    payloads.setdefault(entry.kind, []).append(entry.payload)
+                for kind, kind_payloads in payloads.items():
+                    _handlers[kind](kind_payloads)
+                cursor.last_id = batch[-1].pk
+                cursor.save(update_fields=['last_id'])
+                # Applied entries are removed once the cursor past them is committed
+                transaction.on_commit(partial(_remove_applied, shard, cursor.last_id))
+        applied += len(batch)
+    return applied
+
+
+def _remove_applied(shard, last_id):
+    applied = ShardOutboxEntry.objects.using(shard).filter(pk__lte=last_id)
+    applied._raw_delete(shard)
+
+
+def apply_outboxes(shards):
+    """
+    Apply the pending entries of every given shard's outbox. Returns the
+    number of applied entries.
+    """
+    return sum(apply_outbox(shard) for shard in shards if shard != DEFAULT_DB_ALIAS)
@@ -0,0 +1,117 @@
+"""
+Memory profiling of statement renders.
+
+With STATEMENT_MEMORY_PROFILING on, statement renders are traced with
+tracemalloc and the resident memory of the process is sampled before and
+after each one. Every render is logged by the projects.profiling logger
+with its peak traced allocations, its resident memory and how much it
+raised the peak resident memory of the process. The same figures are set
+as attributes of the log record, for handlers that forward them as
+metrics.
+
+Tracing is process-wide and slows rendering down, so it is off by default.
+Only one render per process is traced at a time: allocations by other
+threads count towards its peak, and renders starting while another one is
+traced are logged with resident memory figures only.
+"""
+
+import logging
+import mmap
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from django.conf import settings
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+logger = logging.getLogger(__name__)
+
+_tracing = threading.Lock()
+
+
+def current_rss():
+    """
+    Return the resident memory of this process in bytes, or None where
+    /proc is not available.
+    """
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * mmap.PAGESIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def peak_rss():
+    """
+    Return the peak resident memory of this process in bytes, or None
+    without the resource module.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _megabytes(size):
+    return 'n/a' if size is None else f'{size / 2**20:.1f} MB'
+
+
+@contextmanager
+def profile_render(format_name, project_id, expense_count, path):
+    """
+    Measure the memory used by the statement render in the block and log it
+    when STATEMENT_MEMORY_PROFILING is on.
+
+    Yields a dict that is filled with the figures when the block exits:
+    seconds, peak_traced, rss_before, rss_after and peak_rss_growth, in
+    bytes, None when they could not be measured.
+    """
+    figures = {}
+    if not getattr(settings, 'STATEMENT_MEMORY_PROFILING', False):
+        yield figures
+        return
+
+    traced = _tracing.acquire(blocking=False)
+    started_tracing = traced and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    elif traced:
+        tracemalloc.reset_peak()
+    rss_before, peak_before = current_rss(), peak_rss()
+    started = time.perf_counter()
+    try:
+        yield figures
+        figures['seconds'] = time.perf_counter() - started
+        figures['peak_traced'] = tracemalloc.get_traced_memory()[1] if traced else None
+    finally:
+        if started_tracing:
+            tracemalloc.stop()
+        if traced:
+            _tracing.release()
+
+    peak_after = peak_rss()
+    figures['rss_before'] = rss_before
+    figures['rss_after'] = current_rss()
+    figures['peak_rss_growth'] = None if peak_after is None else peak_after - peak_before
+    logger.info(
+        "Rendered %s statement of project %s (%s expenses, %s) in %.2fs: "
+        "traced peak %s, RSS %s -> %s, peak RSS +%s",
+        format_name, project_id, expense_count, path, figures['seconds'],
+        _megabytes(figures['peak_traced']), _megabytes(figures['rss_before']),
+        _megabytes(figures['rss_after']), _megabytes(figures['peak_rss_growth']),
+        extra={
+            'statement_format': format_name,
+            'statement_path': path,
+            'project_id': project_id,
+            'expense_count': expense_count,
+            **{f'render_{name}': value for name, value in figures.items()},
+        },
+    )
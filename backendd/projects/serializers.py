@@ -5,20 +5,77 @@ This module contains Django REST Framework serializers for converting
 model instances to JSON and handling data validation.
 """
 
+from decimal import Decimal
+
+from django.conf import settings
 from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from .batch import BATCH_METHODS
 from .models import Project, Expense
 
 
-class ExpenseSerializer(serializers.ModelSerializer):
+def _split_field_names(value):
+    return {name.strip() for name in value.split(',') if name.strip()} if value else set()
+
+
+def selected_fields(request, available):
+    """
+    Return the field names selected by the ?fields= and ?exclude= query
+    parameters of a GET request, out of the available field names.
+    
+    Unknown field names are rejected with a 400 response.
+    """
+    available = list(available)
+    if request is None or request.method != 'GET':
+        return set(available)
+    requested = _split_field_names(request.query_params.get('fields'))
+    excluded = _split_field_names(request.query_params.get('exclude'))
+    unknown = (requested | excluded) - set(available)
+    if unknown:
+        raise ValidationError({'fields': f"Unknown fields: {', '.join(sorted(unknown))}."})
+    return (requested or set(available)) - excluded
+
+
+class SparseFieldsMixin:
+    """
+    Serializer mixin dropping the fields not selected with ?fields= and
+    ?exclude=, before anything is serialized.
+    
+    Only the top-level serializer of a response is pruned, so nested
+    serializers keep all their fields.
+    """
+    
+    def get_fields(self):
+        fields = super().get_fields()
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        if parent is not None:
+            return fields
+        keep = selected_fields(self.context.get('request'), fields)
+        for name in list(fields):
+            if name not in keep:
+                del fields[name]
+        return fields
+
+
+class ExpenseSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
     Serializer for Expense model.
     
     Handles creation and validation of expense data.
     """
+    project = serializers.PrimaryKeyRelatedField(queryset=Project.objects.active())
+    # Declared explicitly: the model stores amounts as integer cents
+    amount = serializers.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        min_value=Decimal('0.01')
+    )
     
     class Meta:
         model = Expense
-        fields = ['id', 'project', 'amount', 'description', 'date', 'created_at']
+        fields = ['id', 'project', 'amount', 'description', 'category', 'date', 'created_at']
         read_only_fields = ['id', 'created_at']
     
     def validate_amount(self, value):
@@ -38,13 +95,22 @@ class ExpenseSerializer(serializers.ModelSerializer):
         return value.strip()
 
 
-class ProjectSerializer(serializers.ModelSerializer):
+class ProjectSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
     Serializer for Project model with related expenses.
     
-    Includes all expenses associated with the project and calculated totals.
+    Includes all expenses associated with the project, archived ones
+    included, and calculated totals.
     """
-    expenses = ExpenseSerializer(many=True, read_only=True)
+    expenses = ExpenseSerializer(source='all_expenses', many=True, read_only=True)
+    # Declared explicitly: the model stores budgets as integer cents
+    budget = serializers.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        min_value=Decimal('0'),
+        allow_null=True,
+        required=False
+    )
     total_expenses = serializers.ReadOnlyField()
     expense_count = serializers.ReadOnlyField()
     
@@ -54,6 +120,7 @@ class ProjectSerializer(serializers.ModelSerializer):
             'id', 
             'name', 
             'description', 
+            'budget', 
             'created_at', 
             'expenses', 
             'total_expenses', 
@@ -70,12 +137,20 @@ class ProjectSerializer(serializers.ModelSerializer):
         return value.strip()
 
 
-class ProjectSummarySerializer(serializers.ModelSerializer):
+class ProjectSummarySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
     Simplified serializer for Project model without expenses.
     
     Used for listing projects without the overhead of loading all expenses.
     """
+    # Declared explicitly: the model stores budgets as integer cents
+    budget = serializers.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        min_value=Decimal('0'),
+        allow_null=True,
+        required=False
+    )
     total_expenses = serializers.ReadOnlyField()
     expense_count = serializers.ReadOnlyField()
     
@@ -85,8 +160,143 @@ class ProjectSummarySerializer(serializers.ModelSerializer):
             'id', 
             'name', 
             'description', 
+            'budget', 
             'created_at', 
             'total_expenses', 
             'expense_count'
         ]
         read_only_fields = ['id', 'created_at']
+
+
+class ExpenseFilterSerializer(serializers.Serializer):
+    """
+    Filter expression selecting expenses for bulk operations.
+    
+    Every given condition must match. An empty filter is rejected so that
+    a malformed request cannot touch every expense.
+    """
+    project = serializers.PrimaryKeyRelatedField(
+        queryset=Project.objects.active(),
+        required=False
+    )
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    amount_min = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    amount_max = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    description = serializers.CharField(required=False)
+    category = serializers.CharField(required=False, allow_blank=True)
+    
+    LOOKUPS = {
+        'project': 'project',
+        'date_from': 'date__gte',
+        'date_to': 'date__lte',
+        'amount_min': 'amount__gte',
+        'amount_max': 'amount__lte',
+        'description': 'description__icontains',
+        'category': 'category',
+    }
+    
+    def validate(self, attrs):
+        """
+        Validate that at least one condition is given.
+        """
+        if not attrs:
+            raise serializers.ValidationError("Filter must contain at least one condition.")
+        return attrs
+    
+    def to_lookups(self, attrs):
+        """
+        Convert validated conditions into queryset filter arguments.
+        """
+        return {self.LOOKUPS[name]: value for name, value in attrs.items()}
+
+
+class ExpenseBulkSelectionSerializer(serializers.Serializer):
+    """
+    Selection of expenses for bulk operations, by ids or by filter.
+    """
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        required=False,
+        allow_empty=False
+    )
+    filter = ExpenseFilterSerializer(required=False)
+    
+    def validate(self, attrs):
+        """
+        Validate that exactly one of ids and filter is given.
+        """
+        if ('ids' in attrs) == ('filter' in attrs):
+            raise serializers.ValidationError("Provide either 'ids' or 'filter'.")
+        return attrs
+    
+    def get_lookups(self):
+        """
+        Return queryset filter arguments for the selected expenses.
+        """
+        if 'ids' in self.validated_data:
+            return {'pk__in': self.validated_data['ids']}
+        return self.fields['filter'].to_lookups(self.validated_data['filter'])
+
+
+class ExpenseBulkUpdateSerializer(ExpenseBulkSelectionSerializer):
+    """
+    Bulk update of expenses.
+    
+    The changes are validated by ExpenseSerializer, so bulk updates accept
+    exactly what a partial update of a single expense would.
+    """
+    UPDATABLE_FIELDS = {'project', 'amount', 'description', 'category', 'date'}
+    
+    changes = serializers.DictField()
+    
+    def validate_changes(self, value):
+        """
+        Validate the changes against ExpenseSerializer.
+        """
+        if not value:
+            raise serializers.ValidationError("Changes cannot be empty.")
+        unknown = set(value) - self.UPDATABLE_FIELDS
+        if unknown:
+            raise serializers.ValidationError(
+                f"Fields cannot be bulk updated: {', '.join(sorted(unknown))}."
+            )
+        serializer = ExpenseSerializer(data=value, partial=True)
+        if not serializer.is_valid():
+            raise serializers.ValidationError(serializer.errors)
+        return serializer.validated_data
+
+
+class BatchItemSerializer(serializers.Serializer):
+    """
+    One sub-request of a batch.
+    """
+    method = serializers.ChoiceField(choices=BATCH_METHODS, default='GET')
+    url = serializers.CharField()
+    body = serializers.JSONField(required=False)
+    
+    def validate_url(self, value):
+        """
+        Validate that the URL targets the API, but not batches or events.
+        """
+        if not value.startswith('/api/'):
+            raise serializers.ValidationError("URL must start with /api/.")
+        if value.startswith(('/api/batch/', '/api/events/')):
+            raise serializers.ValidationError("This endpoint cannot be batched.")
+        return value
+
+
+class BatchSerializer(serializers.Serializer):
+    """
+    A batch of sub-requests, run in order.
+    """
+    requests = serializers.ListField(child=BatchItemSerializer(), allow_empty=False)
+    
+    def validate_requests(self, value):
+        """
+        Validate that the batch is not larger than BATCH_MAX_REQUESTS.
+        """
+        limit = getattr(settings, 'BATCH_MAX_REQUESTS', 20)
+        if len(value) > limit:
+            raise serializers.ValidationError(f"A batch can contain at most {limit} requests.")
+        return value
@@ -0,0 +1,337 @@
+"""
+Project-based sharding of expenses across SQLite databases.
+
+SQLite lets one writer at a time into a database, so with a single
+database the expense writes of every project queue on the same lock.
+Expenses and archived expenses can instead be spread over the databases
+listed in EXPENSE_SHARDS, each project's on one of them:
+
+- a new project is placed with a jump consistent hash of its id over
+  EXPENSE_SHARDS, and its shard is recorded on the project, so existing
+  placements do not change when shards are added;
+- ShardRouter sends expense writes, and reads through a project's expenses
+  relation, to the project's shard;
+- queries spanning projects run on every shard with fan_out(), in parallel
+  threads, and their results are merged by the caller;
+- rebalance_shards moves projects to their placement over a new list of
+  shards, copying their expenses with their ids.
+
+Projects, the change log, spend counters and every other table stay in the
+default database. A write on another shard queues its bookkeeping for the
+default database (change log entries, counter deltas, snapshots to drop)
+in the shard's outbox, in its own transaction, and the outbox is applied
+once that commits (see projects/outbox.py), so the write itself only holds
+its shard's lock. Each shard allocates expense ids from its own range of
+2**40 ids, so ids stay unique across shards and expenses keep them when
+moved. With a single shard, nothing is looked up and nothing is fanned out.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, router, transaction
+from django.db.models import Count, Prefetch, Sum, prefetch_related_objects
+from django.db.models.signals import post_migrate, post_save
+from django.db.models.constants import OnConflict
+from django.dispatch import receiver
+
+from .models import Project, Expense, ArchivedExpense, ProjectArchiveSummary, ShardOutboxEntry
+
+
+SHARDED_MODELS = (Expense, ArchivedExpense)
+
+# Tables created on every shard: the sharded models and the outbox
+SHARD_TABLES = (*SHARDED_MODELS, ShardOutboxEntry)
+
+# Expense ids of the nth database in DATABASES start after n << SHARD_ID_BITS
+SHARD_ID_BITS = 40
+
+
+def expense_shards():
+    """
+    Return the database aliases new projects' expenses are placed on.
+    """
+    return list(getattr(settings, 'EXPENSE_SHARDS', [DEFAULT_DB_ALIAS]))
+
+
+def is_sharded():
+    return len(expense_shards()) > 1
+
+
+def jump_hash(key, buckets):
+    """
+    Map an integer key to one of buckets buckets with Lamping and Veach's
+    jump consistent hash: adding a bucket only moves 1/buckets of the keys,
+    all of them to the new bucket.
+    """
+    bucket, jump = -1, 0
+    while jump < buckets:
+        bucket = jump
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        jump = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+
+def placement(project_id, shards=None):
+    """
+    Return the shard a project belongs on, among shards or EXPENSE_SHARDS.
+    """
+    shards = expense_shards() if shards is None else shards
+    return shards[jump_hash(project_id, len(shards))]
+
+
+def project_shard(project):
+    """
+    Return the shard holding a project's expenses, for a project or its id.
+    """
+    shards = expense_shards()
+    if len(shards) == 1:
+        return shards[0]
+    if isinstance(project, Project):
+        return project.shard
+    shard = Project.objects.filter(pk=project).values_list('shard', flat=True).first()
+    return shard or placement(project)
+
+
+def id_range_start(alias):
+    """
+    Return the last expense id before the range a database allocates from.
+    """
+    return list(settings.DATABASES).index(alias) << SHARD_ID_BITS
+
+
+class ShardRouter:
+    """
+    Route expenses and archived expenses to their project's shard and
+    everything else to the default database.
+    """
+
+    def _db(self, model, hints):
+        if model not in SHARDED_MODELS:
+            return DEFAULT_DB_ALIAS
+        instance = hints.get('instance')
+        if isinstance(instance, Project):
+            return project_shard(instance)
+        if isinstance(instance, SHARDED_MODELS):
+            if instance._state.db:
+                return instance._state.db
+            if model._meta.get_field('project').is_cached(instance):
+                return project_shard(instance.project)
+            return project_shard(instance.project_id)
+        return None
+
+    def db_for_read(self, model, **hints):
+        return self._db(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self._db(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if obj1._meta.app_label == obj2._meta.app_label == 'projects':
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == DEFAULT_DB_ALIAS:
+            return None
+        return app_label == 'projects' and model_name in {
+            model._meta.model_name for model in SHARD_TABLES
+        }
+
+
+@receiver(post_save, sender=Project)
+def place_project(sender, instance, created, raw=False, **kwargs):
+    if not created or raw or not is_sharded():
+        return
+    shard = placement(instance.pk)
+    if shard != instance.shard:
+        Project.objects.filter(pk=instance.pk).update(shard=shard)
+        instance.shard = shard
+
+
+@receiver(post_migrate)
+def reserve_expense_ids(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    """
+    Start a freshly migrated shard's expense ids at its own range.
+    """
+    connection = connections[using]
+    if sender.name != 'projects' or connection.vendor != 'sqlite':
+        return
+    start = id_range_start(using)
+    if not start or not router.allow_migrate_model(using, Expense):
+        return
+    table = Expense._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = %s", [table])
+        row = cursor.fetchone()
+        if row is None:
+            cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)", [table, start])
+        elif row[0] < start:
+            cursor.execute("UPDATE sqlite_sequence SET seq = %s WHERE name = %s", [start, table])
+
+
+def _in_thread(function, shard):
+    try:
+        return function(shard)
+    finally:
+        connections.close_all()
+
+
+def fan_out(function, shards=None):
+    """
+    Call function with every shard, or the given ones, and return the
+    results in shard order. The items may also be querysets on the shards.
+
+    Up to SHARD_FAN_OUT_WORKERS shards are queried at once, each from a
+    thread with its own connections, which are closed when it is done.
+    Without sharding everything is on one database, so calls run one after
+    another on the current connection.
+    """
+    shards = expense_shards() if shards is None else list(shards)
+    workers = min(getattr(settings, 'SHARD_FAN_OUT_WORKERS', 4), len(shards))
+    if not is_sharded():
+        workers = 1
+    if workers <= 1:
+        return [function(shard) for shard in shards]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(lambda shard: _in_thread(function, shard), shards))
+
+
+def pending_deletion_ids():
+    return list(Project.objects.pending_deletion().values_list('pk', flat=True))
+
+
+def visible_expenses(model, shard, pending=None):
+    """
+    Return the expenses or archived expenses on a shard whose project is
+    not pending deletion.
+
+    The default database filters with a join to projects; other shards
+    exclude the ids in pending, loaded from the default database when not
+    given.
+    """
+    queryset = model.objects.using(shard)
+    if shard == DEFAULT_DB_ALIAS:
+        return queryset.filter(project__deletion_requested_at__isnull=True)
+    if pending is None:
+        pending = pending_deletion_ids()
+    return queryset.exclude(project_id__in=pending)
+
+
+def find_expense(querysets, pk):
+    """
+    Return the expense with a primary key from the first of some per-shard
+    querysets holding it, or None.
+    """
+    by_shard = {queryset.db: queryset for queryset in querysets}
+    found = fan_out(lambda shard: by_shard[shard].filter(pk=pk).first(), by_shard)
+    return next((expense for expense in found if expense is not None), None)
+
+
+def _by_shard(projects):
+    groups = {}
+    for project in projects:
+        groups.setdefault(project_shard(project), []).append(project)
+    return groups
+
+
+def attach_expense_totals(projects):
+    """
+    Set the expenses_total and expenses_count that with_totals() annotates
+    on some projects, summing their expenses on every shard in parallel.
+    Returns the projects as a list.
+    """
+    projects = list(projects)
+    groups = _by_shard(projects)
+
+    def shard_totals(shard):
+        return {
+            project_id: (total, count)
+            for project_id, total, count in (
+                Expense.objects.using(shard)
+                .filter(project_id__in=[project.pk for project in groups[shard]])
+                .order_by()
+                .values('project_id')
+                .annotate(total=Sum('amount'), count=Count('pk'))
+                .values_list('project_id', 'total', 'count')
+            )
+        }
+
+    totals = {}
+    for shard_result in fan_out(shard_totals, groups):
+        totals.update(shard_result)
+    summaries = ProjectArchiveSummary.objects.in_bulk([project.pk for project in projects])
+    for project in projects:
+        total, count = totals.get(project.pk, (0, 0))
+        summary = summaries.get(project.pk)
+        if summary:
+            total, count = total + summary.total, count + summary.expense_count
+        project.expenses_total, project.expenses_count = total, count
+    return projects
+
+
+def prefetch_expenses(projects):
+    """
+    Prefetch the expenses and archived expenses of projects from their
+    shards, in parallel. Returns the projects as a list.
+    """
+    projects = list(projects)
+    groups = _by_shard(projects)
+    fan_out(
+        lambda shard: prefetch_related_objects(
+            groups[shard],
+            Prefetch('expenses', queryset=Expense.objects.using(shard)),
+            Prefetch('archived_expenses', queryset=ArchivedExpense.objects.using(shard)),
+        ),
+        groups
+    )
+    return projects
+
+
+def move_expenses(queryset, target, batch_size=None):
+    """
+    Move the rows of an expense or archived expense queryset to another
+    shard, keeping their ids. Returns the number of moved rows.
+
+    Each batch is inserted on the target, then deleted from the source;
+    rows left on both by an interruption are skipped on the target when the
+    move is run again. Moving changes no totals, so no signals are sent.
+    """
+    if batch_size is None:
+        batch_size = getattr(settings, 'SHARD_MOVE_BATCH_SIZE', 500)
+    model, source = queryset.model, queryset.db
+    if source == target:
+        return 0
+    fields = model._meta.concrete_fields
+    moved = 0
+    while True:
+        rows = list(queryset.order_by('pk')[:batch_size])
+        if not rows:
+            return moved
+        with transaction.atomic(using=target):
+            # raw keeps created_at instead of stamping the time of the move
+            model.objects.using(target)._insert(
+                rows, fields=fields, using=target, raw=True, on_conflict=OnConflict.IGNORE
+            )
+        batch = model.objects.using(source).filter(pk__in=[row.pk for row in rows])
+        moved += batch._raw_delete(source)
+
+
+def move_project(project, target, batch_size=None):
+    """
+    Move a project's expenses and archived expenses to another shard.
+
+    The project is switched to the target first, so new expenses are
+    written there, then its rows on its previous shard and every other one
+    in EXPENSE_SHARDS are moved over. Until they are, listings of the
+    project miss them. Returns the number of moved rows.
+    """
+    sources = {project.shard, *expense_shards()} - {target}
+    Project.objects.filter(pk=project.pk).update(shard=target)
+    project.shard = target
+    moved = 0
+    for model in SHARDED_MODELS:
+        for source in sorted(sources):
+            queryset = model.objects.using(source).filter(project_id=project.pk)
+            moved += move_expenses(queryset, target, batch_size)
+    return moved
@@ -0,0 +1,269 @@
+"""
+Spend counters and budgets.
+
+ProjectSpend and CategorySpend keep the running total and number of the
+expenses of every project and of every (project, category) pair, archived
+expenses included. Every expense write adjusts them by a delta instead of
+recomputing them:
+
+- saves and deletes of single expenses, through the signal receivers below.
+  The previous values of a saved expense come from the values it was
+  loaded with or, when it was loaded with deferred fields or built with
+  the pk of an existing row, from its row, read before the save;
+- bulk updates and deletes in bulk.py, once per batch.
+
+Deltas of writes on an expense shard are queued in the shard's outbox and
+added once the write commits (see projects/outbox.py).
+
+Archival moves expenses without changing their totals, and a project's
+counters are deleted with it. Budget utilization and over-budget listings
+read the counters, so they cost the same however many expenses a project
+has. Writes that send no signals, Expense.objects.bulk_create(),
+QuerySet.update() and raw SQL, leave the counters behind: go through
+bulk.py instead, or follow them with rebuild_spend_counters().
+"""
+
+from decimal import Decimal
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Count, F, Sum, Value
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+
+from .fields import CentsField
+from .models import Project, Expense, ProjectSpend, CategorySpend, ShardOutboxEntry
+from .outbox import apply_outboxes, defer, outbox_handler
+from .sharding import SHARDED_MODELS, expense_shards
+
+
+SPEND_FIELDS = ('project_id', 'category', 'amount')
+SPEND_FIELD_NAMES = ('project', 'category', 'amount')
+
+
+def spend_by_category(queryset):
+    """
+    Return {(project_id, category): [total, count]} for the expenses in a
+    queryset.
+    """
+    rows = (
+        queryset.order_by()
+        .values('project_id', 'category')
+        .annotate(total=Sum('amount'), count=Count('pk'))
+        .values_list('project_id', 'category', 'total', 'count')
+    )
+    return {(project_id, category): [total, count] for project_id, category, total, count in rows}
+
+
+def subtract_spend(deltas, spend):
+    """
+    Subtract the spend of some expenses from deltas, in place.
+    """
+    for key, (total, count) in spend.items():
+        delta = deltas.setdefault(key, [Decimal(0), 0])
+        delta[0] -= total
+        delta[1] -= count
+    return deltas
+
+
+def add_spend(deltas, spend):
+    """
+    Add the spend of some expenses to deltas, in place.
+    """
+    for key, (total, count) in spend.items():
+        delta = deltas.setdefault(key, [Decimal(0), 0])
+        delta[0] += total
+        delta[1] += count
+    return deltas
+
+
+def _add_to_counter(model, lookups, total, count):
+    updated = model.objects.filter(**lookups).update(
+        total=F('total') + Value(total, output_field=CentsField()),
+        expense_count=F('expense_count') + count,
+    )
+    if not updated:
+        model.objects.create(**lookups, total=total, expense_count=count)
+
+
+def apply_spend_deltas(deltas, using=DEFAULT_DB_ALIAS):
+    """
+    Add {(project_id, category): [total, count]} deltas to the project and
+    category counters, for a write on the database using: on an expense
+    shard, the deltas are queued in its outbox.
+    """
+    deltas = {key: (total, count) for key, (total, count) in deltas.items() if total or count}
+    if not deltas:
+        return
+    payload = [
+        [project_id, category, str(total), count]
+        for (project_id, category), (total, count) in deltas.items()
+    ]
+    if defer(using, ShardOutboxEntry.SPEND, payload):
+        return
+    by_project = {}
+    for (project_id, category), (total, count) in deltas.items():
+        _add_to_counter(CategorySpend, {'project_id': project_id, 'category': category}, total, count)
+        project_delta = by_project.setdefault(project_id, [Decimal(0), 0])
+        project_delta[0] += total
+        project_delta[1] += count
+    for project_id, (total, count) in by_project.items():
+        _add_to_counter(ProjectSpend, {'project_id': project_id}, total, count)
+
+
+@outbox_handler(ShardOutboxEntry.SPEND)
+def apply_deferred_spend(payloads):
+    deltas = {}
+    for payload in payloads:
+        add_spend(deltas, {
+            (project_id, category): [Decimal(total), count]
+            for project_id, category, total, count in payload
+        })
+    # Counters of projects deleted since are gone with them
+    existing = set(
+        Project.objects.filter(pk__in={project_id for project_id, _ in deltas}).values_list('pk', flat=True)
+    )
+    apply_spend_deltas({key: delta for key, delta in deltas.items() if key[0] in existing})
+
+
+def rebuild_spend_counters(project_ids=None):
+    """
+    Recompute the counters of some projects, or of every project, from
+    their expenses and archived expenses on every shard.
+
+    Pending outbox entries are applied first, so that the deltas they hold
+    are not added again to the rebuilt counters.
+    """
+    apply_outboxes(expense_shards())
+    with transaction.atomic():
+        counters = [ProjectSpend.objects.all(), CategorySpend.objects.all()]
+        if project_ids is not None:
+            counters = [counter.filter(project_id__in=project_ids) for counter in counters]
+        for counter in counters:
+            counter.delete()
+        deltas = {}
+        for model in SHARDED_MODELS:
+            for shard in expense_shards():
+                expenses = model.objects.using(shard).all()
+                if project_ids is not None:
+                    expenses = expenses.filter(project_id__in=project_ids)
+                add_spend(deltas, spend_by_category(expenses))
+        apply_spend_deltas(deltas)
+
+
+@receiver(pre_save, sender=Expense)
+def expense_saving(sender, instance, using, **kwargs):
+    """
+    Remember the project, category and amount an expense is saved over.
+    """
+    loaded = getattr(instance, '_loaded_values', {})
+    if all(name in loaded for name in SPEND_FIELDS):
+        instance._spend_before = tuple(loaded[name] for name in SPEND_FIELDS)
+    elif instance.pk is None:
+        instance._spend_before = None
+    else:
+        # Loaded with deferred fields, or a new instance given a pk: read
+        # the values being replaced from the row, if there is one
+        instance._spend_before = (
+            Expense.objects.using(using).filter(pk=instance.pk).values_list(*SPEND_FIELDS).first()
+        )
+
+
+def _saved_spend(instance, before, update_fields):
+    """
+    Return the project, category and amount an expense was saved with:
+    fields left out of update_fields keep their previous values.
+    """
+    if before is None or update_fields is None:
+        return tuple(getattr(instance, attname) for attname in SPEND_FIELDS)
+    return tuple(
+        getattr(instance, attname) if {name, attname} & update_fields else previous
+        for attname, name, previous in zip(SPEND_FIELDS, SPEND_FIELD_NAMES, before)
+    )
+
+
+@receiver(post_save, sender=Expense)
+def expense_saved(sender, instance, created, using, update_fields=None, **kwargs):
+    before = instance.__dict__.pop('_spend_before', None)
+    if created:
+        before = None
+    saved = _saved_spend(instance, before, update_fields)
+    deltas = {}
+    if before is not None:
+        project_id, category, amount = before
+        subtract_spend(deltas, {(project_id, category): [amount, 1]})
+    project_id, category, amount = saved
+    add_spend(deltas, {(project_id, category): [amount, 1]})
+    apply_spend_deltas(deltas, using)
+    # A later save of the same instance starts from what was just written
+    if hasattr(instance, '_loaded_values'):
+        instance._loaded_values.update(zip(SPEND_FIELDS, saved))
+
+
+@receiver(pre_delete, sender=Expense)
+def expense_deleting(sender, instance, using, **kwargs):
+    """
+    Load deferred spend fields of an expense while its row still exists.
+    """
+    deferred = instance.get_deferred_fields() & set(SPEND_FIELDS)
+    if deferred:
+        instance.refresh_from_db(using=using, fields=deferred)
+
+
+@receiver(post_delete, sender=Expense)
+def expense_deleted(sender, instance, using, **kwargs):
+    apply_spend_deltas({(instance.project_id, instance.category): [-instance.amount, -1]}, using)
+
+
+def get_budget_status(project):
+    """
+    Return a project's budget, spend and utilization, with spend per
+    category, from the counters.
+    """
+    spend = ProjectSpend.objects.filter(project=project).first()
+    spent = spend.total if spend else Decimal('0.00')
+    categories = (
+        CategorySpend.objects.filter(project=project, expense_count__gt=0)
+        .order_by('-total', 'category')
+        .values_list('category', 'total', 'expense_count')
+    )
+    return {
+        **budget_utilization(project.budget, spent),
+        'expense_count': spend.expense_count if spend else 0,
+        'categories': [
+            {
+                'category': category,
+                'spent': total,
+                'expense_count': count,
+                'share': round(total / spent * 100, 2) if spent else None,
+            }
+            for category, total, count in categories
+        ],
+    }
+
+
+def budget_utilization(budget, spent):
+    """
+    Return what is left of a budget and the percentage used.
+    """
+    if budget is None:
+        return {'budget': None, 'spent': spent, 'remaining': None, 'utilization': None, 'over_budget': False}
+    return {
+        'budget': budget,
+        'spent': spent,
+        'remaining': budget - spent,
+        'utilization': round(spent / budget * 100, 2) if budget else None,
+        'over_budget': spent > budget,
+    }
+
+
+def over_budget_projects():
+    """
+    Return active projects that spent more than their budget, most over
+    budget first, annotated with spent.
+    """
+    return (
+        Project.objects.active()
+        .filter(budget__isnull=False, spend__total__gt=F('budget'))
+        .annotate(spent=F('spend__total'))
+        .order_by((F('spend__total') - F('budget')).desc(), 'pk')
+    )
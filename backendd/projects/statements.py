@@ -0,0 +1,292 @@
+"""
+Statement templates for the expense tracker.
+
+This module compiles the ReportLab styles and table templates used for
+PDF statements once per process, and lays expenses out as page-sized
+LongTable chunks so that rendering time grows linearly with row count.
+Pages are drawn one at a time, each from its own chunk of rows, rather
+than from a story built for the whole document up front.
+
+write_project_pdf() renders the same document straight into a file, for
+statements sent from a temporary file. ReportLab still keeps every drawn
+page until the document is saved, so this saves the copy of the
+document's bytes, not the pages.
+"""
+
+import io
+from decimal import Decimal
+from functools import lru_cache
+from itertools import islice
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.pdfgen.canvas import Canvas
+from reportlab.platypus import Frame, LongTable, Table, TableStyle, Paragraph, Spacer
+from reportlab.platypus.doctemplate import LayoutError
+
+from .renderers import statement_header, statement_rows
+
+
+# Page geometry shared by every statement
+PAGE_SIZE = A4
+PAGE_MARGINS = {
+    'rightMargin': 72,
+    'leftMargin': 72,
+    'topMargin': 72,
+    'bottomMargin': 18,
+}
+FRAME_PADDING = 6
+
+# Expense table layout. Rows have a fixed height so that the number of
+# rows fitting on a page is known before the document is built.
+EXPENSE_HEADER = ['Date', 'Description', 'Amount']
+EXPENSE_COL_WIDTHS = [1.5*inch, 3.5*inch, 1.5*inch]
+EXPENSE_ROW_HEIGHT = 20
+DESCRIPTION_PREVIEW_LENGTH = 50
+
+
+class StatementTemplate:
+    """
+    Compiled PDF statement template.
+
+    Holds the paragraph and table styles shared by all statements rendered
+    in this process, and splits expense rows into chunks that each fill
+    exactly one page, with a repeated header row and a page total row.
+    """
+
+    def __init__(self):
+        styles = getSampleStyleSheet()
+        self.title_style = ParagraphStyle(
+            'CustomTitle',
+            parent=styles['Heading1'],
+            fontSize=24,
+            spaceAfter=30,
+            alignment=1  # Center alignment
+        )
+        self.heading_style = styles['Heading2']
+        self.normal_style = styles['Normal']
+
+        self.project_table_style = TableStyle([
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+            ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 0), (-1, -1), 12),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
+        ])
+
+        # Negative indices let one style serve chunks of any length: row 0
+        # is the header and row -1 the page total.
+        self.expense_table_style = TableStyle([
+            # Header row
+            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('ALIGN', (2, 0), (2, -1), 'RIGHT'),  # Amount column right-aligned
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 12),
+
+            # Data rows
+            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 1), (-1, -1), 10),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
+            ('TOPPADDING', (0, 0), (-1, -1), 4),
+
+            # Alternating row colors
+            ('ROWBACKGROUNDS', (0, 1), (-1, -2), [colors.white, colors.lightgrey]),
+
+            # Page total row
+            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+            ('BACKGROUND', (0, -1), (-1, -1), colors.whitesmoke),
+        ])
+
+        page_width, page_height = PAGE_SIZE
+        self.frame_width = (
+            page_width - PAGE_MARGINS['leftMargin'] - PAGE_MARGINS['rightMargin']
+            - 2 * FRAME_PADDING
+        )
+        self.frame_height = (
+            page_height - PAGE_MARGINS['topMargin'] - PAGE_MARGINS['bottomMargin']
+            - 2 * FRAME_PADDING
+        )
+        self.rows_per_page = self._rows_fitting(self.frame_height)
+
+    def _rows_fitting(self, height):
+        """
+        Return how many expense rows fit in height alongside the header
+        and page total rows.
+        """
+        return max(int(height // EXPENSE_ROW_HEIGHT) - 2, 0)
+
+    def _flowables_height(self, flowables):
+        """
+        Return the vertical space the given flowables take at the top of a frame.
+        """
+        height = 0
+        for index, flowable in enumerate(flowables):
+            _, flowable_height = flowable.wrap(self.frame_width, self.frame_height)
+            height += flowable_height + flowable.getSpaceAfter()
+            if index:
+                height += flowable.getSpaceBefore()
+        return height
+
+    def _format_rows(self, rows):
+        """
+        Return formatted rows and their total for (date, description,
+        amount) tuples.
+        """
+        chunk = []
+        page_total = Decimal('0')
+        for date, description, amount in rows:
+            page_total += amount
+            if len(description) > DESCRIPTION_PREVIEW_LENGTH:
+                description = description[:DESCRIPTION_PREVIEW_LENGTH] + '...'
+            chunk.append([date.strftime('%Y-%m-%d'), description, f'${amount:.2f}'])
+        return chunk, page_total
+
+    def expense_chunks(self, rows, first_page_rows):
+        """
+        Yield the formatted rows and page total of each page of expenses for
+        an iterable of (date, description, amount) tuples: first_page_rows
+        rows for the first page, possibly none, then rows_per_page rows for
+        every following page.
+        """
+        rows = iter(rows)
+        yield self._format_rows(islice(rows, first_page_rows))
+        while True:
+            chunk, page_total = self._format_rows(islice(rows, self.rows_per_page))
+            if not chunk:
+                return
+            yield chunk, page_total
+
+    def _expense_table(self, rows, page_total):
+        """
+        Build one page-sized expense table from already formatted rows.
+        """
+        data = [EXPENSE_HEADER]
+        data.extend(rows)
+        data.append(['', 'Page total', f'${page_total:.2f}'])
+        return LongTable(
+            data,
+            colWidths=EXPENSE_COL_WIDTHS,
+            rowHeights=EXPENSE_ROW_HEIGHT,
+            style=self.expense_table_style,
+            repeatRows=1,
+        )
+
+    def _first_page(self, project_info, has_rows):
+        """
+        Return the flowables at the top of the first page: the title, the
+        project table and the heading of the expense tables.
+        """
+        project_table = Table(
+            [[label, value] for label, value in project_info],
+            colWidths=[2*inch, 4*inch]
+        )
+        project_table.setStyle(self.project_table_style)
+
+        first_page = [
+            Paragraph("Expense Statement", self.title_style),
+            Spacer(1, 12),
+            project_table,
+            Spacer(1, 30),
+        ]
+        if has_rows:
+            first_page.append(Paragraph("Expense Details", self.heading_style))
+            first_page.append(Spacer(1, 12))
+        else:
+            first_page.append(Paragraph("No expenses recorded for this project.", self.normal_style))
+        return first_page
+
+    def _pages(self, project_info, rows, has_rows):
+        """
+        Yield the flowables of each page of a statement, building each
+        page's expense table only when the page is about to be drawn.
+        """
+        first_page = self._first_page(project_info, has_rows)
+        if not has_rows:
+            yield first_page
+            return
+
+        remaining = self.frame_height - self._flowables_height(first_page)
+        chunks = self.expense_chunks(rows, self._rows_fitting(remaining))
+        chunk, page_total = next(chunks)
+        if chunk:
+            first_page.append(self._expense_table(chunk, page_total))
+        yield first_page
+        for chunk, page_total in chunks:
+            yield [self._expense_table(chunk, page_total)]
+
+    def render(self, buffer, project_info, rows, has_rows=True):
+        """
+        Render a PDF statement into buffer.
+
+        project_info is a list of (label, value) pairs shown in the header
+        table and rows an iterable of (date, description, amount) tuples,
+        consumed lazily one page at a time. Returns the number of pages.
+        """
+        canvas = Canvas(buffer, pagesize=PAGE_SIZE)
+        page_width, page_height = PAGE_SIZE
+        pages = 0
+        for flowables in self._pages(project_info, rows, has_rows):
+            frame = Frame(
+                PAGE_MARGINS['leftMargin'], PAGE_MARGINS['bottomMargin'],
+                page_width - PAGE_MARGINS['leftMargin'] - PAGE_MARGINS['rightMargin'],
+                page_height - PAGE_MARGINS['topMargin'] - PAGE_MARGINS['bottomMargin'],
+                leftPadding=FRAME_PADDING, rightPadding=FRAME_PADDING,
+                topPadding=FRAME_PADDING, bottomPadding=FRAME_PADDING,
+            )
+            frame.addFromList(flowables, canvas)
+            if flowables:
+                raise LayoutError(f"{flowables[0]!r} does not fit on a statement page")
+            canvas.showPage()
+            pages += 1
+        canvas.save()
+        return pages
+
+
+@lru_cache(maxsize=None)
+def get_statement_template():
+    """
+    Return the process-wide compiled statement template.
+    """
+    return StatementTemplate()
+
+
+def render_pdf_statement(project_info, rows, has_rows=True):
+    """
+    Render a PDF statement and return its bytes.
+    """
+    buffer = io.BytesIO()
+    get_statement_template().render(buffer, project_info, rows, has_rows=has_rows)
+    return buffer.getvalue()
+
+
+def _project_info(project, expense_count):
+    return [[label, str(value)] for label, value in statement_header(project, expense_count)]
+
+
+def render_project_pdf(project):
+    """
+    Render a project's PDF statement; the template consumes the streamed
+    expense rows a page at a time.
+    """
+    expense_count = project.expense_count
+    return render_pdf_statement(
+        _project_info(project, expense_count), statement_rows(project), has_rows=expense_count > 0
+    )
+
+
+def write_project_pdf(project, file):
+    """
+    Write a project's PDF statement to a binary file, drawing it a page at
+    a time as render_project_pdf() does.
+    """
+    expense_count = project.expense_count
+    get_statement_template().render(
+        file, _project_info(project, expense_count), statement_rows(project),
+        has_rows=expense_count > 0
+    )
@@ -0,0 +1,129 @@
+"""
+Spend statistics for projects.
+
+Expense columns, with amounts as their stored integer cents, are loaded
+with values_list straight into NumPy arrays, a chunk at a time, and every
+statistic is computed with vectorized operations. Results are cached
+against the project's data version, so they are recomputed only after the
+project's expenses change.
+
+NumPy is imported on the first computation rather than at startup.
+"""
+
+from itertools import chain, islice
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .archive import expense_sources
+from .changes import project_data_version
+from .fields import cents
+
+
+PERCENTILES = [5, 25, 50, 75, 90, 95, 99]
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+DEFAULT_HISTOGRAM_BINS = 20
+MAX_HISTOGRAM_BINS = 200
+LARGEST_EXPENSES = 10
+
+
+def load_expense_columns(project_id, chunk_size=None):
+    """
+    Return the ids, amounts in cents and date ordinals of a project's
+    expenses, archived ones included, as NumPy arrays.
+    """
+    import numpy as np
+
+    if chunk_size is None:
+        chunk_size = getattr(settings, 'STATISTICS_CHUNK_SIZE', 20000)
+
+    rows = chain.from_iterable(
+        source.order_by()
+        .values_list('id', cents('amount'), 'date')
+        .iterator(chunk_size=chunk_size)
+        for source in expense_sources(project_id)
+    )
+    ids, amounts, days = [], [], []
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        columns = list(zip(*chunk))
+        ids.append(np.array(columns[0], dtype=np.int64))
+        amounts.append(np.array(columns[1], dtype=np.int64))
+        days.append(np.fromiter((day.toordinal() for day in columns[2]), dtype=np.int64, count=len(chunk)))
+
+    if not ids:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty
+    return np.concatenate(ids), np.concatenate(amounts), np.concatenate(days)
+
+
+def compute_statistics(ids, amounts_cents, days, bins=DEFAULT_HISTOGRAM_BINS):
+    """
+    Compute distribution statistics from expense columns.
+    """
+    import numpy as np
+
+    count = int(amounts_cents.size)
+    if not count:
+        return {'count': 0, 'total': 0, 'mean': None, 'stddev': None, 'min': None,
+                'max': None, 'percentiles': {}, 'histogram': [], 'outliers': {'count': 0},
+                'largest': [], 'by_weekday': []}
+
+    amounts = amounts_cents / 100
+    q1, q3 = np.percentile(amounts, [25, 75])
+    fence = q3 + 1.5 * (q3 - q1)
+
+    counts, edges = np.histogram(amounts, bins=bins)
+
+    largest = min(LARGEST_EXPENSES, count)
+    top = np.argpartition(amounts_cents, count - largest)[count - largest:]
+    top = top[np.argsort(amounts_cents[top])[::-1]]
+
+    # date.toordinal() is 1 for Monday, 1 January of year 1
+    weekday = (days - 1) % 7
+    weekday_totals = np.bincount(weekday, weights=amounts_cents, minlength=7)
+    weekday_counts = np.bincount(weekday, minlength=7)
+
+    return {
+        'count': count,
+        'total': round(int(amounts_cents.sum()) / 100, 2),
+        'mean': round(float(amounts.mean()), 2),
+        'stddev': round(float(amounts.std(ddof=1)), 2) if count > 1 else 0.0,
+        'min': int(amounts_cents.min()) / 100,
+        'max': int(amounts_cents.max()) / 100,
+        'percentiles': {
+            f'p{p}': round(float(value), 2)
+            for p, value in zip(PERCENTILES, np.percentile(amounts, PERCENTILES))
+        },
+        'histogram': [
+            {'lower': round(float(lower), 2), 'upper': round(float(upper), 2), 'count': int(n)}
+            for lower, upper, n in zip(edges[:-1], edges[1:], counts)
+        ],
+        'outliers': {
+            'threshold': round(float(fence), 2),
+            'count': int(np.count_nonzero(amounts > fence)),
+        },
+        'largest': [
+            {'id': int(ids[i]), 'amount': int(amounts_cents[i]) / 100}
+            for i in top
+        ],
+        'by_weekday': [
+            {'weekday': name, 'count': int(weekday_counts[i]), 'total': int(weekday_totals[i]) / 100}
+            for i, name in enumerate(WEEKDAYS)
+        ],
+    }
+
+
+def get_project_statistics(project_id, bins=DEFAULT_HISTOGRAM_BINS):
+    """
+    Return the statistics of a project, from the cache when its expenses
+    have not changed since they were last computed.
+    """
+    key = f'project-statistics:{project_id}:{project_data_version(project_id)}:{bins}'
+    statistics = cache.get(key)
+    if statistics is None:
+        statistics = compute_statistics(*load_expense_columns(project_id), bins=bins)
+        cache.set(key, statistics, getattr(settings, 'STATISTICS_CACHE_TIMEOUT', 3600))
+    return statistics
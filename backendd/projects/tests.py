@@ -1,3 +1,1463 @@
-from django.test import TestCase
+"""
+Tests for the expense tracker API.
+"""
 
-# Create your tests here.
+import asyncio
+import base64
+import gzip
+import importlib.util
+import io
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import zlib
+from datetime import date, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import OperationalError, connection, transaction
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from openpyxl import load_workbook
+from rest_framework.test import APIClient
+
+from .archive import archive_expenses
+from .balances import get_balance, get_cumulative_series, take_balance_snapshots
+from .changes import compact_change_log
+from .deletion import delete_project_in_batches
+from .events import EventBroker, Subscription, sse_application
+from .fields import cents
+from .frontend import FrontendWhiteNoiseMiddleware
+from .idempotency import expire_idempotency_keys
+from .models import (
+    Project, Expense, ArchivedExpense, ProjectBalanceSnapshot, ProjectSpend, CategorySpend, IdempotencyKey,
+    ChangeLog, ShardOutboxEntry,
+)
+from .outbox import _handlers, outbox_applier
+from .renderers import _renderers, get_statement_renderer, register_statement_renderer
+from .sharding import SHARD_ID_BITS, ShardRouter, id_range_start, placement
+from .spend import rebuild_spend_counters
+from .statements import get_statement_template
+from .throttling import REQUEST, RENDER, in_flight, shared_state
+
+
+@override_settings(THROTTLE_STATE_PATH=':memory:', EXPENSE_SHARDS=['default'])
+class APITestCase(TestCase):
+    """
+    TestCase with its own empty throttle state for every test class.
+    """
+
+
+class StatementTemplateTests(APITestCase):
+    """
+    Tests for the compiled PDF statement template.
+    """
+
+    def render(self, count):
+        rows = [(date(2025, 1, 1), 'Item', Decimal('1.50'))] * count
+        buffer = io.BytesIO()
+        pages = get_statement_template().render(buffer, [['Project Name:', 'Test']], rows)
+        return pages, buffer.getvalue()
+
+    def test_template_is_compiled_once(self):
+        self.assertIs(get_statement_template(), get_statement_template())
+
+    def test_rows_are_split_into_full_pages(self):
+        template = get_statement_template()
+        one_page, _ = self.render(1)
+        self.assertEqual(one_page, 1)
+
+        count = template.rows_per_page * 5
+        pages, pdf = self.render(count)
+        self.assertTrue(pdf.startswith(b'%PDF'))
+        # The summary page takes a partial chunk and every following page
+        # exactly one full chunk; a table split by the layout engine would
+        # add an extra page.
+        self.assertEqual(pages, 6)
+
+
+# More statements are rendered here than the statement bucket allows
+@override_settings(THROTTLE_BUCKETS={})
+class StatementEndpointTests(APITestCase):
+    """
+    Tests for the project statement endpoint.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.project = Project.objects.create(name='Website', description='Redesign')
+
+    def test_pdf_statement_without_expenses(self):
+        response = self.client.get(f'/api/projects/{self.project.pk}/statement/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+
+    def test_pdf_statement_with_expenses(self):
+        Expense.objects.bulk_create([
+            Expense(project=self.project, amount=Decimal('10.00'), description=f'Item {i}')
+            for i in range(120)
+        ])
+        response = self.client.get(f'/api/projects/{self.project.pk}/statement/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content.startswith(b'%PDF'))
+
+    def test_excel_statement(self):
+        response = self.client.get(f'/api/projects/{self.project.pk}/statement/?format=excel')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response['Content-Type'],
+            'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        )
+
+    def test_csv_and_html_statements(self):
+        Expense.objects.create(
+            project=self.project, amount=Decimal('12.50'), description='<Hosting>', date=date(2026, 3, 1)
+        )
+        response = self.client.get(f'/api/projects/{self.project.pk}/statement/?format=csv')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="Website_statement.csv"')
+        self.assertIn('2026-03-01,<Hosting>,12.50', response.content.decode())
+
+        response = self.client.get(f'/api/projects/{self.project.pk}/statement/?format=html')
+        self.assertEqual(response['Content-Type'], 'text/html; charset=utf-8')
+        self.assertIn('&lt;Hosting&gt;</td><td>$12.50', response.content.decode())
+
+    def test_unknown_format_is_rejected(self):
+        response = self.client.get(f'/api/projects/{self.project.pk}/statement/?format=odt')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('pdf', response.json()['error'])
+
+    def test_registered_format(self):
+        register_statement_renderer('txt', 'projects.tests.render_text_statement', 'text/plain', 'txt')
+        self.addCleanup(_renderers.pop, 'txt')
+        self.assertFalse(get_statement_renderer('txt').loaded)
+        response = self.client.get(f'/api/projects/{self.project.pk}/statement/?format=txt')
+        self.assertEqual(response.content, b'Website')
+        self.assertTrue(get_statement_renderer('txt').loaded)
+
+    def test_renderers_are_imported_on_first_use(self):
+        script = (
+            "import sys, django; django.setup(); import projects.urls; "
+            "print(','.join(m for m in ('reportlab', 'openpyxl', 'numpy') if m in sys.modules))"
+        )
+        result = subprocess.run(
+            [sys.executable, '-c', script], capture_output=True, text=True, check=True,
+            env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'expense_tracker.settings'},
+            cwd=settings.BASE_DIR,
+        )
+        self.assertEqual(result.stdout.strip(), '')
+
+
+def render_text_statement(project):
+    return project.name.encode()
+
+
+def load_statement_pages(pdf):
+    """
+    Return the page objects of a PDF, found by their /Type.
+    """
+    return re.findall(rb'/Type\s*/Page[^s]', pdf)
+
+
+def load_statement_text(pdf):
+    """
+    Return the text drawn on each page of a ReportLab PDF, from its
+    ASCII85 and Flate encoded content streams.
+    """
+    streams = re.findall(rb'/FlateDecode \] /Length \d+\s*>>\s*stream\r?\n(.*?)endstream', pdf, re.S)
+    pages = []
+    for stream in streams:
+        content = zlib.decompress(base64.a85decode(stream.strip(), adobe=True))
+        pages.append([text.decode('latin-1') for text in re.findall(rb'\((.*?)\) Tj', content)])
+    return pages
+
+
+# Large enough for in-memory Excel statements to exceed the budget
+@override_settings(
+    THROTTLE_BUCKETS={}, STATEMENT_MEMORY_PROFILING=True, STATEMENT_MEMORY_BUDGET=2 * 1024 * 1024
+)
+class StatementMemoryTests(APITestCase):
+    """
+    Tests for statement memory budgets and profiling.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.project = Project.objects.create(name='Warehouse')
+        Expense.objects.bulk_create([
+            Expense(project=self.project, amount=Decimal('12.34'), description=f'Pallet {i} of stock')
+            for i in range(3000)
+        ])
+
+    def get_profiled(self, format_name):
+        with self.assertLogs('projects.profiling', 'INFO') as logs:
+            response = self.client.get(f'/api/projects/{self.project.pk}/statement/?format={format_name}')
+        self.assertEqual(response.status_code, 200)
+        record, = logs.records
+        return response, record
+
+    def test_large_statement_is_streamed_under_budget(self):
+        response, record = self.get_profiled('excel')
+        self.assertTrue(response.streaming)
+        self.assertEqual(record.statement_path, 'streaming')
+        self.assertLess(record.render_peak_traced, settings.STATEMENT_MEMORY_BUDGET)
+        sheet = load_workbook(io.BytesIO(b''.join(response.streaming_content))).active
+        self.assertEqual(sheet.max_row, 3011)
+        self.assertEqual(sheet['C12'].number_format, '$#,##0.00')
+
+    @override_settings(STATEMENT_MEMORY_BUDGET=None)
+    def test_in_memory_render_exceeds_budget(self):
+        response, record = self.get_profiled('excel')
+        self.assertFalse(response.streaming)
+        self.assertEqual(record.statement_path, 'memory')
+        self.assertGreater(record.render_peak_traced, 2 * 1024 * 1024)
+
+    def test_streamed_pdf_matches_in_memory_pdf(self):
+        renderer = get_statement_renderer('pdf')
+        with override_settings(STATEMENT_MEMORY_BUDGET=renderer.required_memory(3000, streaming=True)):
+            response, streamed_record = self.get_profiled('pdf')
+        self.assertTrue(response.streaming)
+        self.assertEqual(streamed_record.statement_path, 'streaming')
+        self.assertLess(streamed_record.render_peak_traced, settings.STATEMENT_MEMORY_BUDGET)
+        streamed = b''.join(response.streaming_content)
+
+        response, record = self.get_profiled('pdf')
+        self.assertEqual(record.statement_path, 'memory')
+        self.assertEqual(len(load_statement_pages(streamed)), len(load_statement_pages(response.content)))
+        pages = load_statement_text(streamed)
+        self.assertEqual(pages, load_statement_text(response.content))
+        self.assertGreater(len(pages), 80)
+        self.assertEqual(sum(page.count('$12.34') for page in pages), 3000)
+
+    @override_settings(STATEMENT_MEMORY_BUDGET=1600000)
+    def test_pdf_statement_over_budget_is_refused(self):
+        renderer = get_statement_renderer('pdf')
+        self.assertGreater(renderer.required_memory(3000, streaming=True), settings.STATEMENT_MEMORY_BUDGET)
+        response = self.client.get(f'/api/projects/{self.project.pk}/statement/?format=pdf')
+        self.assertEqual(response.status_code, 422)
+        self.assertIn('Formats available: excel, csv, html.', response.json()['error'])
+
+    def test_statement_without_streaming_renderer_is_refused(self):
+        register_statement_renderer('txt', 'projects.tests.render_text_statement', 'text/plain', 'txt',
+                                    row_memory=1000)
+        self.addCleanup(_renderers.pop, 'txt')
+        response = self.client.get(f'/api/projects/{self.project.pk}/statement/?format=txt')
+        self.assertEqual(response.status_code, 422)
+        self.assertIn('pdf, excel, csv, html', response.json()['error'])
+
+
+class ChangeFeedTests(APITestCase):
+    """
+    Tests for the incremental change feed.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def get_changes(self, since):
+        response = self.client.get(f'/api/changes/?since={since}')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_changes_are_collapsed_per_object(self):
+        start = self.get_changes(0)['cursor']
+        project = Project.objects.create(name='Website')
+        expense = Expense.objects.create(project=project, amount=Decimal('5.00'), description='Domain')
+        expense.amount = Decimal('7.00')
+        expense.save()
+        temporary = Expense.objects.create(project=project, amount=Decimal('1.00'), description='Temp')
+        temporary.delete()
+
+        data = self.get_changes(start)
+        self.assertFalse(data['resync'])
+        self.assertEqual([p['id'] for p in data['projects']['upserted']], [project.pk])
+        self.assertEqual([e['amount'] for e in data['expenses']['upserted']], ['7.00'])
+        # Created and deleted within the range, so the client never saw it
+        self.assertEqual(data['expenses']['deleted'], [])
+
+        expense_id = expense.pk
+        expense.delete()
+        data = self.get_changes(data['cursor'])
+        self.assertEqual(data['expenses']['deleted'], [expense_id])
+        self.assertEqual(self.get_changes(data['cursor'])['expenses']['deleted'], [])
+
+    def test_old_cursor_requires_resync_after_compaction(self):
+        project = Project.objects.create(name='Website')
+        Expense.objects.create(project=project, amount=Decimal('5.00'), description='Domain')
+        Expense.objects.create(project=project, amount=Decimal('6.00'), description='Hosting')
+        compact_change_log(retention=timedelta(0))
+
+        self.assertTrue(self.get_changes(0)['resync'])
+        cursor = self.get_changes(0)['cursor']
+        self.assertFalse(self.get_changes(cursor)['resync'])
+
+
+class EventStreamTests(APITestCase):
+    """
+    Tests for the Server-Sent Events push channel.
+    """
+
+    async def test_changes_are_pushed_to_subscribers(self):
+        project = await Project.objects.acreate(name='Website')
+        sent = []
+        disconnect = asyncio.Event()
+
+        async def receive():
+            await disconnect.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {'type': 'http', 'path': '/api/events/', 'query_string': f'project={project.pk}'.encode()}
+        stream = asyncio.ensure_future(sse_application(scope, receive, send))
+        await asyncio.sleep(0.1)
+        await Expense.objects.acreate(project=project, amount=Decimal('12.50'), description='Domain')
+
+        body = b''
+        for _ in range(50):
+            body = b''.join(message.get('body', b'') for message in sent)
+            if b'project_total' in body:
+                break
+            await asyncio.sleep(0.1)
+        disconnect.set()
+        await stream
+
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertIn(b'event: expense', body)
+        self.assertIn(b'"total_expenses": 12.5', body)
+
+    def test_stream_outside_asgi_server_is_501(self):
+        response = self.client.get('/api/events/')
+        self.assertEqual(response.status_code, 501)
+        self.assertIn('ASGI', response.json()['error'])
+
+    async def test_lagging_subscriber_gets_resync(self):
+        subscription = Subscription(project_id=None, queue_size=2)
+        for seq in range(3):
+            subscription.offer({'event': 'expense', 'id': seq, 'data': {}})
+        event = await subscription.get()
+        self.assertEqual(event['event'], 'resync')
+        subscription.offer({'event': 'expense', 'id': 4, 'data': {}})
+        self.assertEqual((await subscription.get())['id'], 4)
+
+    async def test_broker_retries_after_database_error(self):
+        broker = EventBroker(poll_interval=0.01)
+        subscription = broker.subscribe()
+        read_events = broker.read_events
+        failures = [OperationalError('database is locked')]
+
+        def flaky_read_events(cursor):
+            if failures:
+                raise failures.pop()
+            return read_events(cursor)
+
+        with patch.object(broker, 'read_events', flaky_read_events), \
+                self.assertLogs('projects.events', 'WARNING'):
+            broker.start()
+            await asyncio.sleep(0.1)
+            project = await Project.objects.acreate(name='Website')
+            event = await asyncio.wait_for(subscription.get(), timeout=5)
+            broker.close_all()
+        self.assertEqual(event['event'], 'project')
+        self.assertEqual(event['data']['id'], project.pk)
+
+    async def test_broker_closes_subscribers_when_database_stays_down(self):
+        broker = EventBroker(poll_interval=0.01, max_backoff=0.01, max_failures=3)
+        subscription = broker.subscribe()
+        with patch.object(broker, 'read_events', side_effect=OperationalError('disk I/O error')), \
+                self.assertLogs('projects.events', 'ERROR'):
+            broker.start()
+            self.assertIsNone(await asyncio.wait_for(subscription.get(), timeout=5))
+        self.assertFalse(broker.subscribers)
+
+    async def test_stream_allows_configured_origins_only(self):
+        async def receive():
+            return {'type': 'http.disconnect'}
+
+        async def start_headers(origin):
+            sent = []
+
+            async def send(message):
+                sent.append(message)
+
+            scope = {'type': 'http', 'path': '/api/events/', 'query_string': b'',
+                     'headers': [(b'origin', origin)]}
+            await sse_application(scope, receive, send)
+            return dict(sent[0]['headers'])
+
+        with override_settings(CORS_ALLOW_ALL_ORIGINS=False,
+                               CORS_ALLOWED_ORIGINS=['http://localhost:8080']):
+            allowed = await start_headers(b'http://localhost:8080')
+            other = await start_headers(b'http://evil.example')
+        self.assertEqual(allowed[b'access-control-allow-origin'], b'http://localhost:8080')
+        self.assertNotIn(b'access-control-allow-origin', other)
+
+
+class ProjectDeletionTests(APITestCase):
+    """
+    Tests for batched background deletion of projects.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.project = Project.objects.create(name='Website')
+        self.other = Project.objects.create(name='Office')
+        Expense.objects.bulk_create([
+            Expense(project=project, amount=Decimal('2.00'), description=f'Item {i}')
+            for project in (self.project, self.other)
+            for i in range(25)
+        ])
+
+    def test_project_is_hidden_then_deleted_in_batches(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.delete(f'/api/projects/{self.project.pk}/')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(len(callbacks), 1)
+
+        # Hidden from every read before any expense is removed
+        self.assertEqual(Expense.objects.filter(project=self.project).count(), 25)
+        self.assertEqual(self.client.get(f'/api/projects/{self.project.pk}/').status_code, 404)
+        self.assertEqual(
+            self.client.get(f'/api/projects/{self.project.pk}/statement/').status_code, 404
+        )
+        self.assertEqual([p['id'] for p in self.client.get('/api/projects/').json()['results']],
+                         [self.other.pk])
+        self.assertEqual(self.client.get('/api/expenses/').json()['count'], 25)
+
+        deleted = delete_project_in_batches(self.project.pk, batch_size=10, pause=0)
+        self.assertEqual(deleted, 25)
+        self.assertFalse(Project.objects.filter(pk=self.project.pk).exists())
+        self.assertEqual(Expense.objects.count(), 25)
+        self.assertEqual(self.other.total_expenses, Decimal('50.00'))
+
+    def test_expenses_cannot_be_added_to_pending_project(self):
+        with self.captureOnCommitCallbacks():
+            self.client.delete(f'/api/projects/{self.project.pk}/')
+        response = self.client.post('/api/expenses/', {
+            'project': self.project.pk, 'amount': '1.00', 'description': 'Late', 'date': '2025-01-01'
+        })
+        self.assertEqual(response.status_code, 400)
+
+
+class ExpenseBulkTests(APITestCase):
+    """
+    Tests for the bulk update and bulk delete endpoints.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.project = Project.objects.create(name='Website')
+        self.other = Project.objects.create(name='Office')
+        self.expenses = Expense.objects.bulk_create([
+            Expense(project=self.project, amount=Decimal('3.00'), description=f'Item {i}',
+                    date=date(2025, 1, 1 + i))
+            for i in range(10)
+        ])
+
+    def test_bulk_update_by_filter_moves_expenses(self):
+        response = self.client.post('/api/expenses/bulk-update/', {
+            'filter': {'project': self.project.pk, 'date_from': '2025-01-06'},
+            'changes': {'project': self.other.pk, 'date': '2025-03-01'},
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'updated': 5})
+        self.assertEqual(self.other.expenses.filter(date=date(2025, 3, 1)).count(), 5)
+        self.assertEqual(self.project.total_expenses, Decimal('15.00'))
+        self.assertEqual(self.other.total_expenses, Decimal('15.00'))
+
+        changes = self.client.get('/api/changes/?since=0').json()
+        self.assertEqual(len(changes['expenses']['upserted']), 5)
+
+    def test_bulk_update_validates_like_expense_serializer(self):
+        response = self.client.post('/api/expenses/bulk-update/', {
+            'ids': [self.expenses[0].pk],
+            'changes': {'amount': '-1.00', 'created_at': '2025-01-01T00:00:00Z'},
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post('/api/expenses/bulk-update/', {
+            'ids': [self.expenses[0].pk],
+            'changes': {'amount': '0'},
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post('/api/expenses/bulk-update/', {
+            'filter': {},
+            'changes': {'description': 'Everything'},
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_bulk_delete_by_ids(self):
+        ids = [expense.pk for expense in self.expenses[:4]]
+        response = self.client.post('/api/expenses/bulk-delete/', {'ids': ids}, format='json')
+        self.assertEqual(response.json(), {'deleted': 4})
+        self.assertEqual(self.project.expense_count, 6)
+        changes = self.client.get('/api/changes/?since=0').json()
+        self.assertEqual(sorted(changes['expenses']['deleted']), ids)
+
+
+class BalanceTests(APITestCase):
+    """
+    Tests for point-in-time balances and cumulative series.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.project = Project.objects.create(name='Website')
+        for month, amount in ((1, '10.00'), (1, '5.00'), (2, '20.00'), (3, '40.00')):
+            Expense.objects.create(
+                project=self.project, amount=Decimal(amount), description='Item',
+                date=date(2025, month, 10)
+            )
+
+    def balance(self, as_of):
+        response = self.client.get(f'/api/projects/{self.project.pk}/balance/?as_of={as_of}')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_balance_as_of_date(self):
+        self.assertEqual(self.balance('2025-01-31')['total_expenses'], 15)
+        self.assertEqual(self.balance('2025-02-10')['expense_count'], 3)
+        self.assertEqual(self.balance('2024-12-31')['total_expenses'], 0)
+
+    def test_balance_uses_and_invalidates_snapshots(self):
+        self.assertEqual(take_balance_snapshots(self.project), 3)
+        self.assertEqual(self.balance('2025-03-15')['total_expenses'], 75)
+
+        # A backdated expense invalidates the snapshots that include it
+        Expense.objects.create(
+            project=self.project, amount=Decimal('1.00'), description='Late', date=date(2025, 2, 1)
+        )
+        self.assertEqual(self.project.balance_snapshots.count(), 1)
+        self.assertEqual(self.balance('2025-02-28')['total_expenses'], 36)
+        self.assertEqual(self.balance('2025-12-31')['total_expenses'], 76)
+
+    def test_cumulative_series(self):
+        response = self.client.get(
+            f'/api/projects/{self.project.pk}/cumulative/?interval=month&date_from=2025-02-01'
+        )
+        self.assertEqual(response.json()['results'], [
+            {'date': '2025-02-01', 'amount': 20, 'cumulative': 35},
+            {'date': '2025-03-01', 'amount': 40, 'cumulative': 75},
+        ])
+        response = self.client.get(f'/api/projects/{self.project.pk}/cumulative/')
+        self.assertEqual([row['cumulative'] for row in response.json()['results']],
+                         [15, 35, 75])
+
+
+class StatisticsTests(APITestCase):
+    """
+    Tests for the spend statistics endpoint.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.project = Project.objects.create(name='Website')
+        # 2025-01-06 is a Monday
+        for day, amount in ((6, '10.00'), (6, '20.00'), (7, '30.00'), (8, '40.00'), (12, '500.00')):
+            Expense.objects.create(
+                project=self.project, amount=Decimal(amount), description='Item',
+                date=date(2025, 1, day)
+            )
+
+    def statistics(self, **params):
+        response = self.client.get(f'/api/projects/{self.project.pk}/statistics/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_statistics(self):
+        data = self.statistics(bins=5)
+        self.assertEqual(data['count'], 5)
+        self.assertEqual(data['total'], 600.0)
+        self.assertEqual(data['mean'], 120.0)
+        self.assertEqual(data['percentiles']['p50'], 30.0)
+        self.assertEqual(sum(bucket['count'] for bucket in data['histogram']), 5)
+        self.assertEqual(data['largest'][0]['amount'], 500.0)
+        self.assertEqual(data['outliers']['count'], 1)
+        by_weekday = {row['weekday']: row for row in data['by_weekday']}
+        self.assertEqual(by_weekday['Monday']['total'], 30.0)
+        self.assertEqual(by_weekday['Sunday']['count'], 1)
+
+    def test_statistics_are_recomputed_after_writes(self):
+        self.assertEqual(self.statistics()['count'], 5)
+        Expense.objects.create(project=self.project, amount=Decimal('1.00'), description='New',
+                               date=date(2025, 1, 13))
+        self.assertEqual(self.statistics()['count'], 6)
+
+    def test_statistics_are_recomputed_after_a_move_and_compaction(self):
+        project = Project.objects.create(name='Mobile')
+        Expense.objects.create(project=project, amount=Decimal('5.00'), description='Icon')
+        self.assertEqual(self.client.get(f'/api/projects/{project.pk}/statistics/').json()['count'], 1)
+
+        expense = Expense.objects.filter(project=self.project).first()
+        expense.project = project
+        expense.save()
+        self.assertEqual(self.client.get(f'/api/projects/{project.pk}/statistics/').json()['count'], 2)
+        # The move's newest entry is the one under the project it left
+        compact_change_log()
+        self.assertEqual(self.client.get(f'/api/projects/{project.pk}/statistics/').json()['count'], 2)
+        self.assertEqual(self.statistics()['count'], 4)
+
+    def test_statistics_without_expenses(self):
+        project = Project.objects.create(name='Empty')
+        response = self.client.get(f'/api/projects/{project.pk}/statistics/')
+        self.assertEqual(response.json()['count'], 0)
+
+
+@skipUnless(importlib.util.find_spec('pyarrow'), "pyarrow is not installed")
+class ColumnarExportTests(APITestCase):
+    """
+    Tests for the Arrow IPC and Parquet exports.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.project = Project.objects.create(name='Website')
+        self.other = Project.objects.create(name='Office')
+        for project in (self.project, self.other):
+            for i in range(5):
+                Expense.objects.create(project=project, amount=Decimal('1.25') * (i + 1),
+                                       description=f'Item {i}', date=date(2025, 1, i + 1))
+
+    def read(self, response, export_format):
+        import pyarrow.ipc
+        import pyarrow.parquet
+
+        content = b''.join(response.streaming_content)
+        if export_format == 'arrow':
+            return pyarrow.ipc.open_stream(content).read_all()
+        return pyarrow.parquet.read_table(io.BytesIO(content))
+
+    def test_expense_export(self):
+        for export_format in ('arrow', 'parquet'):
+            response = self.client.get(f'/api/export/expenses/?format={export_format}')
+            self.assertEqual(response.status_code, 200)
+            table = self.read(response, export_format)
+            self.assertEqual(table.num_rows, 10)
+            self.assertEqual(sum(table.column('amount').to_pylist()), Decimal('37.50'))
+
+        table = self.read(self.client.get(f'/api/export/expenses/?project={self.other.pk}'), 'arrow')
+        self.assertEqual(str(table.schema.field('project_id').type),
+                         'dictionary<values=int64, indices=int32, ordered=0>')
+        self.assertEqual(set(table.column('project_id').to_pylist()), {self.other.pk})
+
+    def test_project_export_and_invalid_format(self):
+        table = self.read(self.client.get('/api/export/projects/'), 'arrow')
+        self.assertEqual(table.num_rows, 2)
+        self.assertEqual(self.client.get('/api/export/projects/?format=csv').status_code, 400)
+
+
+class SparseFieldsTests(APITestCase):
+    """
+    Tests for ?fields= and ?exclude= on list and detail responses.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.projects = [Project.objects.create(name=f'Project {i}') for i in range(5)]
+        for project in self.projects:
+            for i in range(3):
+                Expense.objects.create(project=project, amount=Decimal('2.00'),
+                                       description=f'Item {i}', date=date(2025, 1, i + 1))
+
+    def test_unrequested_totals_are_not_queried(self):
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/projects/?fields=id,name')
+        self.assertEqual(response.json()['results'][0], {'id': self.projects[-1].pk, 'name': 'Project 4'})
+
+        # Totals are annotated in the list query instead of two queries per project
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/projects/?exclude=description')
+        result = response.json()['results'][0]
+        self.assertNotIn('description', result)
+        self.assertEqual((result['total_expenses'], result['expense_count']), (6, 3))
+
+    def test_detail_without_expenses(self):
+        project = self.projects[0]
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/projects/{project.pk}/?exclude=expenses,total_expenses,expense_count')
+        self.assertEqual(set(response.json()), {'id', 'name', 'description', 'budget', 'created_at'})
+
+        response = self.client.get(f'/api/projects/{project.pk}/?fields=expenses')
+        # Nested expenses keep all their fields
+        self.assertEqual(len(response.json()['expenses'][0]), 7)
+
+    def test_expense_fields(self):
+        response = self.client.get(f'/api/expenses/?project={self.projects[0].pk}&fields=id,amount')
+        self.assertEqual(set(response.json()['results'][0]), {'id', 'amount'})
+        response = self.client.get('/api/expenses/?fields=id,colour')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('colour', response.json()['fields'])
+
+
+class BatchTests(APITestCase):
+    """
+    Tests for POST /api/batch/.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.project = Project.objects.create(name='Website')
+
+    def batch(self, requests):
+        return self.client.post('/api/batch/', {'requests': requests}, format='json')
+
+    def test_subrequests_run_in_order(self):
+        response = self.batch([
+            {'url': f'/api/projects/{self.project.pk}/?fields=name'},
+            {'method': 'POST', 'url': '/api/expenses/', 'body': {
+                'project': self.project.pk, 'amount': '12.50',
+                'description': 'Hosting', 'date': '2025-01-01'}},
+            {'url': f'/api/expenses/?project={self.project.pk}&fields=description'},
+            {'url': '/api/projects/999999/'},
+            {'url': '/api/unknown/'},
+        ])
+        self.assertEqual(response.status_code, 200)
+        responses = response.json()['responses']
+        self.assertEqual([item['status'] for item in responses], [200, 201, 200, 404, 404])
+        self.assertEqual(responses[0]['body'], {'name': 'Website'})
+        self.assertEqual(responses[2]['body']['results'], [{'description': 'Hosting'}])
+
+    def test_statement_is_reported_without_body(self):
+        response = self.batch([{'url': f'/api/projects/{self.project.pk}/statement/'}])
+        statement = response.json()['responses'][0]
+        self.assertEqual(statement['status'], 200)
+        self.assertEqual(statement['headers']['Content-Type'], 'application/pdf')
+        self.assertIsNone(statement['body'])
+
+    def test_invalid_batches_are_rejected(self):
+        self.assertEqual(self.batch([]).status_code, 400)
+        self.assertEqual(self.batch([{'url': '/api/batch/'}]).status_code, 400)
+        self.assertEqual(self.batch([{'url': 'http://example.com/'}]).status_code, 400)
+        self.assertEqual(self.batch([{'url': '/api/projects/'}] * 21).status_code, 400)
+
+
+class MoneyStorageTests(APITestCase):
+    """
+    Tests for amounts stored as integer cents.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.project = Project.objects.create(name='Website')
+
+    def test_amounts_are_stored_as_cents_and_read_as_decimals(self):
+        response = self.client.post('/api/expenses/', {
+            'project': self.project.pk, 'amount': '12.50',
+            'description': 'Hosting', 'date': '2025-01-01'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['amount'], '12.50')
+
+        raw = Expense.objects.values_list(cents('amount'), flat=True).get()
+        self.assertEqual(raw, 1250)
+        expense = Expense.objects.get()
+        self.assertEqual(expense.amount, Decimal('12.50'))
+        self.assertTrue(Expense.objects.filter(amount__gt=Decimal('12.49')).exists())
+
+        response = self.client.post('/api/expenses/', {
+            'project': self.project.pk, 'amount': '0.00',
+            'description': 'Nothing', 'date': '2025-01-01'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_totals_are_exact(self):
+        Expense.objects.bulk_create([
+            Expense(project=self.project, amount=Decimal('0.10'), description='Stamp',
+                    date=date(2025, 1, 1))
+            for _ in range(1000)
+        ])
+        self.assertEqual(self.project.total_expenses, Decimal('100.00'))
+        response = self.client.get('/api/projects/')
+        self.assertEqual(response.json()['results'][0]['total_expenses'], 100.0)
+
+
+class ArchiveTests(APITestCase):
+    """
+    Tests for archiving old expenses and reading them back.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.project = Project.objects.create(name='Website')
+        self.expenses = [
+            Expense.objects.create(project=self.project, amount=Decimal(amount), description=f'Item {i}',
+                                   date=day)
+            for i, (amount, day) in enumerate([
+                ('10.00', date(2023, 3, 1)), ('20.00', date(2023, 11, 5)), ('30.00', date(2024, 6, 1)),
+                ('40.00', date(2025, 2, 1)), ('50.00', date(2025, 8, 1)),
+            ])
+        ]
+        take_balance_snapshots(self.project)
+        self.archived = archive_expenses(before=date(2025, 1, 1), batch_size=2, pause=0)
+
+    def test_old_expenses_are_moved_and_totals_are_unchanged(self):
+        self.assertEqual(self.archived, 3)
+        self.assertEqual(Expense.objects.count(), 2)
+        summary = self.project.archive_summary
+        self.assertEqual((summary.total, summary.expense_count), (Decimal('60.00'), 3))
+        self.assertEqual((summary.first_date, summary.last_date), (date(2023, 3, 1), date(2024, 6, 1)))
+
+        project = self.client.get(f'/api/projects/{self.project.pk}/?exclude=expenses').json()
+        self.assertEqual((project['total_expenses'], project['expense_count']), (150.0, 5))
+        listed = self.client.get('/api/projects/').json()['results'][0]
+        self.assertEqual((listed['total_expenses'], listed['expense_count']), (150.0, 5))
+        self.assertEqual(self.client.get(f'/api/projects/{self.project.pk}/statistics/').json()['count'], 5)
+
+    def test_reads_only_reach_the_archive_when_the_range_does(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/api/expenses/?project={self.project.pk}&date_from=2025-01-01')
+        self.assertEqual(response.json()['count'], 2)
+        self.assertFalse(any('projects_archivedexpense' in query['sql'] for query in queries))
+
+        response = self.client.get(f'/api/expenses/?project={self.project.pk}&fields=amount')
+        self.assertEqual([e['amount'] for e in response.json()['results']],
+                         ['50.00', '40.00', '30.00', '20.00', '10.00'])
+        response = self.client.get('/api/expenses/?date_to=2023-12-31')
+        self.assertEqual(response.json()['count'], 2)
+
+        archived = self.expenses[0]
+        self.assertEqual(self.client.get(f'/api/expenses/{archived.pk}/').json()['amount'], '10.00')
+        self.assertEqual(self.client.delete(f'/api/expenses/{archived.pk}/').status_code, 404)
+
+    def test_project_detail_lists_archived_expenses(self):
+        project = self.client.get(f'/api/projects/{self.project.pk}/').json()
+        self.assertEqual(len(project['expenses']), project['expense_count'])
+        self.assertEqual([e['amount'] for e in project['expenses']],
+                         ['50.00', '40.00', '30.00', '20.00', '10.00'])
+
+    @skipUnless(importlib.util.find_spec('pyarrow'), "pyarrow is not installed")
+    def test_export_includes_archived_expenses(self):
+        import pyarrow.ipc
+
+        expense_count = self.client.get(f'/api/projects/{self.project.pk}/').json()['expense_count']
+        for url in (f'/api/export/expenses/?project={self.project.pk}', '/api/export/expenses/'):
+            response = self.client.get(url)
+            table = pyarrow.ipc.open_stream(b''.join(response.streaming_content)).read_all()
+            self.assertEqual(table.num_rows, expense_count)
+            self.assertEqual(sum(table.column('amount').to_pylist()), Decimal('150.00'))
+
+    def test_balances_and_statements_include_archived_expenses(self):
+        self.assertEqual(get_balance(self.project, date(2023, 12, 31))['total_expenses'], Decimal('30.00'))
+        self.assertEqual(get_balance(self.project, date(2026, 1, 1))['total_expenses'], Decimal('150.00'))
+        ProjectBalanceSnapshot.objects.all().delete()
+        self.assertEqual(get_balance(self.project, date(2024, 12, 31))['expense_count'], 3)
+        self.assertEqual(take_balance_snapshots(self.project), 5)
+        self.assertEqual(get_balance(self.project, date(2025, 3, 1))['total_expenses'], Decimal('100.00'))
+
+        series = get_cumulative_series(self.project, date(2023, 6, 1), interval='month')
+        self.assertEqual([item['cumulative'] for item in series],
+                         [Decimal('30.00'), Decimal('60.00'), Decimal('100.00'), Decimal('150.00')])
+
+        response = self.client.get(f'/api/projects/{self.project.pk}/statement/?format=excel')
+        sheet = load_workbook(io.BytesIO(response.content)).active
+        self.assertEqual([sheet[f'C{row}'].value for row in range(12, 17)], [50, 40, 30, 20, 10])
+
+    def test_deleting_a_project_deletes_archived_expenses(self):
+        self.project.deletion_requested_at = date(2026, 1, 1)
+        self.project.save()
+        self.assertEqual(delete_project_in_batches(self.project.pk, batch_size=2, pause=0), 5)
+        self.assertFalse(ArchivedExpense.objects.exists())
+
+
+class ThrottlingTests(APITestCase):
+    """
+    Tests for token-bucket throttling and load shedding.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.project = Project.objects.create(name='Website')
+
+    def test_token_bucket_refills(self):
+        state = shared_state()
+        self.assertEqual(state.take('bucket', rate=2, burst=2, now=100), 0)
+        self.assertEqual(state.take('bucket', rate=2, burst=2, now=100), 0)
+        self.assertAlmostEqual(state.take('bucket', rate=2, burst=2, now=100), 0.5)
+        self.assertEqual(state.take('bucket', rate=2, burst=2, now=100.5), 0)
+
+    @override_settings(THROTTLE_BUCKETS={
+        'read': {'rate': 0.01, 'burst': 2},
+        'write': {'rate': 0.01, 'burst': 1},
+        'statement': {'rate': 0.01, 'burst': 1},
+    })
+    def test_endpoint_classes_have_separate_buckets(self):
+        for _ in range(2):
+            self.assertEqual(self.client.get('/api/projects/').status_code, 200)
+        response = self.client.get('/api/projects/')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+
+        self.assertEqual(self.client.post('/api/projects/', {'name': 'Office'}).status_code, 201)
+        self.assertEqual(self.client.post('/api/projects/', {'name': 'Shop'}).status_code, 429)
+
+        statement = f'/api/projects/{self.project.pk}/statement/'
+        self.assertEqual(self.client.get(statement).status_code, 200)
+        self.assertEqual(self.client.get(statement).status_code, 429)
+
+        # Buckets are per client
+        other = APIClient(REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(other.get('/api/projects/').status_code, 200)
+
+    @override_settings(THROTTLE_MAX_RENDERS=1, THROTTLE_MAX_IN_FLIGHT=2)
+    def test_load_is_shed_when_renders_or_workers_are_busy(self):
+        self.client = APIClient(REMOTE_ADDR='10.0.0.3')
+        statement = f'/api/projects/{self.project.pk}/statement/'
+        in_flight.enter(RENDER, {})
+        response = self.client.get(statement)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '5')
+        in_flight.leave(RENDER)
+        self.assertEqual(self.client.get(statement).status_code, 200)
+
+        for _ in range(2):
+            in_flight.enter(REQUEST, {})
+        response = self.client.get('/api/projects/')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '5')
+        in_flight.leave(REQUEST)
+        self.assertEqual(self.client.get('/api/projects/').status_code, 200)
+        in_flight.leave(REQUEST)
+        self.assertEqual(in_flight.counts, {REQUEST: 0, RENDER: 0})
+
+    @override_settings(THROTTLE_BUCKETS={'read': {'rate': 1, 'burst': 10}}, THROTTLE_MAX_IN_FLIGHT=2)
+    def test_request_makes_one_write_to_the_shared_state(self):
+        self.client = APIClient(REMOTE_ADDR='10.0.0.6')
+        state = shared_state()
+        connection = state._connection()
+        statements = []
+        connection.set_trace_callback(statements.append)
+        self.addCleanup(connection.set_trace_callback, None)
+        self.assertEqual(self.client.get('/api/projects/').status_code, 200)
+        self.assertEqual(statements.count('BEGIN IMMEDIATE'), 1)
+
+    @override_settings(THROTTLE_MAX_IN_FLIGHT=1)
+    def test_streamed_response_holds_its_slot_until_closed(self):
+        self.client = APIClient(REMOTE_ADDR='10.0.0.4')
+        Expense.objects.create(project=self.project, amount=Decimal('5.00'), description='Domain')
+        budget = get_statement_renderer('pdf').required_memory(1, streaming=True)
+        with override_settings(STATEMENT_MEMORY_BUDGET=budget):
+            response = self.client.get(f'/api/projects/{self.project.pk}/statement/?format=pdf')
+        self.assertTrue(response.streaming)
+        self.assertEqual(self.client.get('/api/projects/').status_code, 429)
+        response.close()
+        self.assertEqual(self.client.get('/api/projects/').status_code, 200)
+
+    @override_settings(THROTTLE_BUCKETS={
+        'read': {'rate': 0.01, 'burst': 2},
+        'write': {'rate': 0.01, 'burst': 1},
+    })
+    def test_batch_subrequests_are_throttled(self):
+        self.client = APIClient(REMOTE_ADDR='10.0.0.5')
+        reads = [{'method': 'GET', 'url': '/api/projects/'}] * 3
+        writes = [{'method': 'POST', 'url': '/api/projects/', 'body': {'name': 'Office'}}] * 2
+        response = self.client.post('/api/batch/', {'requests': reads + writes}, format='json')
+        self.assertEqual([item['status'] for item in response.json()['responses']],
+                         [200, 200, 429, 201, 429])
+
+    @override_settings(THROTTLE_MAX_IN_FLIGHT=2, BATCH_READ_WORKERS=2)
+    def test_parallel_batch_subrequests_are_shed_when_workers_are_busy(self):
+        self.client = APIClient(REMOTE_ADDR='10.0.0.7')
+        in_flight.enter(REQUEST, {})
+        reads = [{'method': 'GET', 'url': f'/api/projects/{self.project.pk}/balance/'}] * 2
+        response = self.client.post('/api/batch/', {'requests': reads}, format='json')
+        self.assertEqual([item['status'] for item in response.json()['responses']], [429, 429])
+        self.assertEqual(response.json()['responses'][0]['headers']['Retry-After'], '5')
+
+        # The shed sub-requests gave their slots back
+        in_flight.leave(REQUEST)
+        self.assertEqual(in_flight.counts[REQUEST], 0)
+        self.assertEqual(self.client.get('/api/projects/').status_code, 200)
+
+
+class CompressionTests(APITestCase):
+    """
+    Tests for API response compression and serving the built frontend.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.project = Project.objects.create(name='Website')
+        Expense.objects.bulk_create([
+            Expense(project=self.project, amount=Decimal('12.50'),
+                    description=f'Expense {i}', date=date(2026, 1, 1))
+            for i in range(50)
+        ])
+
+    def test_large_json_is_compressed(self):
+        url = f'/api/expenses/?project={self.project.pk}'
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(len(json.loads(gzip.decompress(response.content))['results']), 50)
+
+        self.assertFalse(self.client.get(url).has_header('Content-Encoding'))
+
+    def test_small_and_binary_responses_are_not_compressed(self):
+        response = self.client.get(f'/api/projects/{self.project.pk}/balance/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+        response = self.client.get(f'/api/projects/{self.project.pk}/statement/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_frontend_index_is_served_for_client_routes(self):
+        with tempfile.TemporaryDirectory() as dist:
+            dist = Path(dist)
+            self.assertEqual(self.client.get('/projects/1').status_code, 404)
+            (dist / 'index.html').write_text('<div id="root"></div>')
+            with override_settings(FRONTEND_DIST=dist):
+                response = self.client.get('/projects/1')
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('no-cache', response['Cache-Control'])
+                self.assertEqual(b''.join(response.streaming_content), b'<div id="root"></div>')
+                # API routes are never answered with the frontend
+                self.assertEqual(self.client.get('/api/missing/').status_code, 404)
+
+    @skipUnless(importlib.util.find_spec('brotli'), "brotli is not installed")
+    def test_brotli_is_preferred_when_accepted(self):
+        import brotli
+
+        url = f'/api/expenses/?project={self.project.pk}'
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(len(json.loads(brotli.decompress(response.content))['results']), 50)
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+    @skipUnless(importlib.util.find_spec('brotli'), "brotli is not installed")
+    def test_collectstatic_precompresses_the_frontend(self):
+        import brotli
+
+        script = 'export const rows = [' + ', '.join(f'"row {i}"' for i in range(500)) + '];'
+        with tempfile.TemporaryDirectory() as dist, tempfile.TemporaryDirectory() as static_root:
+            dist = Path(dist)
+            (dist / 'assets').mkdir()
+            (dist / 'assets' / 'index-BZ3v1pXk.js').write_text(script)
+            (dist / 'assets' / 'logo.png').write_bytes(b'\x89PNG' * 100)
+            storages = {**settings.STORAGES, 'staticfiles': {
+                'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+            }}
+            with override_settings(FRONTEND_DIST=dist, WHITENOISE_ROOT=dist,
+                                   STATIC_ROOT=static_root, STORAGES=storages):
+                call_command('collectstatic', interactive=False, verbosity=0)
+                self.assertEqual(sorted(path.name for path in (dist / 'assets').iterdir()), [
+                    'index-BZ3v1pXk.js', 'index-BZ3v1pXk.js.br', 'index-BZ3v1pXk.js.gz', 'logo.png',
+                ])
+
+                middleware = FrontendWhiteNoiseMiddleware(lambda request: None)
+                request = RequestFactory().get('/assets/index-BZ3v1pXk.js',
+                                               HTTP_ACCEPT_ENCODING='gzip, br')
+                response = middleware(request)
+                self.assertEqual(response['Content-Encoding'], 'br')
+                self.assertEqual(brotli.decompress(b''.join(response.streaming_content)).decode(), script)
+                response.close()
+
+    def test_hashed_assets_are_immutable(self):
+        middleware = FrontendWhiteNoiseMiddleware(lambda request: None)
+        self.assertTrue(middleware.immutable_file_test('', '/assets/index-BZ3v1pXk.js'))
+        self.assertFalse(middleware.immutable_file_test('', '/assets/logo.svg'))
+        self.assertFalse(middleware.immutable_file_test('', '/favicon.ico'))
+
+
+class BudgetTests(APITestCase):
+    """
+    Tests for budgets, categories and the spend counters behind them.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.project = Project.objects.create(name='Website', budget=Decimal('100.00'))
+        self.other = Project.objects.create(name='Office')
+
+    def add(self, project, amount, category, day=1):
+        response = self.client.post('/api/expenses/', {
+            'project': project.pk, 'amount': amount, 'description': 'Item',
+            'category': category, 'date': f'2026-01-{day:02d}',
+        })
+        self.assertEqual(response.status_code, 201)
+        return response.json()['id']
+
+    def counters(self):
+        return (
+            sorted(ProjectSpend.objects.filter(expense_count__gt=0).values_list('project_id', 'total', 'expense_count')),
+            sorted(CategorySpend.objects.filter(expense_count__gt=0).values_list('project_id', 'category', 'total', 'expense_count')),
+        )
+
+    def assertCountersConsistent(self):
+        counters = self.counters()
+        rebuild_spend_counters()
+        self.assertEqual(counters, self.counters())
+
+    def test_counters_follow_single_writes(self):
+        hosting = self.add(self.project, '40.00', 'hosting')
+        design = self.add(self.project, '30.00', 'design')
+        self.add(self.project, '20.00', 'hosting')
+
+        self.client.patch(f'/api/expenses/{design}/', {'amount': '35.00', 'category': 'hosting'})
+        self.client.patch(f'/api/expenses/{hosting}/', {'project': self.other.pk})
+        self.client.delete(f'/api/expenses/{design}/')
+        self.assertCountersConsistent()
+
+        response = self.client.get(f'/api/projects/{self.project.pk}/budget/')
+        self.assertEqual(response.json(), {
+            'project': self.project.pk, 'budget': 100.0, 'spent': 20.0, 'remaining': 80.0,
+            'utilization': 20.0, 'over_budget': False, 'expense_count': 1,
+            'categories': [{'category': 'hosting', 'spent': 20.0, 'expense_count': 1, 'share': 100.0}],
+        })
+
+    def test_counters_follow_deferred_and_unloaded_saves_without_recounting(self):
+        hosting = self.add(self.project, '40.00', 'hosting')
+        design = self.add(self.project, '30.00', 'design')
+
+        with CaptureQueriesContext(connection) as queries:
+            expense = Expense.objects.only('description').get(pk=hosting)
+            expense.description = 'Servers'
+            expense.save()
+            expense = Expense.objects.only('amount').get(pk=hosting)
+            expense.amount = Decimal('45.00')
+            expense.save()
+            Expense(pk=design, project=self.other, amount=Decimal('10.00'), description='Logo',
+                    category='design', created_at=timezone.now()).save()
+            Expense.objects.defer('amount', 'category').get(pk=hosting).delete()
+        self.assertFalse(any('DELETE FROM "projects_projectspend"' in query['sql'] for query in queries))
+        self.assertEqual(self.counters(), (
+            [(self.other.pk, Decimal('10.00'), 1)],
+            [(self.other.pk, 'design', Decimal('10.00'), 1)],
+        ))
+        self.assertCountersConsistent()
+
+    def test_counters_follow_bulk_writes_and_archival(self):
+        for day in range(1, 6):
+            self.add(self.project, '10.00', 'hosting', day)
+        self.client.post('/api/expenses/bulk-update/', {
+            'filter': {'project': self.project.pk, 'date_to': '2026-01-02'},
+            'changes': {'category': 'design', 'amount': '15.00'},
+        }, format='json')
+        self.client.post('/api/expenses/bulk-delete/', {'filter': {'category': 'hosting'}}, format='json')
+        self.assertCountersConsistent()
+        archive_expenses(before=date(2026, 1, 2))
+        self.assertCountersConsistent()
+
+        budget = self.client.get(f'/api/projects/{self.project.pk}/budget/').json()
+        self.assertEqual((budget['spent'], budget['expense_count']), (30.0, 2))
+
+    def test_budget_is_read_from_counters(self):
+        self.add(self.project, '60.00', 'hosting')
+        with self.assertNumQueries(3):
+            self.client.get(f'/api/projects/{self.project.pk}/budget/')
+
+        self.assertEqual(self.client.get('/api/projects/over-budget/').json()['count'], 0)
+        self.add(self.project, '50.00', 'design')
+        small = Project.objects.create(name='Shop', budget=Decimal('5.00'))
+        self.add(small, '6.00', 'design')
+        results = self.client.get('/api/projects/over-budget/').json()['results']
+        self.assertEqual([(p['id'], p['remaining']) for p in results], [(self.project.pk, -10.0), (small.pk, -1.0)])
+
+    def test_category_filter(self):
+        self.add(self.project, '10.00', 'hosting')
+        self.add(self.project, '20.00', 'design')
+        response = self.client.get(f'/api/expenses/?project={self.project.pk}&category=design')
+        self.assertEqual([e['amount'] for e in response.json()['results']], ['20.00'])
+
+
+@override_settings(THROTTLE_BUCKETS={})
+class IdempotencyTests(APITestCase):
+    """
+    Tests for Idempotency-Key support on write endpoints.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.project = Project.objects.create(name='Website')
+        self.expense = {'project': self.project.pk, 'amount': '12.50', 'description': 'Hosting',
+                        'date': '2026-01-01'}
+
+    def post(self, url, data, key):
+        return self.client.post(url, data, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retried_create_replays_the_stored_response(self):
+        first = self.post('/api/expenses/', self.expense, 'card-feed-1')
+        self.assertEqual(first.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', first)
+
+        with CaptureQueriesContext(connection) as queries:
+            retry = self.post('/api/expenses/', self.expense, 'card-feed-1')
+        self.assertEqual((retry.status_code, retry.json()), (201, first.json()))
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Expense.objects.count(), 1)
+        self.assertFalse(any('projects_expense' in query['sql'] for query in queries))
+
+        other = self.post('/api/expenses/', self.expense, 'card-feed-2')
+        self.assertEqual(other.status_code, 201)
+        self.assertEqual(Expense.objects.count(), 2)
+
+    def test_key_reused_for_another_request_is_refused(self):
+        self.post('/api/expenses/', self.expense, 'key')
+        response = self.post('/api/expenses/', {**self.expense, 'amount': '13.00'}, 'key')
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(self.post('/api/expenses/', self.expense, '').status_code, 400)
+
+    def test_keys_are_scoped_to_client_and_endpoint(self):
+        expense = self.post('/api/expenses/', self.expense, 'key')
+        project = self.post('/api/projects/', {'name': 'Office'}, 'key')
+        self.assertEqual((expense.status_code, project.status_code), (201, 201))
+        self.assertNotIn('Idempotent-Replayed', project)
+        self.assertEqual(Project.objects.filter(name='Office').count(), 1)
+
+        other = self.post('/api/expenses/', self.expense, 'other')
+        for expense_id in (expense.json()['id'], other.json()['id']):
+            response = self.client.patch(f'/api/expenses/{expense_id}/', {'amount': '20.00'},
+                                         format='json', HTTP_IDEMPOTENCY_KEY='update')
+            self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(Expense.objects.filter(amount=Decimal('20.00')).count(), 2)
+
+        other_client = APIClient(REMOTE_ADDR='10.0.0.9')
+        response = other_client.post('/api/expenses/', self.expense, format='json',
+                                     HTTP_IDEMPOTENCY_KEY='key')
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(Expense.objects.count(), 3)
+        self.assertEqual(self.post('/api/expenses/', self.expense, 'key').json(), expense.json())
+
+    def test_failed_requests_release_their_key(self):
+        response = self.post('/api/expenses/', {**self.expense, 'amount': '-1'}, 'key')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertEqual(self.post('/api/expenses/', self.expense, 'key').status_code, 201)
+
+    def test_updates_and_bulk_writes_are_replayed(self):
+        expense_id = self.post('/api/expenses/', self.expense, 'create').json()['id']
+        for _ in range(2):
+            response = self.client.patch(f'/api/expenses/{expense_id}/', {'amount': '20.00'},
+                                         format='json', HTTP_IDEMPOTENCY_KEY='update')
+            self.assertEqual(response.json()['amount'], '20.00')
+
+        bulk = {'filter': {'project': self.project.pk}, 'changes': {'category': 'hosting'}}
+        self.assertEqual(self.post('/api/expenses/bulk-update/', bulk, 'bulk').json(), {'updated': 1})
+        Expense.objects.create(project=self.project, amount=Decimal('1.00'), description='Later')
+        response = self.post('/api/expenses/bulk-update/', bulk, 'bulk')
+        self.assertEqual(response.json(), {'updated': 1})
+        self.assertEqual(Expense.objects.filter(category='hosting').count(), 1)
+
+        project = self.post('/api/projects/', {'name': 'Office'}, 'project')
+        self.assertEqual(self.post('/api/projects/', {'name': 'Office'}, 'project').json(), project.json())
+        self.assertEqual(Project.objects.filter(name='Office').count(), 1)
+
+    def test_running_duplicates_wait_then_conflict_and_keys_expire(self):
+        self.post('/api/expenses/', self.expense, 'key')
+        IdempotencyKey.objects.update(status_code=None)
+        with override_settings(IDEMPOTENCY_WAIT_TIMEOUT=0):
+            response = self.post('/api/expenses/', self.expense, 'key')
+        self.assertEqual(response.status_code, 409)
+
+        # A request left running past the lock timeout no longer holds the key
+        IdempotencyKey.objects.update(created_at=timezone.now() - timedelta(minutes=5))
+        response = self.post('/api/expenses/', self.expense, 'key')
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', response)
+
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(expire_idempotency_keys(), 1)
+        self.assertEqual(self.post('/api/expenses/', self.expense, 'key').status_code, 201)
+        self.assertEqual(Expense.objects.count(), 3)
+
+
+@override_settings(
+    THROTTLE_STATE_PATH=':memory:', THROTTLE_BUCKETS={},
+    EXPENSE_SHARDS=['default', 'shard_1', 'shard_2'], SHARD_OUTBOX_IN_BACKGROUND=False
+)
+class ShardingTests(TransactionTestCase):
+    """
+    Tests for expenses sharded across databases by project.
+
+    Data is committed, so the threads fanning reads out over the shards see it.
+    """
+
+    databases = {'default', 'shard_1', 'shard_2'}
+
+    def setUp(self):
+        self.client = APIClient()
+        # One project on every shard
+        self.projects = {}
+        while len(self.projects) < 3:
+            project = Project.objects.create(name=f'Project {Project.objects.count()}')
+            self.projects.setdefault(project.shard, project)
+
+    def add(self, shard, amount, day, category=''):
+        response = self.client.post('/api/expenses/', {
+            'project': self.projects[shard].pk, 'amount': amount, 'description': f'Item {day}',
+            'category': category, 'date': f'2026-01-{day:02d}',
+        })
+        self.assertEqual(response.status_code, 201)
+        return response.json()['id']
+
+    def rows(self, shard):
+        return sorted(Expense.objects.using(shard).values_list('pk', 'project_id', 'amount'))
+
+    def test_expenses_are_written_to_their_projects_shard(self):
+        for shard, project in self.projects.items():
+            self.assertEqual(project.shard, placement(project.pk))
+            self.assertEqual(Project.objects.get(pk=project.pk).shard, shard)
+            expense_id = self.add(shard, '5.00', 1)
+            self.assertEqual(self.rows(shard), [(expense_id, project.pk, Decimal('5.00'))])
+            self.assertEqual(expense_id >> SHARD_ID_BITS, id_range_start(shard) >> SHARD_ID_BITS)
+            self.assertEqual(project.expense_count, 1)
+
+        self.assertEqual(ProjectSpend.objects.count(), 3)
+        self.assertEqual(len(self.client.get('/api/changes/?since=0').json()['expenses']['upserted']), 3)
+        self.assertEqual(ShardRouter().db_for_read(Project), 'default')
+        self.assertFalse(ShardRouter().allow_migrate('shard_1', 'projects', 'project'))
+
+    def test_listings_fan_out_and_merge(self):
+        for day, shard in enumerate(['shard_2', 'default', 'shard_1', 'shard_2', 'default'], 1):
+            self.add(shard, f'{day}.00', day)
+
+        response = self.client.get('/api/expenses/?fields=amount,date').json()
+        self.assertEqual(response['count'], 5)
+        self.assertEqual([e['amount'] for e in response['results']], ['5.00', '4.00', '3.00', '2.00', '1.00'])
+        response = self.client.get(f'/api/expenses/?project={self.projects["shard_2"].pk}').json()
+        self.assertEqual([e['amount'] for e in response['results']], ['4.00', '1.00'])
+
+        listed = {p['id']: p for p in self.client.get('/api/projects/').json()['results']}
+        self.assertEqual(listed[self.projects['shard_2'].pk]['total_expenses'], 5.0)
+        self.assertEqual(listed[self.projects['default'].pk]['expense_count'], 2)
+        detail = self.client.get(f'/api/projects/{self.projects["shard_2"].pk}/').json()
+        self.assertEqual([e['amount'] for e in detail['expenses']], ['4.00', '1.00'])
+
+        response = self.client.get(f'/api/projects/{self.projects["shard_1"].pk}/statement/?format=csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('3.00', response.content.decode())
+
+    def test_expenses_follow_their_project_to_another_shard(self):
+        expense_id = self.add('shard_1', '10.00', 1, 'hosting')
+        other = self.add('shard_1', '20.00', 2, 'hosting')
+        self.assertEqual(self.client.get(f'/api/expenses/{expense_id}/').json()['amount'], '10.00')
+
+        response = self.client.patch(f'/api/expenses/{expense_id}/', {'project': self.projects['shard_2'].pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row[0] for row in self.rows('shard_2')], [expense_id])
+        self.client.post('/api/expenses/bulk-update/', {
+            'ids': [other], 'changes': {'project': self.projects['default'].pk},
+        }, format='json')
+        self.assertEqual(self.rows('shard_1'), [])
+        self.assertEqual(self.projects['default'].total_expenses, Decimal('20.00'))
+
+        counters = ProjectSpend.objects.filter(expense_count__gt=0).order_by('project_id')
+        before = list(counters.values_list('project_id', 'total', 'expense_count'))
+        rebuild_spend_counters()
+        self.assertEqual(before, list(counters.values_list('project_id', 'total', 'expense_count')))
+
+        self.assertEqual(self.client.delete(f'/api/expenses/{expense_id}/').status_code, 204)
+        self.assertEqual(self.client.get(f'/api/expenses/{expense_id}/').status_code, 404)
+
+    def test_rebalance_moves_projects_off_a_removed_shard(self):
+        for day, shard in enumerate(['default', 'shard_1', 'shard_2', 'shard_2'], 1):
+            self.add(shard, '1.00', day)
+        moved = self.projects['shard_2']
+        before = self.rows('shard_2')
+        archive_expenses(before=date(2026, 1, 4), pause=0)
+
+        output = io.StringIO()
+        call_command('rebalance_shards', shards=['default', 'shard_1'], dry_run=True, stdout=output)
+        on_shard_2 = Project.objects.filter(shard='shard_2').count()
+        self.assertIn(f'{on_shard_2} projects would move', output.getvalue())
+        call_command('rebalance_shards', shards=['default', 'shard_1'], stdout=io.StringIO())
+
+        moved.refresh_from_db()
+        self.assertIn(moved.shard, ['default', 'shard_1'])
+        self.assertEqual(self.projects['default'].shard, 'default')
+        self.assertEqual(self.rows('shard_2'), [])
+        self.assertFalse(ArchivedExpense.objects.using('shard_2').exists())
+        self.assertEqual([row for row in self.rows(moved.shard) if row[1] == moved.pk], before[1:])
+        self.assertEqual((moved.total_expenses, moved.expense_count), (Decimal('2.00'), 2))
+
+    def test_pending_projects_are_hidden_then_deleted_on_their_shard(self):
+        self.add('shard_1', '1.00', 1)
+        self.add('default', '1.00', 1)
+        project = self.projects['shard_1']
+        Project.objects.filter(pk=project.pk).update(deletion_requested_at=timezone.now())
+        self.assertEqual(self.client.get('/api/expenses/').json()['count'], 1)
+
+        self.assertEqual(delete_project_in_batches(project.pk, pause=0), 1)
+        self.assertEqual(self.rows('shard_1'), [])
+
+    def outbox(self, shard):
+        return ShardOutboxEntry.objects.using(shard)
+
+    def test_bookkeeping_is_queued_in_the_writes_transaction(self):
+        project = self.projects['shard_1']
+        with self.assertRaises(RuntimeError), transaction.atomic(using='shard_1'):
+            Expense.objects.create(project=project, amount=Decimal('5.00'), description='Lunch', date=date(2026, 1, 1))
+            self.assertTrue(self.outbox('shard_1').exists())
+            self.assertFalse(ChangeLog.objects.filter(model=ChangeLog.EXPENSE).exists())
+            raise RuntimeError
+        self.assertFalse(self.outbox('shard_1').exists())
+
+        self.add('shard_1', '5.00', 1, 'hosting')
+        self.assertFalse(self.outbox('shard_1').exists())
+        self.assertEqual(ChangeLog.objects.filter(model=ChangeLog.EXPENSE).count(), 1)
+        self.assertEqual(CategorySpend.objects.get(project=project, category='hosting').total, Decimal('5.00'))
+
+    def test_outbox_left_by_a_failure_is_applied_later(self):
+        def fail(payloads):
+            raise OperationalError('database is locked')
+
+        project = self.projects['shard_2']
+        with patch.dict(_handlers, {ShardOutboxEntry.SPEND: fail}), \
+                self.assertLogs('django.db.backends.base', 'ERROR'):
+            self.add('shard_2', '5.00', 1)
+        self.assertEqual(self.outbox('shard_2').count(), 3)
+        self.assertFalse(ChangeLog.objects.filter(model=ChangeLog.EXPENSE).exists())
+        self.assertFalse(ProjectSpend.objects.filter(project=project).exists())
+
+        output = io.StringIO()
+        call_command('apply_shard_outboxes', stdout=output)
+        self.assertIn('Applied 3 outbox entries', output.getvalue())
+        self.assertFalse(self.outbox('shard_2').exists())
+        self.assertEqual(ChangeLog.objects.filter(model=ChangeLog.EXPENSE).count(), 1)
+        self.assertEqual(ProjectSpend.objects.get(project=project).total, Decimal('5.00'))
+
+    @override_settings(SHARD_OUTBOX_IN_BACKGROUND=True)
+    def test_outbox_is_applied_in_the_background(self):
+        for day in range(1, 4):
+            self.add('shard_2', '5.00', day)
+        outbox_applier('shard_2').join()
+        self.assertFalse(self.outbox('shard_2').exists())
+        self.assertEqual(ProjectSpend.objects.get(project=self.projects['shard_2']).expense_count, 3)
+        self.assertEqual(len(self.client.get('/api/changes/?since=0').json()['expenses']['upserted']), 3)
+
+    # The manifest is only written by collectstatic
+    @override_settings(STORAGES={
+        **settings.STORAGES,
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    })
+    def test_admin_lists_and_edits_expenses_on_their_shard(self):
+        expense_id = self.add('shard_1', '5.00', 1)
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+
+        self.assertNotContains(self.client.get('/admin/projects/expense/'), 'Item 1')
+        self.assertContains(self.client.get('/admin/projects/expense/?shard=shard_1'), 'Item 1')
+        project = self.projects['shard_1']
+        self.assertContains(self.client.get('/admin/projects/expense/', {'shard': 'shard_1', 'q': project.name}), 'Item 1')
+
+        url = f'/admin/projects/expense/{expense_id}/change/'
+        self.assertContains(self.client.get(url), 'Item 1')
+        response = self.client.post(url, {
+            'project': self.projects['shard_2'].pk, 'amount': '6.00', 'description': 'Item 1',
+            'category': '', 'date': '2026-01-01',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.rows('shard_2'), [(expense_id, self.projects['shard_2'].pk, Decimal('6.00'))])
+        self.assertEqual(ProjectSpend.objects.get(project=self.projects['shard_2']).total, Decimal('6.00'))
+
+        self.assertContains(self.client.get(f'/admin/projects/project/{self.projects["shard_2"].pk}/change/'), 'Item 1')
+        self.assertContains(self.client.get('/admin/projects/project/'), '$6.00')
@@ -0,0 +1,79 @@
+"""
+CSV and HTML statements for the expense tracker.
+
+Both are written with the standard library, one expense row at a time,
+to an in-memory buffer or, for projects too large for that, to a file.
+"""
+
+import csv
+import io
+from html import escape
+
+from .renderers import statement_header, statement_rows
+
+
+def _text_writer(file):
+    return io.TextIOWrapper(file, encoding='utf-8', newline='')
+
+
+def write_project_csv(project, file):
+    """
+    Write a project's CSV statement to a binary file: the project details,
+    a blank line, then one line per expense.
+    """
+    text = _text_writer(file)
+    writer = csv.writer(text)
+    writer.writerows(statement_header(project, project.expense_count))
+    writer.writerow([])
+    writer.writerow(['Date', 'Description', 'Amount'])
+    for date, description, amount in statement_rows(project):
+        writer.writerow([date.isoformat(), description, amount])
+    text.flush()
+    text.detach()
+
+
+def write_project_html(project, file):
+    """
+    Write a project's statement as a standalone HTML page to a binary file.
+    """
+    text = _text_writer(file)
+    expense_count = project.expense_count
+    text.write('<!DOCTYPE html>\n<html><head><meta charset="utf-8">\n')
+    text.write(f'<title>{escape(project.name)} statement</title></head><body>\n')
+    text.write('<h1>Expense Statement</h1>\n<table>\n')
+    for label, value in statement_header(project, expense_count):
+        text.write(f'<tr><th>{escape(label)}</th><td>{escape(str(value))}</td></tr>\n')
+    text.write('</table>\n')
+
+    if expense_count:
+        text.write('<h2>Expense Details</h2>\n<table>\n')
+        text.write('<tr><th>Date</th><th>Description</th><th>Amount</th></tr>\n')
+        for date, description, amount in statement_rows(project):
+            text.write(
+                f'<tr><td>{date.isoformat()}</td><td>{escape(description)}</td><td>${amount:.2f}</td></tr>\n'
+            )
+        text.write('</table>\n')
+    else:
+        text.write('<p>No expenses recorded for this project.</p>\n')
+
+    text.write('</body></html>\n')
+    text.flush()
+    text.detach()
+
+
+def render_project_csv(project):
+    """
+    Render a project's CSV statement and return its bytes.
+    """
+    buffer = io.BytesIO()
+    write_project_csv(project, buffer)
+    return buffer.getvalue()
+
+
+def render_project_html(project):
+    """
+    Render a project's HTML statement and return its bytes.
+    """
+    buffer = io.BytesIO()
+    write_project_html(project, buffer)
+    return buffer.getvalue()
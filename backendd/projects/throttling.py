@@ -0,0 +1,294 @@
+"""
+Token-bucket throttling and load shedding.
+
+Every client has one token bucket per endpoint class: cheap reads, writes
+and statement renders, each with its own refill rate and burst size from
+THROTTLE_BUCKETS. Requests take a token from their bucket and are answered
+with 429 and Retry-After once it is empty.
+
+Buckets live in a small SQLite file shared by every worker process on
+the host; a request takes its token in one short BEGIN IMMEDIATE
+transaction, and that is the only write it makes there. In-flight
+requests and statement renders are counted by each worker process in
+memory and measure that worker's saturation: statements are shed first,
+once renders or busy requests pass their thresholds, and every request is
+shed when the worker is full. A request holds its slot until its response
+is closed, so streamed statements and exports count for as long as their
+body is being sent.
+"""
+
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.http import JsonResponse
+from rest_framework.exceptions import Throttled
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import BaseThrottle
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    key TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL
+);
+"""
+
+REQUEST = 'request'
+RENDER = 'render'
+
+# Buckets idle for this long are full again and are pruned
+BUCKET_IDLE_SECONDS = 3600
+PRUNE_EVERY = 1000
+
+
+class SharedState:
+    """
+    Token buckets in a SQLite file.
+
+    Each thread uses its own connection; every operation is one short
+    BEGIN IMMEDIATE transaction, so concurrent workers update the state one
+    at a time.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.local = threading.local()
+        self.calls = 0
+
+    def _connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            if self.path != ':memory:':
+                connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(SCHEMA)
+            self.local.connection = connection
+        return connection
+
+    @contextmanager
+    def _transaction(self):
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def take(self, key, rate, burst, now=None):
+        """
+        Take a token from a bucket refilled at rate tokens per second up to
+        burst tokens. Returns 0 when a token was taken, otherwise the number
+        of seconds until one is available.
+        """
+        now = time.time() if now is None else now
+        with self._transaction() as connection:
+            row = connection.execute(
+                'SELECT tokens, updated FROM buckets WHERE key = ?', (key,)
+            ).fetchone()
+            tokens = burst if row is None else min(burst, row[0] + (now - row[1]) * rate)
+            wait = 0 if tokens >= 1 else (1 - tokens) / rate
+            if not wait:
+                tokens -= 1
+            connection.execute(
+                'INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)',
+                (key, tokens, now)
+            )
+            self.calls += 1
+            if self.calls % PRUNE_EVERY == 0:
+                connection.execute(
+                    'DELETE FROM buckets WHERE updated < ?', (now - BUCKET_IDLE_SECONDS,)
+                )
+        return wait
+
+
+class InFlight:
+    """
+    Requests and statement renders in flight in this worker process.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {REQUEST: 0, RENDER: 0}
+
+    def enter(self, kind, limits):
+        """
+        Count one more of a kind if the count of every kind in limits is
+        below its limit. Returns whether it was counted.
+        """
+        with self.lock:
+            if any(self.counts[limited] >= limit for limited, limit in limits.items()):
+                return False
+            self.counts[kind] += 1
+            return True
+
+    def leave(self, kind):
+        with self.lock:
+            self.counts[kind] -= 1
+
+
+in_flight = InFlight()
+
+
+_states = {}
+_states_lock = threading.Lock()
+
+
+def shared_state():
+    """
+    Return the shared state stored at THROTTLE_STATE_PATH.
+    """
+    path = str(getattr(settings, 'THROTTLE_STATE_PATH', ':memory:'))
+    with _states_lock:
+        if path not in _states:
+            _states[path] = SharedState(path)
+        return _states[path]
+
+
+@receiver(setting_changed)
+def reset_shared_state(setting, **kwargs):
+    if setting == 'THROTTLE_STATE_PATH':
+        with _states_lock:
+            _states.clear()
+
+
+def client_identity(request):
+    """
+    Return the client a request is accounted to: the user when
+    authenticated, the client address otherwise.
+    """
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f'user:{user.pk}'
+    return f'ip:{BaseThrottle().get_ident(request)}'
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Throttle taking one token per request from the client's bucket of the
+    endpoint class named by scope.
+    """
+    scope = None
+
+    def get_scope(self, request, view):
+        return self.scope
+
+    def get_client(self, request):
+        return client_identity(request)
+
+    def allow_request(self, request, view):
+        scope = self.get_scope(request, view)
+        bucket = getattr(settings, 'THROTTLE_BUCKETS', {}).get(scope)
+        if not bucket:
+            return True
+        self.retry_after = shared_state().take(
+            f'{scope}:{self.get_client(request)}', bucket['rate'], bucket['burst']
+        )
+        return not self.retry_after
+
+    def wait(self):
+        return self.retry_after
+
+
+class ReadWriteThrottle(TokenBucketThrottle):
+    """
+    Throttle reads and writes from separate buckets.
+    """
+
+    def get_scope(self, request, view):
+        return 'read' if request.method in SAFE_METHODS else 'write'
+
+
+class StatementThrottle(TokenBucketThrottle):
+    """
+    Throttle statement renders.
+    """
+    scope = 'statement'
+
+
+def _retry_after():
+    return getattr(settings, 'THROTTLE_SHED_RETRY_AFTER', 5)
+
+
+@contextmanager
+def render_slot():
+    """
+    Hold a statement render slot while rendering.
+
+    Raises Throttled (429 with Retry-After) when THROTTLE_MAX_RENDERS
+    renders are already running, or when THROTTLE_RENDER_MAX_IN_FLIGHT
+    requests are in flight, so renders are shed before anything else.
+    """
+    limits = {RENDER: getattr(settings, 'THROTTLE_MAX_RENDERS', 2)}
+    max_in_flight = getattr(settings, 'THROTTLE_RENDER_MAX_IN_FLIGHT', None)
+    if max_in_flight:
+        limits[REQUEST] = max_in_flight
+    if not in_flight.enter(RENDER, limits):
+        raise Throttled(
+            wait=_retry_after(),
+            detail="Too many statements are being generated, please retry later."
+        )
+    try:
+        yield
+    finally:
+        in_flight.leave(RENDER)
+
+
+def request_slot():
+    """
+    Take an in-flight request slot. Returns a function releasing it, or
+    None when THROTTLE_MAX_IN_FLIGHT requests are already in flight.
+    """
+    limit = getattr(settings, 'THROTTLE_MAX_IN_FLIGHT', None)
+    if not limit:
+        return lambda: None
+    if not in_flight.enter(REQUEST, {REQUEST: limit}):
+        return None
+    return lambda: in_flight.leave(REQUEST)
+
+
+def busy_response():
+    """
+    Return the 429 response of a request shed because workers are busy.
+    """
+    response = JsonResponse({'detail': 'Server is busy, please retry later.'}, status=429)
+    response['Retry-After'] = str(_retry_after())
+    return response
+
+
+class InFlightLimitMiddleware:
+    """
+    Shed API requests with 429 and Retry-After once THROTTLE_MAX_IN_FLIGHT
+    requests are being served by this worker process.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not request.path.startswith('/api/'):
+            return self.get_response(request)
+
+        release = request_slot()
+        if release is None:
+            return busy_response()
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            release()
+            raise
+        if response.streaming:
+            # The body is sent after this returns; the server closes the
+            # response once it is sent or the client goes away
+            response._resource_closers.append(release)
+        else:
+            release()
+        return response
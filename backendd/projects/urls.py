@@ -6,16 +6,22 @@ This module defines the URL patterns for the expense tracker API endpoints.
 
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ProjectViewSet, ExpenseViewSet
+from .events import events_unavailable
+from .views import ProjectViewSet, ExpenseViewSet, ChangeFeedViewSet, ExportViewSet, BatchViewSet
 
 # Create a router and register our viewsets
 router = DefaultRouter()
 router.register(r'projects', ProjectViewSet, basename='project')
 router.register(r'expenses', ExpenseViewSet, basename='expense')
+router.register(r'changes', ChangeFeedViewSet, basename='change')
+router.register(r'export', ExportViewSet, basename='export')
+router.register(r'batch', BatchViewSet, basename='batch')
 
 # The API URLs are now determined automatically by the router
 urlpatterns = [
     path('api/', include(router.urls)),
+    # Served by expense_tracker/asgi.py; reached only without the ASGI server
+    path('api/events/', events_unavailable, name='events'),
 ]
 
 # Available endpoints:
@@ -23,10 +29,16 @@ urlpatterns = [
 # POST /api/projects/ → create project  
 # GET /api/projects/<id>/ → project details with all expenses
 # PUT /api/projects/<id>/ → update project
-# DELETE /api/projects/<id>/ → delete project
-# GET /api/projects/<id>/statement/ → generate statement (PDF/Excel)
+# DELETE /api/projects/<id>/ → delete project (hidden at once, removed in the background)
+# GET /api/projects/<id>/statement/ → generate statement (PDF/Excel/CSV/HTML)
 # GET /api/projects/<id>/statement/?format=excel → generate Excel statement
 # GET /api/projects/<id>/statement/?format=pdf → generate PDF statement
+# GET /api/projects/<id>/statement/?format=csv|html → generate CSV or HTML statement
+# GET /api/projects/<id>/balance/?as_of=<date> → total spent as of a date
+# GET /api/projects/<id>/cumulative/ → spend per period with running total
+# GET /api/projects/<id>/statistics/ → spend distribution statistics
+# GET /api/projects/<id>/budget/ → budget utilization and spend per category
+# GET /api/projects/over-budget/ → projects that spent more than their budget
 #
 # GET /api/expenses/ → list expenses
 # POST /api/expenses/ → add expense to project
@@ -34,3 +46,15 @@ urlpatterns = [
 # PUT /api/expenses/<id>/ → update expense
 # DELETE /api/expenses/<id>/ → delete expense
 # GET /api/expenses/?project=<project_id> → filter expenses by project
+# GET /api/expenses/?date_from=<date>&date_to=<date> → filter expenses by date (reaches into the archive)
+# GET /api/expenses/?category=<category> → filter expenses by category
+# POST /api/expenses/bulk-update/ → update expenses selected by ids or filter
+# POST /api/expenses/bulk-delete/ → delete expenses selected by ids or filter
+# ?fields=<a,b> / ?exclude=<a,b> → sparse fieldsets on project and expense responses
+# Idempotency-Key: <key> → replay the stored response of a retried create, update or bulk write
+#
+# GET /api/changes/?since=<seq> → changes since a cursor, with a new cursor
+# GET /api/export/expenses/?format=arrow|parquet → columnar expense export
+# GET /api/export/projects/?format=arrow|parquet → columnar project export
+# POST /api/batch/ → run several API requests in one round trip
+# GET /api/events/ → Server-Sent Events stream (served by expense_tracker/asgi.py, 501 under WSGI/runserver)
@@ -5,37 +5,87 @@ This module contains Django REST Framework ViewSets for handling
 API requests for projects and expenses, including statement generation.
 """
 
-import io
 from datetime import datetime
-from django.http import HttpResponse
+from django.db import transaction
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
-# PDF generation
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.lib import colors
+from .archive import merge_by_date, reaches_archive
+from .balances import get_balance, get_cumulative_series, SERIES_INTERVALS
+from .batch import run_batch
+from .bulk import bulk_update_expenses, bulk_delete_expenses
+from .changes import get_changes, DEFAULT_CHANGE_PAGE_SIZE, MAX_CHANGE_PAGE_SIZE
+from .deletion import request_project_deletion
+from .export import stream_export, ExportUnavailable, EXPORT_FORMATS
+from .idempotency import idempotent
+from .models import Project, Expense, ArchivedExpense
+from .renderers import get_statement_renderer, render_statement, StatementTooLarge
+from .serializers import (
+    BatchSerializer,
+    ProjectSerializer,
+    ProjectSummarySerializer,
+    ExpenseSerializer,
+    ExpenseBulkSelectionSerializer,
+    ExpenseBulkUpdateSerializer,
+    selected_fields,
+)
+from .sharding import (
+    attach_expense_totals, expense_shards, fan_out, find_expense, is_sharded, move_expenses,
+    pending_deletion_ids, prefetch_expenses, project_shard, visible_expenses,
+)
+from .spend import budget_utilization, get_budget_status, over_budget_projects
+from .statistics import get_project_statistics, DEFAULT_HISTOGRAM_BINS, MAX_HISTOGRAM_BINS
+from .throttling import StatementThrottle, render_slot
 
-# Excel generation
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill
 
-from .models import Project, Expense
-from .serializers import ProjectSerializer, ProjectSummarySerializer, ExpenseSerializer
+def _parse_date(value):
+    """
+    Parse an optional YYYY-MM-DD query parameter.
+    """
+    if not value:
+        return None
+    return datetime.strptime(value, '%Y-%m-%d').date()
 
 
-class ProjectViewSet(viewsets.ModelViewSet):
+class SparseFieldsViewMixin:
+    """
+    ViewSet mixin loading only what the fields selected with ?fields= and
+    ?exclude= need.
+    
+    Serializers drop the unselected fields themselves; this only keeps the
+    queryset from fetching their columns.
+    """
+    
+    def get_selected_fields(self):
+        """
+        Return the names of the fields the response will contain.
+        """
+        return selected_fields(self.request, self.get_serializer_class().Meta.fields)
+    
+    def only_selected(self, queryset, fields):
+        """
+        Defer the model columns of fields that are not selected.
+        """
+        columns = {field.name for field in queryset.model._meta.concrete_fields}
+        # Ordering columns are kept so that results can be merged in order
+        ordering = {name.lstrip('-') for name in queryset.model._meta.ordering}
+        return queryset.only('pk', *(columns & (fields | ordering)))
+
+
+class ProjectViewSet(SparseFieldsViewMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing projects.
     
     Provides CRUD operations for projects and includes custom actions
-    for generating PDF and Excel statements.
+    for generating PDF and Excel statements. Projects pending deletion
+    are hidden from every action. Creates and updates honour the
+    Idempotency-Key header.
     """
-    queryset = Project.objects.all()
+    queryset = Project.objects.active()
     
     def get_serializer_class(self):
         """
@@ -48,12 +98,49 @@ class ProjectViewSet(viewsets.ModelViewSet):
             return ProjectSummarySerializer
         return ProjectSerializer
     
+    def get_queryset(self):
+        """
+        Shape the queryset of list and detail requests to the selected fields.
+        
+        Totals are annotated in the same query only when they are selected,
+        and expenses are prefetched only when they are selected. When
+        expenses are sharded, load_from_shards() adds both instead.
+        """
+        queryset = super().get_queryset()
+        if self.action not in ('list', 'retrieve'):
+            return queryset
+        fields = self.get_selected_fields()
+        if is_sharded():
+            return self.only_selected(queryset, fields | {'shard'})
+        if fields & {'total_expenses', 'expense_count'}:
+            queryset = queryset.with_totals()
+        if 'expenses' in fields:
+            queryset = queryset.prefetch_related('expenses', 'archived_expenses')
+        return self.only_selected(queryset, fields)
+    
+    def load_from_shards(self, projects):
+        """
+        Add the selected totals and expenses to projects from the shards
+        holding their expenses, querying the shards in parallel.
+        """
+        if not is_sharded():
+            return projects
+        fields = self.get_selected_fields()
+        if fields & {'total_expenses', 'expense_count'}:
+            projects = attach_expense_totals(projects)
+        if 'expenses' in fields:
+            projects = prefetch_expenses(projects)
+        return projects
+    
     def list(self, request, *args, **kwargs):
         """
         List all projects with summary information.
+        
+        Query parameters:
+        - fields, exclude: Comma-separated fields to include or leave out
         """
         queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
+        serializer = self.get_serializer(self.load_from_shards(queryset), many=True)
         return Response({
             'count': queryset.count(),
             'results': serializer.data
@@ -63,258 +150,446 @@ class ProjectViewSet(viewsets.ModelViewSet):
         """
         Retrieve a specific project with all its expenses.
         """
-        instance = self.get_object()
+        instance, = self.load_from_shards([self.get_object()])
         serializer = self.get_serializer(instance)
         return Response(serializer.data)
     
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+    
+    @idempotent
+    def update(self, request, *args, **kwargs):
+        # Partial updates go through here as well
+        return super().update(request, *args, **kwargs)
+    
+    def destroy(self, request, *args, **kwargs):
+        """
+        Delete a project.
+        
+        The project is hidden immediately and its expenses are deleted in
+        batches in the background.
+        """
+        instance = self.get_object()
+        request_project_deletion(instance)
+        return Response(
+            {'id': instance.pk, 'status': 'pending_deletion'},
+            status=status.HTTP_202_ACCEPTED
+        )
+    
     @action(detail=True, methods=['get'])
-    def statement(self, request, pk=None):
+    def balance(self, request, pk=None):
         """
-        Generate PDF and Excel statements for a project.
+        Return what a project had spent as of a date.
         
         Query parameters:
-        - format: 'pdf' or 'excel' (default: 'pdf')
+        - as_of: Date in YYYY-MM-DD format (default: today)
         """
-        project = get_object_or_404(Project, pk=pk)
-        format_type = request.query_params.get('format', 'pdf').lower()
-        
-        if format_type == 'excel':
-            return self._generate_excel_statement(project)
-        else:
-            return self._generate_pdf_statement(project)
+        project = self.get_object()
+        try:
+            as_of = _parse_date(request.query_params.get('as_of')) or timezone.now().date()
+        except ValueError:
+            return Response(
+                {'error': 'as_of must be a date in YYYY-MM-DD format.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response({
+            'project': project.pk,
+            'as_of': as_of,
+            **get_balance(project, as_of),
+        })
     
-    def _generate_pdf_statement(self, project):
-        """
-        Generate PDF statement for a project using ReportLab.
+    @action(detail=True, methods=['get'])
+    def cumulative(self, request, pk=None):
         """
-        # Create a BytesIO buffer to hold the PDF
-        buffer = io.BytesIO()
+        Return spend per period and cumulative spend for a project.
         
-        # Create the PDF document
-        doc = SimpleDocTemplate(
-            buffer,
-            pagesize=A4,
-            rightMargin=72,
-            leftMargin=72,
-            topMargin=72,
-            bottomMargin=18
-        )
+        Query parameters:
+        - date_from: First date in YYYY-MM-DD format (default: first expense)
+        - date_to: Last date in YYYY-MM-DD format (default: last expense)
+        - interval: 'day', 'week' or 'month' (default: 'day')
+        """
+        project = self.get_object()
+        interval = request.query_params.get('interval', 'day')
+        if interval not in SERIES_INTERVALS:
+            return Response(
+                {'error': f"interval must be one of: {', '.join(SERIES_INTERVALS)}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            date_from = _parse_date(request.query_params.get('date_from'))
+            date_to = _parse_date(request.query_params.get('date_to'))
+        except ValueError:
+            return Response(
+                {'error': 'date_from and date_to must be dates in YYYY-MM-DD format.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response({
+            'project': project.pk,
+            'interval': interval,
+            'results': get_cumulative_series(project, date_from, date_to, interval),
+        })
+    
+    @action(detail=True, methods=['get'])
+    def statistics(self, request, pk=None):
+        """
+        Return spend distribution statistics for a project.
         
-        # Get styles
-        styles = getSampleStyleSheet()
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=24,
-            spaceAfter=30,
-            alignment=1  # Center alignment
-        )
+        Includes percentiles, mean, standard deviation, a histogram, the
+        largest expenses, outliers and a day-of-week breakdown.
         
-        # Build the document content
-        story = []
+        Query parameters:
+        - bins: Number of histogram buckets (default: 20)
+        """
+        project = self.get_object()
+        try:
+            bins = int(request.query_params.get('bins', DEFAULT_HISTOGRAM_BINS))
+        except ValueError:
+            bins = 0
+        if not 1 <= bins <= MAX_HISTOGRAM_BINS:
+            return Response(
+                {'error': f'bins must be an integer between 1 and {MAX_HISTOGRAM_BINS}.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response({
+            'project': project.pk,
+            **get_project_statistics(project.pk, bins),
+        })
+    
+    @action(detail=True, methods=['get'])
+    def budget(self, request, pk=None):
+        """
+        Return a project's budget utilization and spend per category.
         
-        # Title
-        title = Paragraph("Expense Statement", title_style)
-        story.append(title)
-        story.append(Spacer(1, 12))
+        Answered from the project's spend counters, without reading its
+        expenses.
+        """
+        project = self.get_object()
+        return Response({
+            'project': project.pk,
+            **get_budget_status(project),
+        })
+    
+    @action(detail=False, methods=['get'], url_path='over-budget')
+    def over_budget(self, request):
+        """
+        List projects that spent more than their budget, most over budget
+        first.
+        """
+        projects = over_budget_projects()
+        return Response({
+            'count': len(projects),
+            'results': [
+                {
+                    'id': project.pk,
+                    'name': project.name,
+                    **budget_utilization(project.budget, project.spent),
+                }
+                for project in projects
+            ]
+        })
+    
+    @action(detail=True, methods=['get'], throttle_classes=[StatementThrottle])
+    def statement(self, request, pk=None):
+        """
+        Generate a statement for a project.
         
-        # Project information
-        project_info = [
-            ['Project Name:', project.name],
-            ['Description:', project.description or 'No description'],
-            ['Created Date:', project.created_at.strftime('%B %d, %Y')],
-            ['Total Expenses:', f'${project.total_expenses:.2f}'],
-            ['Number of Expenses:', str(project.expense_count)],
-        ]
+        Statements have their own throttle bucket, and are refused with 429
+        while too many are being rendered. Statements too large to render in
+        memory are written to a temporary file and streamed from it, and
+        those too large either way are refused with 422.
         
-        project_table = Table(project_info, colWidths=[2*inch, 4*inch])
-        project_table.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 0), (-1, -1), 12),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
-        ]))
+        Query parameters:
+        - format: 'pdf', 'excel', 'csv', 'html' or any other registered
+          statement format (default: 'pdf')
+        """
+        project = get_object_or_404(Project.objects.active(), pk=pk)
+        try:
+            renderer = get_statement_renderer(request.query_params.get('format', 'pdf').lower())
+        except ValueError as error:
+            return Response({'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
         
-        story.append(project_table)
-        story.append(Spacer(1, 30))
+        try:
+            with render_slot():
+                content = render_statement(renderer, project)
+        except StatementTooLarge as error:
+            return Response({'error': str(error)}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
         
-        # Expenses table
-        if project.expenses.exists():
-            expenses_title = Paragraph("Expense Details", styles['Heading2'])
-            story.append(expenses_title)
-            story.append(Spacer(1, 12))
-            
-            # Table headers
-            expense_data = [['Date', 'Description', 'Amount']]
-            
-            # Add expense rows
-            for expense in project.expenses.all():
-                expense_data.append([
-                    expense.date.strftime('%Y-%m-%d'),
-                    expense.description[:50] + ('...' if len(expense.description) > 50 else ''),
-                    f'${expense.amount:.2f}'
-                ])
-            
-            expense_table = Table(expense_data, colWidths=[1.5*inch, 3.5*inch, 1.5*inch])
-            expense_table.setStyle(TableStyle([
-                # Header row
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('ALIGN', (2, 0), (2, -1), 'RIGHT'),  # Amount column right-aligned
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 12),
-                
-                # Data rows
-                ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 1), (-1, -1), 10),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-                ('TOPPADDING', (0, 0), (-1, -1), 6),
-                
-                # Alternating row colors
-                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.lightgrey]),
-            ]))
-            
-            story.append(expense_table)
+        if isinstance(content, bytes):
+            response = HttpResponse(content, content_type=renderer.content_type)
         else:
-            no_expenses = Paragraph("No expenses recorded for this project.", styles['Normal'])
-            story.append(no_expenses)
-        
-        # Build PDF
-        doc.build(story)
-        
-        # Get the value of the BytesIO buffer and create response
-        pdf = buffer.getvalue()
-        buffer.close()
-        
-        response = HttpResponse(content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="{project.name}_statement.pdf"'
-        response.write(pdf)
-        
+            response = FileResponse(content, content_type=renderer.content_type)
+        response['Content-Disposition'] = (
+            f'attachment; filename="{project.name}_statement.{renderer.extension}"'
+        )
         return response
+
+
+class ExpenseViewSet(SparseFieldsViewMixin, viewsets.ModelViewSet):
+    """
+    ViewSet for managing expenses.
+    
+    Provides CRUD operations for expenses. Expenses of projects pending
+    deletion are hidden. Expenses are read from, and written to, the shard
+    of their project; requests that are not limited to one project query
+    every shard in parallel. Creates, updates and bulk writes honour the
+    Idempotency-Key header.
+    """
+    queryset = Expense.objects.filter(project__deletion_requested_at__isnull=True)
+    serializer_class = ExpenseSerializer
     
-    def _generate_excel_statement(self, project):
+    def get_shard_querysets(self, model=Expense, project_id=None):
         """
-        Generate Excel statement for a project using openpyxl.
+        Return the expenses or archived expenses visible through this
+        viewset on every shard, or on the shard of project_id, loading only
+        the columns of the selected fields for list and detail requests.
         """
-        # Create workbook and worksheet
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Expense Statement"
-        
-        # Define styles
-        header_font = Font(bold=True, size=14)
-        title_font = Font(bold=True, size=18)
-        normal_font = Font(size=12)
-        
-        header_fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
-        center_alignment = Alignment(horizontal="center")
-        
-        # Title
-        ws['A1'] = "Expense Statement"
-        ws['A1'].font = title_font
-        ws['A1'].alignment = center_alignment
-        ws.merge_cells('A1:C1')
+        shards = expense_shards() if project_id is None else [project_shard(project_id)]
+        pending = pending_deletion_ids() if is_sharded() else None
+        querysets = [visible_expenses(model, shard, pending) for shard in shards]
+        if self.action not in ('list', 'retrieve'):
+            return querysets
+        fields = self.get_selected_fields()
+        return [self.only_selected(queryset, fields) for queryset in querysets]
+    
+    def get_object(self, model=Expense):
+        """
+        Return the expense, or archived expense, from whichever shard holds it.
+        """
+        try:
+            pk = int(self.kwargs['pk'])
+        except ValueError:
+            raise Http404
+        instance = find_expense(self.get_shard_querysets(model), pk)
+        if instance is None:
+            raise Http404
+        self.check_object_permissions(self.request, instance)
+        return instance
+    
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+    
+    @idempotent
+    def update(self, request, *args, **kwargs):
+        # Partial updates go through here as well
+        return super().update(request, *args, **kwargs)
+    
+    def perform_create(self, serializer):
+        with transaction.atomic(using=project_shard(serializer.validated_data['project'])):
+            serializer.save()
+    
+    def perform_update(self, serializer):
+        """
+        Save an expense on its shard, then move it to the shard of its new
+        project when it was moved to a project on another shard.
+        """
+        shard = serializer.instance._state.db
+        with transaction.atomic(using=shard):
+            expense = serializer.save()
+        target = project_shard(expense.project)
+        if target != shard:
+            move_expenses(Expense.objects.using(shard).filter(pk=expense.pk), target)
+            expense._state.db = target
+    
+    def perform_destroy(self, instance):
+        with transaction.atomic(using=instance._state.db):
+            instance.delete()
+    
+    def list(self, request, *args, **kwargs):
+        """
+        List all expenses with optional project and date filtering.
         
-        # Project information
-        ws['A3'] = "Project Name:"
-        ws['B3'] = project.name
-        ws['A4'] = "Description:"
-        ws['B4'] = project.description or 'No description'
-        ws['A5'] = "Created Date:"
-        ws['B5'] = project.created_at.strftime('%B %d, %Y')
-        ws['A6'] = "Total Expenses:"
-        ws['B6'] = f'${project.total_expenses:.2f}'
-        ws['A7'] = "Number of Expenses:"
-        ws['B7'] = project.expense_count
+        Archived expenses are included when the date range reaches them.
         
-        # Style project info
-        for row in range(3, 8):
-            ws[f'A{row}'].font = header_font
-            ws[f'B{row}'].font = normal_font
+        Query parameters:
+        - project: Filter expenses by project ID
+        - category: Filter expenses by category
+        - date_from, date_to: Filter expenses by date, in YYYY-MM-DD format
+        - fields, exclude: Comma-separated fields to include or leave out
+        """
+        try:
+            project_id = request.query_params.get('project')
+            project_id = int(project_id) if project_id else None
+            date_from = _parse_date(request.query_params.get('date_from'))
+            date_to = _parse_date(request.query_params.get('date_to'))
+        except ValueError:
+            return Response(
+                {'error': 'project must be an ID and date_from and date_to dates in YYYY-MM-DD format.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        lookups = {}
+        if project_id is not None:
+            lookups['project_id'] = project_id
+        category = request.query_params.get('category')
+        if category is not None:
+            lookups['category'] = category
+        if date_from:
+            lookups['date__gte'] = date_from
+        if date_to:
+            lookups['date__lte'] = date_to
         
-        # Expenses header
-        if project.expenses.exists():
-            ws['A9'] = "Expense Details"
-            ws['A9'].font = title_font
-            ws.merge_cells('A9:C9')
-            
-            # Table headers
-            ws['A11'] = "Date"
-            ws['B11'] = "Description"
-            ws['C11'] = "Amount"
-            
-            for col in ['A11', 'B11', 'C11']:
-                ws[col].font = header_font
-                ws[col].fill = header_fill
-            
-            # Add expense data
-            row = 12
-            for expense in project.expenses.all():
-                ws[f'A{row}'] = expense.date.strftime('%Y-%m-%d')
-                ws[f'B{row}'] = expense.description
-                ws[f'C{row}'] = float(expense.amount)
-                
-                # Style the row
-                for col in ['A', 'B', 'C']:
-                    ws[f'{col}{row}'].font = normal_font
-                
-                row += 1
-            
-            # Format amount column as currency
-            for r in range(12, row):
-                ws[f'C{r}'].number_format = '$#,##0.00'
+        sources = self.get_shard_querysets(Expense, project_id)
+        if reaches_archive(project_id, date_from, date_to):
+            sources += self.get_shard_querysets(ArchivedExpense, project_id)
+        sources = [source.filter(**lookups) for source in sources]
+        if len(sources) > 1:
+            expenses = list(merge_by_date(
+                fan_out(list, sources),
+                key=lambda expense: (expense.date, expense.created_at)
+            ))
+            count = len(expenses)
         else:
-            ws['A9'] = "No expenses recorded for this project."
-            ws['A9'].font = normal_font
+            expenses, count = sources[0], sources[0].count()
         
-        # Adjust column widths
-        ws.column_dimensions['A'].width = 15
-        ws.column_dimensions['B'].width = 40
-        ws.column_dimensions['C'].width = 15
+        serializer = self.get_serializer(expenses, many=True)
+        return Response({
+            'count': count,
+            'results': serializer.data
+        })
+    
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Retrieve an expense, looking in the archive when it is not found.
+        """
+        try:
+            instance = self.get_object()
+        except Http404:
+            instance = self.get_object(ArchivedExpense)
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data)
+    
+    @action(detail=False, methods=['post'], url_path='bulk-update')
+    @idempotent
+    def bulk_update(self, request):
+        """
+        Update many expenses with set-based UPDATE statements.
         
-        # Save to BytesIO
-        buffer = io.BytesIO()
-        wb.save(buffer)
-        buffer.seek(0)
+        Request body:
+        - ids: List of expense IDs, or
+        - filter: Conditions selecting expenses (project, date_from, date_to,
+          amount_min, amount_max, description, category)
+        - changes: Fields to set (project, amount, description, category, date)
+        """
+        serializer = ExpenseBulkUpdateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        lookups = serializer.get_lookups()
+        updated = bulk_update_expenses(
+            [queryset.filter(**lookups) for queryset in self.get_shard_querysets()],
+            serializer.validated_data['changes']
+        )
+        return Response({'updated': updated})
+    
+    @action(detail=False, methods=['post'], url_path='bulk-delete')
+    @idempotent
+    def bulk_delete(self, request):
+        """
+        Delete many expenses with set-based DELETE statements.
         
-        response = HttpResponse(
-            buffer.getvalue(),
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        Request body:
+        - ids: List of expense IDs, or
+        - filter: Conditions selecting expenses (see bulk-update)
+        """
+        serializer = ExpenseBulkSelectionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        lookups = serializer.get_lookups()
+        deleted = bulk_delete_expenses(
+            [queryset.filter(**lookups) for queryset in self.get_shard_querysets()]
         )
-        response['Content-Disposition'] = f'attachment; filename="{project.name}_statement.xlsx"'
+        return Response({'deleted': deleted})
+
+
+class ChangeFeedViewSet(viewsets.ViewSet):
+    """
+    ViewSet exposing the change feed used for incremental client sync.
+    """
+    
+    def list(self, request):
+        """
+        Return the changes recorded after a cursor.
         
-        return response
+        Query parameters:
+        - since: Cursor returned by the previous call (default: 0)
+        - limit: Maximum number of log entries to read (default: 500)
+        
+        When the response has 'resync' set, the cursor is too old and the
+        client must reload everything, then continue from the returned cursor.
+        """
+        try:
+            since = int(request.query_params.get('since', 0))
+            limit = int(request.query_params.get('limit', DEFAULT_CHANGE_PAGE_SIZE))
+        except ValueError:
+            return Response(
+                {'error': 'since and limit must be integers.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        limit = min(max(limit, 1), MAX_CHANGE_PAGE_SIZE)
+        return Response(get_changes(since, limit))
 
 
-class ExpenseViewSet(viewsets.ModelViewSet):
+class ExportViewSet(viewsets.ViewSet):
     """
-    ViewSet for managing expenses.
+    ViewSet for columnar analytics exports.
     
-    Provides CRUD operations for expenses.
+    Streams projects or expenses as an Arrow IPC stream or a Parquet file.
+    Requires the optional pyarrow package.
     """
-    queryset = Expense.objects.all()
-    serializer_class = ExpenseSerializer
     
-    def list(self, request, *args, **kwargs):
+    @action(detail=False, methods=['get'])
+    def expenses(self, request):
         """
-        List all expenses with optional project filtering.
+        Export expenses.
         
         Query parameters:
-        - project: Filter expenses by project ID
+        - format: 'arrow' or 'parquet' (default: 'arrow')
+        - project: Only export expenses of this project ID
         """
-        queryset = self.get_queryset()
+        return self._export(request, 'expenses')
+    
+    @action(detail=False, methods=['get'])
+    def projects(self, request):
+        """
+        Export projects.
         
-        # Filter by project if specified
+        Query parameters:
+        - format: 'arrow' or 'parquet' (default: 'arrow')
+        """
+        return self._export(request, 'projects')
+    
+    def _export(self, request, dataset):
+        export_format = request.query_params.get('format', 'arrow').lower()
         project_id = request.query_params.get('project')
-        if project_id:
-            queryset = queryset.filter(project_id=project_id)
+        try:
+            if project_id is not None:
+                project_id = int(project_id)
+            chunks = stream_export(dataset, export_format, project_id)
+        except ValueError as error:
+            return Response({'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        except ExportUnavailable as error:
+            return Response({'error': str(error)}, status=status.HTTP_501_NOT_IMPLEMENTED)
         
-        serializer = self.get_serializer(queryset, many=True)
-        return Response({
-            'count': queryset.count(),
-            'results': serializer.data
-        })
+        content_type, extension = EXPORT_FORMATS[export_format]
+        response = StreamingHttpResponse(chunks, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{dataset}.{extension}"'
+        return response
+
+
+class BatchViewSet(viewsets.ViewSet):
+    """
+    ViewSet running several API requests in one round trip.
+    """
+    # Every sub-request is throttled by its own view, see projects.batch
+    throttle_classes = []
+    
+    def create(self, request):
+        """
+        Run a batch of sub-requests and return all their responses.
+        
+        Each sub-request has a method (default: GET), a URL under /api/ and
+        an optional JSON body. Responses come back in request order, each
+        with its status code, headers and JSON body.
+        """
+        serializer = BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        responses = run_batch(request._request, serializer.validated_data['requests'])
+        return Response({'responses': responses})
@@ -1,6 +1,6 @@
 import React, { useEffect, useState } from 'react';
 import { useParams } from 'react-router-dom';
-import { apiService, Project, Expense } from '../services/api';
+import { apiService, Project, Expense, BudgetStatus } from '../services/api';
 import { Button } from '@/components/ui/button';
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/components/ui/card';
 
@@ -8,6 +8,7 @@ const ProjectDetail: React.FC = () => {
   const { id } = useParams<{ id: string }>();
   const [project, setProject] = useState<Project | null>(null);
   const [expenses, setExpenses] = useState<Expense[]>([]);
+  const [budget, setBudget] = useState<BudgetStatus | null>(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
 
@@ -17,12 +18,11 @@ const ProjectDetail: React.FC = () => {
 
       try {
         setLoading(true);
-        const [projectData, expensesData] = await Promise.all([
-          apiService.getProject(parseInt(id)),
-          apiService.getExpenses(parseInt(id))
-        ]);
+        const { project: projectData, expenses: expensesData, budget: budgetData } =
+          await apiService.getProjectWithExpenses(parseInt(id));
         setProject(projectData);
         setExpenses(expensesData);
+        setBudget(budgetData);
       } catch (err) {
         setError(err instanceof Error ? err.message : 'Failed to load project');
       } finally {
@@ -45,8 +45,10 @@ const ProjectDetail: React.FC = () => {
     return <div>Project not found</div>;
   }
 
-  const totalExpenses = expenses.reduce((sum, expense) => sum + expense.amount, 0);
-  const remainingBudget = project.budget - totalExpenses;
+  // Spend comes from the project's counters, not from summing the loaded expenses
+  const totalExpenses = budget?.spent ?? 0;
+  const remainingBudget = budget?.remaining ?? 0;
+  const utilization = budget?.utilization ?? 0;
 
   return (
     <div>
@@ -97,11 +99,11 @@ const ProjectDetail: React.FC = () => {
               <div className="w-full bg-gray-200 rounded-full h-2.5">
                 <div 
                   className={`h-2.5 rounded-full ${remainingBudget >= 0 ? 'bg-blue-600' : 'bg-red-600'}`}
-                  style={{ width: `${Math.min((totalExpenses / project.budget) * 100, 100)}%` }}
+                  style={{ width: `${Math.min(utilization, 100)}%` }}
                 ></div>
               </div>
               <p className="text-xs text-muted-foreground">
-                {((totalExpenses / project.budget) * 100).toFixed(1)}% of budget used
+                {utilization.toFixed(1)}% of budget used
               </p>
             </div>
           </CardContent>
@@ -19,6 +19,55 @@ export interface Expense {
   created_at?: string;
 }
 
+export interface CategorySpend {
+  category: string;
+  spent: number;
+  expense_count: number;
+  share: number | null;
+}
+
+export interface BudgetStatus {
+  project: number;
+  budget: number | null;
+  spent: number;
+  remaining: number | null;
+  utilization: number | null;
+  over_budget: boolean;
+  expense_count: number;
+  categories: CategorySpend[];
+}
+
+export interface OverBudgetProject extends Project {
+  spent: number;
+  remaining: number;
+  utilization: number | null;
+}
+
+export interface ChangeSet<T> {
+  upserted: T[];
+  deleted: number[];
+}
+
+export interface Changes {
+  resync: boolean;
+  cursor: number;
+  has_more?: boolean;
+  projects?: ChangeSet<Project>;
+  expenses?: ChangeSet<Expense>;
+}
+
+export interface BatchRequest {
+  method?: 'GET' | 'POST' | 'PUT' | 'PATCH' | 'DELETE';
+  url: string;
+  body?: unknown;
+}
+
+export interface BatchResponse<T = unknown> {
+  status: number;
+  headers: Record<string, string>;
+  body: T;
+}
+
 class ApiService {
   private async request<T>(endpoint: string, options: RequestInit = {}): Promise<T> {
     const url = `${API_BASE_URL}${endpoint}`;
@@ -67,6 +116,15 @@ class ApiService {
     });
   }
 
+  async getBudget(id: number): Promise<BudgetStatus> {
+    return this.request<BudgetStatus>(`/projects/${id}/budget/`);
+  }
+
+  async getOverBudgetProjects(): Promise<OverBudgetProject[]> {
+    const data = await this.request<{ count: number; results: OverBudgetProject[] }>('/projects/over-budget/');
+    return data.results;
+  }
+
   // Expense endpoints
   async getExpenses(projectId?: number): Promise<Expense[]> {
     const endpoint = projectId ? `/expenses/?project=${projectId}` : '/expenses/';
@@ -97,6 +155,42 @@ class ApiService {
     });
   }
 
+  // Change feed
+  async getChanges(since: number): Promise<Changes> {
+    return this.request<Changes>(`/changes/?since=${since}`);
+  }
+
+  // Batch requests: several API calls in one round trip
+  async batch(requests: BatchRequest[]): Promise<BatchResponse[]> {
+    const data = await this.request<{ responses: BatchResponse[] }>('/batch/', {
+      method: 'POST',
+      body: JSON.stringify({
+        requests: requests.map((request) => ({ ...request, url: `/api${request.url}` })),
+      }),
+    });
+    return data.responses;
+  }
+
+  async getProjectWithExpenses(
+    id: number
+  ): Promise<{ project: Project; expenses: Expense[]; budget: BudgetStatus }> {
+    const [project, expenses, budget] = await this.batch([
+      { url: `/projects/${id}/?exclude=expenses` },
+      { url: `/expenses/?project=${id}` },
+      { url: `/projects/${id}/budget/` },
+    ]);
+    for (const response of [project, expenses, budget]) {
+      if (response.status >= 400) {
+        throw new Error(`API request failed: ${response.status}`);
+      }
+    }
+    return {
+      project: project.body as Project,
+      expenses: (expenses.body as { count: number; results: Expense[] }).results,
+      budget: budget.body as BudgetStatus,
+    };
+  }
+
   // Statement endpoints
   async downloadStatement(projectId: number, format: 'pdf' | 'excel' = 'pdf'): Promise<Blob> {
     const url = `${API_BASE_URL}/projects/${projectId}/statement/?format=${format}`;